@@ -8,11 +8,13 @@ directly access Aggregates from PROOF.
 
 Each aggregate has its own lifetime - from its creation to its removal from the
 Repository. In its lifetime, the aggregate will keep different states and ages.
-There are four states to divide the entire lifetime period -- NEW, LOADED, DIRTY,
-and UNLOAD. These states are defined below:
+There are five states to divide the entire lifetime period -- NEW, PARTIAL,
+LOADED, DIRTY, and UNLOAD. These states are defined below:
 
 NEW: The aggregate has just be created. It only contains the root object pk. All
 included objects are not created.
+PARTIAL: Some of the included objects have been loaded. Each relation is loaded
+the first time its objects are accessed by getObjects or getObject.
 LOADED: All objects and attributes of the aggregate have been initialized.
 DIRTY: Any of attributes of its objects is modified or become dirty. When the
 aggregate makes commit or cancel, the state will change to LOADED. 
@@ -28,7 +30,7 @@ Aggregate --------->  NEW   ------------------->         --------------->
                               remove attributes            commit/cancel
 
 In each state, there is an age associated with the aggregate. They are NEW_AGE for
-NEW/UNLOAD, LOADED_AGE for LOADED, and DIRTY_AGE for DIRTY. The age is the time
+NEW/UNLOAD, LOADED_AGE for PARTIAL/LOADED, and DIRTY_AGE for DIRTY. The age is the time
 period the aggregate can keep in that state. Each Repository has a backend monitor
 thread to check each aggregate's access time and change its state and remove it from
 repository.
@@ -59,7 +61,7 @@ import logging
 import copy
 
 import util.logger.Logger as Logger
-from util.Import import my_import
+import util.LazyLog as LazyLog
 
 import proof.ProofInstance as ProofInstance
 import proof.ProofConstants as ProofConstants
@@ -122,6 +124,7 @@ class Aggregate:
         # the logger
         self.__logger = Logger.makeLogger(logger)
         self.log = self.__logger.write
+        self.debug = LazyLog.LazyLog(self.__logger)
 
         # initialize relation map
         repository = self.__proof.getInstanceForRepository( self.__root_name,
@@ -133,6 +136,9 @@ class Aggregate:
         for obj_name in self.__relation_map.keys():
             self.__objects[obj_name] = {}
 
+        # object names whose relation has been loaded
+        self.__loaded = {}
+
     def getProofInstance(self):
         return self.__proof
     
@@ -182,18 +188,25 @@ class Aggregate:
             return False
 
     def getObjects(self, obj_name):
-        """ Return a list of objects with obj_name.
+        """ Return a list of objects with obj_name. The relation is loaded
+            the first time it is accessed.
         """
+        self.__load_on_access(obj_name)
         return self.__objects.get(obj_name, {}).values()
     
     def getObjectNames(self):
         return self.__objects.keys()
 
-    def getObject(self, obj_name, pk):
+    def getObject(self, obj_name, pk, load=True):
         """ This method is used when the aggregate is constructed. It should not
             be called directly from application layers. Use getAttribute or any
             convenient methods provided by the extended classes. 
+
+            @param load If false, the relation won't be loaded when it hasn't
+                   been accessed yet. Factories constructing objects use it.
         """
+        if load:
+            self.__load_on_access(obj_name)
         obj = self.__objects.get(obj_name, {}).get(str(pk), None)
         if not obj:
             self.log( "%s.getObject '%s' with pk '%s' return None." % ( self.__class__.__name__,
@@ -208,7 +221,7 @@ class Aggregate:
         obj = self.__objects.get(obj_name, {}).get(str(pk), None)
         if obj:
             del self.__objects[obj_name][str(pk)]
-            self.log("removed object %s: %s"%(obj_name, str(pk)))
+            self.debug("removed object %s: %s", obj_name, pk)
 
     def addObject(self, obj_name, obj):
         """ This method is used when the aggregate is constructed. It should not
@@ -220,13 +233,34 @@ class Aggregate:
         if self.__objects.has_key(obj_name):
             pk = obj.getPK()
             self.__objects[obj_name][str(pk)] = ret_obj = obj
-            self.log("added object %s: %s"%(obj_name, str(pk)))
+            self.debug("added object %s: %s", obj_name, pk)
         else:
             self.log("Trying to add an object '%s' that doesn't belong to %s." % \
                      (obj_name, self.__class__.__name__), logging.WARN)
 
         return ret_obj
 
+    def setObjects(self, obj_name, objects):
+        """ Replace all objects with obj_name by a list of objects loaded
+            outside this aggregate, e.g. batch loaded by AggregateFactory.
+            It should not be called directly from application layers.
+
+            @param obj_name The object (table) name.
+            @param objects A list of objects.
+        """
+        if not self.__objects.has_key(obj_name):
+            self.log("Trying to set objects '%s' that don't belong to %s." % \
+                     (obj_name, self.__class__.__name__), logging.WARN)
+            return
+
+        self.__objects[obj_name] = {}
+        for obj in objects:
+            self.addObject(obj_name, obj)
+        self.__loaded[obj_name] = True
+
+        if self.__state != ProofConstants.AGGR_DIRTY:
+            self.__state = self.__load_state()
+
     def load(self):
         self.touch()
         self.__load_root_object()
@@ -234,6 +268,7 @@ class Aggregate:
             self.__load(obj_name)
         self.__state = ProofConstants.AGGR_LOADED
         #self.updateState()
+        self.__resize()
 
     def load_objects(self):
         self.touch()
@@ -241,31 +276,38 @@ class Aggregate:
             self.__load(obj_name)
         self.__state = ProofConstants.AGGR_LOADED
         #self.updateState()
+        self.__resize()
 
     def unload(self):
         self.touch()
         self.__root.unload()
         for obj_name in self.__objects.keys():
             self.__objects[obj_name] = {}
+        self.__loaded = {}
         self.__state = ProofConstants.AGGR_UNLOADED
         #self.updateState()
 
+        # let the repository load the root in a batch with others
+        repository = self.__proof.getInstanceForRepository( self.__root_name,
+                                                            schema = self.__db_schema )
+        repository.addUnloaded(self)
+
     reload = load
 
     def getState(self):
         return self.__state
 
+    def isLoaded(self, obj_name):
+        """ Check whether the relation of obj_name has been loaded.
+        """
+        return self.__loaded.get(obj_name, False)
+
     def updateState(self):
         if self.isDirty():
             self.__state = ProofConstants.AGGR_DIRTY
 
         elif self.__root:
-            # default to AGGR_UNLOADED
-            self.__state = ProofConstants.AGGR_UNLOADED
-            for obj_dict in self.__objects.values():
-                if obj_dict != {}:
-                    self.__state = ProofConstants.AGGR_LOADED
-                    break
+            self.__state = self.__load_state()
         else:
             # AGGR_NEW if root object is None
             self.__state = ProofConstants.AGGR_NEW
@@ -292,15 +334,43 @@ class Aggregate:
     isAutoCommit = getAutoCommit
 
     def commit(self):
-        """ Commit all the changes and return to loaded state.
+        """ Commit all the changes and return to loaded state. The changes of
+            all objects are written on one connection in one transaction, the
+            root first and then the objects grouped by table. If it fails,
+            nothing is written and the aggregate stays dirty.
         """
         if self.__state == ProofConstants.AGGR_DIRTY:
-            self.__root.update(force=True)
-            for obj_dict in self.__objects.values():
-                for obj in obj_dict.values():
-                    obj.update()
+            objects = [ self.__root ]
+            obj_names = self.__objects.keys()
+            obj_names.sort()
+            for obj_name in obj_names:
+                objects.extend(self.__objects[obj_name].values())
+
+            updates = []
+            updated = []
+            for obj in objects:
+                criterias = obj._getUpdateCriteria(force = obj is self.__root)
+                if criterias:
+                    updates.append(criterias)
+                    updated.append(obj)
+
+            if updates:
+                factory = self.__proof.getInstanceForAggregateFactory( self.__root_name,
+                                                                       schema = self.__db_schema )
+                if factory.doUpdateList(updates) == None:
+                    self.log( "%s.commit: changes of '%s' were rolled back." % \
+                              (self.__class__.__name__, str(self.__pk)), logging.WARNING )
+                    return
+
+            for obj in updated:
+                obj._setUpdated()
             self.touch()
-            self.__state = ProofConstants.AGGR_LOADED
+            self.__state = self.__load_state()
+
+            # share the changes with other processes
+            repository = self.__proof.getInstanceForRepository( self.__root_name,
+                                                                schema = self.__db_schema )
+            repository.refresh(self)
 
     def cancel(self):
         """ Cancel all the changes and return to loaded state.
@@ -311,7 +381,7 @@ class Aggregate:
                 for obj in obj_dict.values():
                     obj.cancel()
             self.touch()
-            self.__state = ProofConstants.AGGR_LOADED
+            self.__state = self.__load_state()
 
     #def getAttributes(self, obj_name=None):
     #    """ Return the entire attributes.
@@ -389,6 +459,10 @@ class Aggregate:
 
     def delete(self):
         if self.__cascade_on_delete:
+            # load the relations not accessed yet
+            for obj_name in self.__objects.keys():
+                self.__load_on_access(obj_name)
+
             # delete all objects in this aggregate
             for obj_dict in self.__objects.values():
                 for obj in obj_dict.values():
@@ -410,6 +484,18 @@ class Aggregate:
         """
         self.__access_time = time.time()
 
+    def getSize(self):
+        """ Return the estimated size of the root and the loaded objects in
+            bytes. Nothing is loaded.
+        """
+        size = 0
+        if self.__root:
+            size += self.__root.getSize()
+        for objects in self.__objects.values():
+            for obj in objects.values():
+                size += obj.getSize()
+        return size
+
     def _access_time(self):
         return self.__access_time
 
@@ -458,30 +544,61 @@ class Aggregate:
         for left, right in zip(relation[0], relation[1]):
             crit.addJoin(left, right)
 
-        # reset objects
-        self.__objects[obj_name] = {}
-
         # init ObjectFactory
-        module_name = self.__proof.getModuleForFactory(obj_name, schema=self.__db_schema)
-        class_name  = self.__proof.getClassForFactory(obj_name, schema=self.__db_schema)
-        object_module = my_import(module_name)
-        obj = getattr( object_module, class_name )
+        obj = self.__proof.getResolvedClass('Factory', obj_name, schema=self.__db_schema)
         factory = obj(self, logger=self.__logger)
         
         # init objects
         objects = factory.doSelectObject(crit)
 
+        # reset objects, and mark the relation loaded only after its rows
+        # are in, so a failed select is tried again on the next access
+        self.__objects[obj_name] = {}
         for object in objects:
             self.addObject(obj_name, object)
+        self.__loaded[obj_name] = True
+
+    def __load_on_access(self, obj_name):
+        """ Load the relation of obj_name if it hasn't been loaded yet.
+        """
+        if self.__objects.has_key(obj_name) and \
+               not self.__loaded.get(obj_name, False):
+            self.touch()
+            self.__load(obj_name)
+            if self.__state != ProofConstants.AGGR_DIRTY:
+                self.__state = self.__load_state()
+            self.__resize()
+
+    def __resize(self):
+        """ Let the repository measure the size of this aggregate again
+            after objects are loaded.
+        """
+        repository = self.__proof.getInstanceForRepository( self.__root_name,
+                                                            schema = self.__db_schema )
+        repository.resize(self)
+
+    def __load_state(self):
+        """ Return the state based on the loaded relations.
+        """
+        loaded = 0
+        for obj_name in self.__objects.keys():
+            if self.__loaded.get(obj_name, False):
+                loaded += 1
+
+        if loaded == len(self.__objects):
+            return ProofConstants.AGGR_LOADED
+        elif loaded > 0:
+            return ProofConstants.AGGR_PARTIAL
+        elif self.__state == ProofConstants.AGGR_NEW:
+            return ProofConstants.AGGR_NEW
+        else:
+            return ProofConstants.AGGR_UNLOADED
     
     def __load_root_object(self):
         """ Load the root object based on pk.
         """
         if not self.__root:
-            module_name = self.__proof.getModuleForObject(self.__root_name, schema=self.__db_schema)
-            class_name  = self.__proof.getClassForObject(self.__root_name, schema=self.__db_schema)
-            object_module = my_import(module_name)
-            obj = getattr( object_module, class_name )
+            obj = self.__proof.getResolvedClass('Object', self.__root_name, schema=self.__db_schema)
             self.__root = obj(self, self.__pk, logger=self.__logger)
 
         self.__root.load()
@@ -501,16 +618,16 @@ class Aggregate:
     def setLogger(self, logger):
         self.__logger = Logger.makeLogger(logger)
         self.log = self.__logger.write
+        self.debug = LazyLog.LazyLog(self.__logger)
  
     def __getstate__(self):
         """ Used by pickle when the class is serialized.
             Remove the 'proof', 'logger' attributes before serialization.
             @hidden
         """
-        self.log = None
-        self.__logger = None
         d = copy.copy(self.__dict__)
         del d["log"]
+        del d["debug"]
         del d["_Aggregate__logger"]
         del d["_Aggregate__proof"]
         return d
@@ -523,6 +640,7 @@ class Aggregate:
         logger = Logger.makeLogger(None)
         d["_Aggregate__logger"] = logger
         d["log"] = logger.write
+        d["debug"] = LazyLog.LazyLog(logger)
         d["_Aggregate__proof"] = None
         self.__dict__ = d
         
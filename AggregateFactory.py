@@ -16,15 +16,16 @@ except (ImportError, AttributeError):
     import dummy_thread as _thread
 
 import util.UniqueList as UniqueList
-from util.Import import my_import
 
 import proof.pk.ObjectKey as ObjectKey
 import proof.pk.ComboKey as ComboKey
 import proof.Aggregate as Aggregate
+import proof.ProofConstants as ProofConstants
 import proof.BaseFactory as BaseFactory
 import proof.ProofException as ProofException
 import proof.sql.Criteria as Criteria
 import proof.sql.SQLConstants as SQLConstants
+import proof.sql.SQLExpression as SQLExpression
 
 
 class AggregateFactory(BaseFactory.BaseFactory):
@@ -69,11 +70,25 @@ class AggregateFactory(BaseFactory.BaseFactory):
 
         # whether self.init_select() called
         self.__initialized = 0
+
+        # whether to load related objects of a result page in batch
+        self.__batch_load = True
+
+        # whether to leave related objects to be loaded on first access,
+        # which is configured per aggregate in the resource
+        self.__lazy_load = proof_instance.getLazyLoadForAggregate( self.__root_name,
+                                                                   schema = schema_name )
+
+        # whether to select pks and timestamps before the full root rows
+        self.__version_probe = False
+
+        # compiled row mapper of the root table
+        self.__row_mapper = None
     
     def initialize(self):
         """ Initialize required select and where fields for the aggregate.
         """
-        self.log( "start %s initialize" % (self.__class__.__name__) )
+        self.debug( "start %s initialize", self.__class__.__name__ )
         
         self.__as_columns.clear()
         self.__pk_columns = []
@@ -90,12 +105,37 @@ class AggregateFactory(BaseFactory.BaseFactory):
 
         self.__timestamp_column = table_map.getTimestampColumn()
 
-        self.log( "finish %s initialize" % (self.__class__.__name__) )
+        self.debug( "finish %s initialize", self.__class__.__name__ )
         self.__initialized = 1
 
     def isInitialized(self):
         return self.__initialized
 
+    def setBatchLoad(self, batch_load):
+        self.__batch_load = batch_load
+
+    def isBatchLoad(self):
+        return self.__batch_load
+
+    def isLazyLoad(self):
+        """ If true, new aggregates are returned without their related
+            objects. Each relation is loaded by the aggregate the first time
+            it is accessed. It is set by the 'lazy_load' of the aggregate in
+            the resource, so it isn't changed on a factory shared by a thread.
+        """
+        return self.__lazy_load
+
+    def setVersionProbe(self, version_probe):
+        """ If version_probe is true and the root table has a timestamp
+            column, a select only fetches the pks and timestamps first. The
+            full rows are then fetched only for the aggregates which are not
+            cached or out-of-date.
+        """
+        self.__version_probe = version_probe
+
+    def isVersionProbe(self):
+        return self.__version_probe
+
     # INSERT
     #===========
 
@@ -131,8 +171,113 @@ class AggregateFactory(BaseFactory.BaseFactory):
             #self.log( "insert add '%s' => '%s'" % (key, data[key]) )
             criteria.add( key, data[key] )
 
-        return self.doInsert( criteria )
-        
+        id = self.doInsert( criteria )
+
+        if table[0] == self.__root_name:
+            self.__removeMissed(data, id)
+
+        return id
+
+    def _createList( self,
+                     data_list,
+                     construct_aggregates = False,
+                     chunk_size           = ProofConstants.DEFAULT_INSERT_CHUNK_SIZE ):
+        """ Insert many object records of one table into database with
+            multi-row INSERT statements. Refer to BaseFactory.doInsertList.
+
+            @param data_list A list of dictionaries in the format of _create.
+                   All of them should be in the same table.
+            @param construct_aggregates If true and the table is the root
+                   table, the aggregates are returned instead of the ids. The
+                   inserted rows are selected again for them, so that the
+                   roots have the values filled by the database, e.g. the
+                   defaults and the timestamp.
+            @param chunk_size The maximum number of rows in one transaction.
+            @return A list of ids or aggregates in the same order as
+                    data_list. None is put in the place of a failed row.
+        """
+        if not data_list:
+            return []
+
+        # check data is valid
+        table = UniqueList.UniqueList()
+        for data in data_list:
+            table.extend( [key.split('.')[0] for key in data.keys()] )
+        if len(table) != 1:
+            raise ProofException.ProofImproperUseException( \
+                "%s._createList(): arg data_list should only contain one table, but get '%s'" % \
+                (self.__class__.__name__, str(table)) )
+
+        if not table[0] in self.__tables:
+            raise ProofException.ProofImproperUseException( \
+                "%s._createList(): table '%s' doesn't belong to the aggregate '%s'" % \
+                (self.__class__.__name__, table[0], self.__root_name) )
+
+        ids = self.doInsertList(data_list, chunk_size=chunk_size)
+
+        if table[0] == self.__root_name:
+            for data, id in zip(data_list, ids):
+                if id != None:
+                    self.__removeMissed(data, id)
+
+        if not construct_aggregates or table[0] != self.__root_name:
+            return ids
+
+        if not self.isInitialized():
+            self.initialize()
+
+        if len(self.__pk_columns) != 1:
+            raise ProofException.ProofImproperUseException( \
+                "%s._createList(): aggregates with combo keys can't be constructed." % \
+                (self.__class__.__name__) )
+        pk_name = self.__pk_columns[0].getFullyQualifiedName()
+
+        # select the inserted rows again with all root columns
+        rows = {}
+        inserted = [ id for id in ids if id != None ]
+        for start in range(0, len(inserted), chunk_size):
+            criteria = Criteria.Criteria( self.getProofInstance(),
+                                          db_name = self.getDBName(),
+                                          logger  = self.getLogger() )
+            criteria.addIn(pk_name, inserted[start:start+chunk_size])
+            criteria.setSelectColumns(UniqueList.UniqueList())
+            criteria.setAsColumns(self.__as_columns)
+            for row in self.doSelect(criteria, ret_dict=1) or []:
+                rows[str(row.get(pk_name, None))] = row
+
+        aggregates = []
+        for id in ids:
+            aggregate = None
+            row = rows.get(str(id), None)
+            if row:
+                aggregate = self.constructAggregate(row, load_objects=False)
+                if aggregate and aggregate.getState() == ProofConstants.AGGR_NEW:
+                    # a new root has no related objects yet
+                    for obj_name in self.__relation_map.keys():
+                        aggregate.setObjects(obj_name, [])
+                    self.__repository.refresh(aggregate)
+            aggregates.append(aggregate)
+
+        return aggregates
+
+    def __removeMissed(self, data, id):
+        """ Let the repository forget the keys of a new root row which were
+            found not existing, including the lookups by other columns with
+            findById.
+
+            @param data A dictionary of the inserted root row.
+            @param id The inserted id.
+        """
+        if not self.isInitialized():
+            self.initialize()
+
+        for key, value in data.items():
+            self.__repository.removeMissed(ObjectKey.ObjectKey(value, key))
+
+        if id != None and len(self.__pk_columns) == 1:
+            pk_name = self.__pk_columns[0].getFullyQualifiedName()
+            self.__repository.removeMissed(ObjectKey.ObjectKey(id, pk_name))
+
     def _makeObject(self, aggregate, object_name, pk):
         """ A common function used to make an Object with the pk specified.
 
@@ -150,11 +295,8 @@ class AggregateFactory(BaseFactory.BaseFactory):
                     return obj
 
             # create a new object
-            proof = self.getProofInstance()
-            module_name = proof.getModuleForObject(object_name, schema=self.getSchemaName())
-            class_name  = proof.getClassForObject(object_name, schema=self.getSchemaName())
-            object_module = my_import(module_name)
-            obj = getattr(object_module, class_name)
+            mapper = self.getRowMapper(object_name)
+            obj = mapper.getObjectClass(self.getSchemaName())
             return obj(aggregate, pk, logger=self.getLogger())
 
         return None
@@ -172,13 +314,17 @@ class AggregateFactory(BaseFactory.BaseFactory):
         if aggregates: return aggregates[0]
         return None
 
-    def doSelectAggregate(self, criteria):
+    def doSelectAggregate(self, criteria, join_fetch=False):
         """ Returns a list of aggregates.
         
             @param criteria A Criteria.
+            @param join_fetch If true, select the roots and all related objects
+                   in one LEFT JOIN query. It is only used when the criteria has
+                   no limit and doesn't refer to any related table, otherwise
+                   it falls back to the normal select.
             @return A list of aggregates.
         """
-        self.log( "start %s doSelectAggregate" % (self.__class__.__name__) )
+        self.debug( "start %s doSelectAggregate", self.__class__.__name__ )
 
         finger_print = criteria.__finger_print__()
         
@@ -187,52 +333,446 @@ class AggregateFactory(BaseFactory.BaseFactory):
 
         if cached != None:
             return cached
+
+        # check the query result cache shared by threads
+        query_cache = self.getProofInstance().getQueryCache()
+        query_key = (self.getDBName(), self.__root_name, finger_print)
+        if query_cache:
+            cached = self.__getQueryResult(query_cache.get(query_key))
+            if cached != None:
+                self.__repository.add_thread_session_query_result(finger_print, cached)
+                return cached
         
         if not self.isInitialized():
             self.initialize()
 
         criteria.setSelectColumns(UniqueList.UniqueList())
         criteria.setDistinct()
-        criteria.setAsColumns(self.__as_columns)
-
-        results = self.doSelect(criteria, ret_dict=1)
 
-        aggregates = self.constructAggregates(results)
+        if join_fetch and self.__isJoinFetchable(criteria):
+            criteria.setAsColumns(self.__as_columns)
+            aggregates = self.__doSelectJoinAggregate(criteria)
+        elif self.__version_probe and self.__timestamp_column and \
+                 len(self.__pk_columns) == 1:
+            aggregates = self.__doSelectProbeAggregate(criteria)
+        else:
+            criteria.setAsColumns(self.__as_columns)
+            results = self.doSelect(criteria, ret_dict=1)
+            aggregates = self.constructAggregates(results)
 
         # add results to thread session
         self.__repository.add_thread_session_query_result(finger_print, aggregates)
+
+        if query_cache:
+            tables = criteria.getReadTables()
+            tables.append(self.__root_name)
+            query_cache.set( query_key,
+                             [ str(aggr.getPK()) for aggr in aggregates ],
+                             self.getDBName(),
+                             tables )
         
         return aggregates
 
+    def __getQueryResult(self, ids):
+        """ Convert the aggregate ids of a cached query result to aggregates.
+
+            @param ids A list of aggregate ids or None.
+            @return A list of aggregates, or None if any of them is no longer
+                    in the repository.
+        """
+        if ids == None:
+            return None
+
+        aggregates = []
+        for id in ids:
+            aggregate = self.__repository.get(id)
+            if not aggregate:
+                return None
+            aggregates.append(aggregate)
+
+        return aggregates
+
+    def __isJoinFetchable(self, criteria):
+        """ Check whether the aggregates of a criteria can be selected with
+            their related objects in one LEFT JOIN query.
+        """
+        if not self.__relation_map:
+            return False
+
+        # the limit would apply to the joined rows instead of the roots
+        if criteria.getLimit() > 0:
+            return False
+
+        # related objects have to be complete, not filtered by the criteria
+        columns = criteria.getJoinL() + criteria.getJoinR() + \
+                  criteria.getOrderByColumns() + criteria.getGroupByColumns()
+        tables = UniqueList.UniqueList()
+        for column in columns:
+            tables.append(column.split(' ')[0].split('(')[-1].split('.')[0])
+        for key in criteria.keys():
+            tables.extend(criteria.getCriterion(key).getAllTables())
+
+        for obj_name in self.__relation_map.keys():
+            if obj_name in tables:
+                return False
+
+            # only relations between the root and the related table are
+            # joined, the ones through intermediate tables aren't
+            relation = self.__repository.getRelationList(obj_name)
+            if relation:
+                for column in relation[0] + relation[1]:
+                    if column.split('.')[0] not in [ self.__root_name, obj_name ]:
+                        return False
+
+        return True
+
+    def __doSelectJoinAggregate(self, criteria):
+        """ Select the roots and their related objects in one LEFT JOIN query.
+            Every related column is selected with the same 'Table.Column'
+            alias as the root columns. Roots and related objects repeated in
+            the joined rows are de-duplicated.
+
+            @param criteria A Criteria.
+            @return A list of aggregates.
+        """
+        proof    = self.getProofInstance()
+        db_map   = proof.getDatabaseMap(self.getDBName())
+        adapter  = proof.getAdapter(self.getDBName())
+        sql_expr = SQLExpression.SQLExpression()
+
+        str_delimiter = adapter.getStringDelimiter()
+
+        args  = []
+        query = self.createQuery(criteria, args)
+        select_clause = query.getSelectClause()
+
+        # build LEFT JOIN clause and select columns for related tables
+        joins = []
+        child_pks = {}
+        for obj_name in self.__relation_map.keys():
+            relation = self.__repository.getRelationList(obj_name)
+            if not relation:
+                continue
+
+            on_list = []
+            for left, right in zip(relation[0], relation[1]):
+                on_list.append(sql_expr.buildInnerJoin(left, right))
+            joins.append( "LEFT JOIN %s ON (%s)" % ( obj_name,
+                                                     string.join(on_list, SQLConstants.AND) ) )
+
+            child_pks[obj_name] = []
+            for column_map in db_map.getTable(obj_name).getColumns():
+                column_name = column_map.getFullyQualifiedName()
+                select_clause.append( "%s AS %s%s%s" % ( column_name,
+                                                         str_delimiter,
+                                                         column_name,
+                                                         str_delimiter ) )
+                if column_map.isPrimaryKey():
+                    child_pks[obj_name].append(column_name)
+
+        if not joins:
+            return self.constructAggregates(self.doSelect(criteria, ret_dict=1))
+
+        root_join = "%s %s" % (self.__root_name, string.join(joins, " "))
+        from_clause = UniqueList.UniqueList()
+        for table in query.getFromClause():
+            if table == self.__root_name:
+                from_clause.append(root_join)
+            else:
+                from_clause.append(table)
+        if root_join not in from_clause:
+            from_clause.insert(0, root_join)
+        query.setFromClause(from_clause)
+
+        sql = str(query)
+        self.debug( "SQL for join fetch: %s %s", sql, args )
+
+        rows = self.doSelectSQL( sql,
+                                 ret_dict = 1,
+                                 useTransaction = criteria.isUseTransaction(),
+                                 args = args )
+
+        # stream the rows: { root key : [ aggregate, { obj_name : { child key : obj } } ] }
+        aggregates = []
+        roots = {}
+        factories = {}
+        pk_names = [ pkc.getFullyQualifiedName() for pkc in self.__pk_columns ]
+        for row in rows:
+            root_key = tuple([ row.get(name, None) for name in pk_names ])
+            if not roots.has_key(root_key):
+                aggregate = self.constructAggregate(row, load_objects=False)
+                roots[root_key] = None
+                if aggregate:
+                    aggregates.append(aggregate)
+                    # only new aggregates need their objects
+                    if aggregate.getState() == ProofConstants.AGGR_NEW:
+                        roots[root_key] = [ aggregate, {} ]
+
+            if not roots[root_key]:
+                continue
+
+            aggregate, children = roots[root_key]
+            for obj_name, child_pk_names in child_pks.items():
+                child_key = tuple([ row.get(name, None) for name in child_pk_names ])
+                # no related row or no pk to identify it
+                if not child_key or None in child_key:
+                    continue
+
+                objects = children.setdefault(obj_name, {})
+                if objects.has_key(child_key):
+                    continue
+
+                if not factories.has_key(obj_name):
+                    obj = proof.getResolvedClass('Factory', obj_name, schema=self.getSchemaName())
+                    factories[obj_name] = obj(aggregate, logger=self.getLogger())
+
+                obj = factories[obj_name].constructObject(row, aggregate)
+                if obj:
+                    objects[child_key] = obj
+
+        for entry in roots.values():
+            if entry:
+                aggregate, children = entry
+                for obj_name in child_pks.keys():
+                    aggregate.setObjects(obj_name, children.get(obj_name, {}).values())
+                aggregate.touch()
+                self.__repository.resize(aggregate)
+                self.__repository.refresh(aggregate)
+
+        return aggregates
+
+    def __doSelectProbeAggregate(self, criteria):
+        """ Select the aggregates in two phases. The first query selects only
+            the root pks and timestamps with the criteria, and the cached
+            aggregates with the same timestamps are used as they are. The
+            second query selects the full rows of the rest by their pks.
+
+            @param criteria A Criteria.
+            @return A list of aggregates in the order of the first query.
+        """
+        pk_name        = self.__pk_columns[0].getFullyQualifiedName()
+        timestamp_name = self.__timestamp_column.getFullyQualifiedName()
+
+        # setAsColumns adds to the AS columns, so the root columns of an
+        # earlier select with the same criteria have to be dropped first.
+        # The columns of the caller are restored after the probe.
+        as_columns = criteria.getAsColumns().copy()
+        select_columns = criteria.getSelectColumns()
+        criteria.getAsColumns().clear()
+        criteria.setAsColumns( { pk_name        : pk_name,
+                                 timestamp_name : timestamp_name } )
+        try:
+            probes = self.doSelect(criteria, ret_dict=1)
+        finally:
+            criteria.getAsColumns().clear()
+            criteria.setAsColumns(as_columns)
+            criteria.setSelectColumns(select_columns)
+
+        # the cached aggregate or None for each probe row
+        cached = []
+        stale  = []
+        for probe in probes:
+            aggregate = None
+            if probe[pk_name] != None:
+                aggregate = self.__repository.get(ObjectKey.ObjectKey(probe[pk_name], pk_name))
+                if aggregate and not self.__isUpToDate(aggregate, probe):
+                    aggregate = None
+                if not aggregate:
+                    stale.append(probe[pk_name])
+            cached.append(aggregate)
+
+        self.debug( "%s version probe: %s rows, %s stale",
+                    self.__class__.__name__, len(probes), len(stale) )
+
+        rows = {}
+        if stale:
+            full_criteria = Criteria.Criteria( self.getProofInstance(),
+                                               db_name = self.getDBName(),
+                                               logger  = self.getLogger() )
+            full_criteria.addIn(pk_name, stale)
+            full_criteria.setAsColumns(self.__as_columns)
+            full_criteria.setUseTransaction(criteria.isUseTransaction())
+            for row in self.doSelect(full_criteria, ret_dict=1):
+                rows[row[pk_name]] = row
+
+        batch_load = self.__batch_load and not self.__lazy_load
+
+        aggregates = []
+        for probe, aggregate in zip(probes, cached):
+            if aggregate:
+                self.__repository.add_timestamp(probe[timestamp_name], aggregate)
+            else:
+                # a row deleted between the two queries is skipped
+                row = rows.get(probe[pk_name], None)
+                if row:
+                    aggregate = self.constructAggregate(row, load_objects=not batch_load)
+            if aggregate:
+                aggregates.append(aggregate)
+
+        if batch_load:
+            self.loadObjects( [ aggr for aggr in aggregates
+                                if aggr.getState() == ProofConstants.AGGR_NEW ] )
+
+        return aggregates
+
+    def doSelectTimestamps(self, pks):
+        """ Select the current timestamps of root rows by their pks.
+
+            @param pks A list of root ObjectKey objects.
+            @return A dictionary { pk string : timestamp } of the existing
+                    rows, or None if the root table has no timestamp column
+                    or has a combo primary key.
+        """
+        if not self.isInitialized():
+            self.initialize()
+
+        if not self.__timestamp_column or len(self.__pk_columns) != 1:
+            return None
+
+        timestamps = {}
+        if not pks:
+            return timestamps
+
+        pk_name        = self.__pk_columns[0].getFullyQualifiedName()
+        timestamp_name = self.__timestamp_column.getFullyQualifiedName()
+
+        criteria = Criteria.Criteria( self.getProofInstance(),
+                                      db_name = self.getDBName(),
+                                      logger  = self.getLogger() )
+        criteria.addIn(pk_name, [ pk.getValue() for pk in pks ])
+        criteria.setAsColumns( { pk_name        : pk_name,
+                                 timestamp_name : timestamp_name } )
+
+        for row in self.doSelect(criteria, ret_dict=1):
+            pk = ObjectKey.ObjectKey(row[pk_name], pk_name)
+            timestamps[str(pk)] = row[timestamp_name]
+
+        return timestamps
+
     def constructAggregates(self, rows):
+        """ Convert a list of root rows to a list of aggregates. In batch
+            load mode, the related objects of all new aggregates are loaded
+            with one query per related table. In lazy load mode, nothing is
+            loaded until accessed.
+
+            @param rows A list of root table rows.
+            @return A list of aggregates.
+        """
         results = []
         if rows and type(results)==type([]):
+            batch_load = self.__batch_load and not self.__lazy_load
             for row in rows:
-                aggr = self.constructAggregate(row)
+                aggr = self.constructAggregate(row, load_objects=not batch_load)
                 if aggr:
                     results.append(aggr)
+
+            if batch_load:
+                self.loadObjects( [ aggr for aggr in results
+                                    if aggr.getState() == ProofConstants.AGGR_NEW ] )
         return results
 
-    def constructAggregate(self, row):
+    def loadObjects(self, aggregates):
+        """ Load the related objects of a list of aggregates. Each related
+            table in the relation map is loaded by one IN query over the root
+            pks, and the rows are handed out to the aggregates they belong to.
+            Aggregates with combo root keys fall back to load one by one.
+
+            @param aggregates A list of aggregates created by this factory.
+        """
+        if not aggregates:
+            return
+
+        if not self.isInitialized():
+            self.initialize()
+
+        if len(self.__pk_columns) != 1:
+            for aggregate in aggregates:
+                aggregate.load_objects()
+                self.__repository.resize(aggregate)
+                self.__repository.refresh(aggregate)
+            return
+
+        pk_name = self.__pk_columns[0].getFullyQualifiedName()
+
+        aggr_dict = {}
+        for aggregate in aggregates:
+            aggr_dict[aggregate.getId()] = aggregate
+
+        proof = self.getProofInstance()
+        for obj_name in self.__relation_map.keys():
+            relation = self.__repository.getRelationList(obj_name)
+            if not relation:
+                continue
+
+            criteria = Criteria.Criteria( proof,
+                                          db_name = self.getDBName(),
+                                          logger  = self.getLogger() )
+            criteria.addIn(pk_name, aggr_dict.keys())
+            for left, right in zip(relation[0], relation[1]):
+                criteria.addJoin(left, right)
+
+            # the root pk is needed to find the aggregate for each row
+            criteria.addAsColumn(pk_name, pk_name)
+
+            obj = proof.getResolvedClass('Factory', obj_name, schema=self.getSchemaName())
+            factory = obj(aggregates[0], logger=self.getLogger())
+
+            rows = factory.doSelectRows(criteria)
+
+            objects = {}
+            for row in rows:
+                aggregate = aggr_dict.get(row.get(pk_name, None), None)
+                if not aggregate:
+                    continue
+                obj = factory.constructObject(row, aggregate)
+                if obj:
+                    objects.setdefault(aggregate.getId(), []).append(obj)
+
+            for id, aggregate in aggr_dict.items():
+                aggregate.setObjects(obj_name, objects.get(id, []))
+
+        for aggregate in aggregates:
+            aggregate.touch()
+            if aggregate.getState() == ProofConstants.AGGR_NEW:
+                # no related table at all
+                aggregate.load_objects()
+            # count and share the aggregate with its objects
+            self.__repository.resize(aggregate)
+            self.__repository.refresh(aggregate)
+
+    def constructAggregate(self, row, load_objects=True):
+        """ Convert a root row to an aggregate. The aggregate is taken from
+            the repository if it is cached and up-to-date.
+
+            @param row A root table row.
+            @param load_objects If false, a new aggregate is returned without
+                   its related objects, which should be loaded by loadObjects.
+                   It isn't stored in the L2 cache until then. It is ignored
+                   in lazy load mode.
+            @return An aggregate or None.
+        """
         #self.log( "start %s constructAggregate" % (self.__class__.__name__) )
         
         if not self.isInitialized():
             self.initialize()
 
+        if not self.__row_mapper:
+            self.__row_mapper = self.getRowMapper(self.__root_name)
+        mapper = self.__row_mapper
+
         # construct root object
         root_pk  = None
-        if len(self.__pk_columns) == 1:
-            column_map = self.__pk_columns[0]
-            column_name = column_map.getFullyQualifiedName()
+        pk_columns = mapper.getPKColumns()
+        if len(pk_columns) == 1:
+            column_name = pk_columns[0]
             column_value = row[column_name]
             # primary key can't be None
             if column_value == None:
                 return None
             root_pk = ObjectKey.ObjectKey(column_value, column_name)
-        elif len(self.__pk_columns) > 1:
+        elif len(pk_columns) > 1:
             pk_list = []
-            for pkc in self.__pk_columns:
-                column_name = pkc.getFullyQualifiedName()
+            for column_name in pk_columns:
                 column_value = row[column_name]
                 pk_list.append(ObjectKey.ObjectKey(column_value, column_name))
             root_pk = ComboKey.ComboKey(pk_list)
@@ -244,44 +784,39 @@ class AggregateFactory(BaseFactory.BaseFactory):
         
         aggregate = self.__repository.get(root_pk)
 
-        self.log( "Get aggregate '%s'." % (aggregate) )
+        self.debug( "Get aggregate '%s'.", aggregate )
         
         # check timestamp column value
-        timestamp_column_name  = None
         timestamp_column_value = None
         if self.__timestamp_column:
-            timestamp_column_name  = self.__timestamp_column.getColumnName()
-            timestamp_column_value = row.get("%s.%s" % (self.__root_name, timestamp_column_name), None)
+            timestamp_column_value = row.get( self.__timestamp_column.getFullyQualifiedName(),
+                                              None )
 
-        if aggregate and timestamp_column_name and timestamp_column_value and \
-               hasattr(aggregate, "get%s" % (timestamp_column_name)):
-            func = getattr(aggregate, "get%s" % (timestamp_column_name))
-            old_timestamp = func()
-            if not old_timestamp or old_timestamp < timestamp_column_value:
-                self.log( "Aggregate '%s' is out-of-date." % (aggregate) )
-                aggregate = None
+        if aggregate and not self.__isUpToDate(aggregate, row):
+            self.debug( "Aggregate '%s' is out-of-date.", aggregate )
+            aggregate = None
         
         if not aggregate:
             # create a new aggregate
-            self.log( "create a new aggregate" )
+            self.debug( "create a new aggregate" )
             proof = self.getProofInstance()
-            module_name = proof.getModuleForAggregate(self.__root_name, schema=self.getSchemaName())
-            class_name  = proof.getClassForAggregate(self.__root_name, schema=self.getSchemaName())
-            aggre_module = my_import(module_name)
-            obj = getattr(aggre_module, class_name)
+            obj = proof.getResolvedClass('Aggregate', self.__root_name, schema=self.getSchemaName())
             aggregate = obj(proof, root_pk, logger=self.getLogger())
 
             # set root object
             #self.log( "set root object" )
             root = self._makeObject(aggregate, self.__root_name, root_pk)
-            root.initialize(row)
+            root.initialize(row, mapper)
             aggregate.setRootObject(root)
 
             # load all related objects
-            aggregate.load_objects()
+            if load_objects and not self.__lazy_load:
+                aggregate.load_objects()
 
-            # add it to the repository
-            aggregate = self.__repository.add(aggregate)
+            # add it to the repository. An aggregate waiting for its objects
+            # is stored in the L2 cache after they are loaded.
+            aggregate = self.__repository.add( aggregate,
+                                               shared = load_objects or self.__lazy_load )
 
         # add timestamp if exists
         if timestamp_column_value:
@@ -291,6 +826,29 @@ class AggregateFactory(BaseFactory.BaseFactory):
         return aggregate
     
 
+    def __isUpToDate(self, aggregate, row):
+        """ Compare the timestamp of a cached aggregate with a root row.
+
+            @param aggregate A cached aggregate.
+            @param row A root row with the timestamp column.
+            @return False if the row is newer than the aggregate.
+        """
+        if not self.__timestamp_column:
+            return True
+
+        timestamp_column_name  = self.__timestamp_column.getColumnName()
+        timestamp_column_value = row.get( self.__timestamp_column.getFullyQualifiedName(),
+                                          None )
+
+        if timestamp_column_value and \
+               hasattr(aggregate, "get%s" % (timestamp_column_name)):
+            func = getattr(aggregate, "get%s" % (timestamp_column_name))
+            old_timestamp = func()
+            if not old_timestamp or old_timestamp < timestamp_column_value:
+                return False
+
+        return True
+
     def doTotalSelect(self, criteria):
         """ Override to add Join and Group statements.
         """
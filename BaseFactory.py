@@ -17,10 +17,12 @@ import logging
 import copy
 
 import util.logger.Logger as Logger
+import util.LazyLog as LazyLog
 import util.UniqueList as UniqueList
 from util.Trace import traceBack
 
 import proof.ProofInstance as ProofInstance
+import proof.ProofConstants as ProofConstants
 import proof.ProofException as ProofException
 import proof.sql.SQLConstants as SQLConstants
 import proof.sql.SQLExpression as SQLExpression
@@ -47,6 +49,7 @@ class BaseFactory:
         self.__db_name     = self.__proof.getDBName(schema_name)
         self.__logger      = Logger.makeLogger(logger)
         self.log           = self.__logger.write
+        self.debug         = LazyLog.LazyLog(self.__logger)
 
     def getProofInstance(self):
         return self.__proof
@@ -57,57 +60,85 @@ class BaseFactory:
     def getDBName(self):
         return self.__db_name
 
+    def getRowMapper(self, table_name):
+        """ Get the compiled RowMapper of a table, with the object class for
+            this factory's schema resolved.
+
+            @param table_name The table name.
+            @return A RowMapper.
+        """
+        proof     = self.getProofInstance()
+        db_map    = proof.getDatabaseMap(self.__db_name)
+        table_map = db_map.getTable(table_name)
+        mapper    = table_map.getRowMapper()
+
+        if not mapper.getObjectClass(self.__schema_name):
+            mapper.setObjectClass( self.__schema_name,
+                                   proof.getResolvedClass( 'Object',
+                                                           table_name,
+                                                           schema = self.__schema_name ) )
+
+        return mapper
+
     #================= Functions to do database queries ==================
 
-    def __query(self, sql, con=None, ret_dict=0):
+    def __query(self, sql, con=None, ret_dict=0, args=None):
         """ A convenient method to make query to database.
 
             @param sql A complete SQL query string.
             @param con A existed Connection instance.
             @param ret_dict If true, return as dictionary.
+            @param args A list of values bound to the %s placeholders in
+                   sql, or None if the values are inlined.
         """
         if con:
             # execute only without closing the connection
             try:
                 cursor = con.getCursor(ret_dict=ret_dict)
                 #self.log("cursor: %s"%(cursor))
-                cursor.execute(sql)
+                cursor.execute(sql, args)
                 #self.log("returning results.")
                 return cursor.fetchall()
             except:
-                self.log( "Exception in query: %s\nException: %s" % \
-                                    (sql, traceBack()), logging.ERROR )
+                self.log( "Exception in query: %s %s\nException: %s" % \
+                                    (sql, args, traceBack()), logging.ERROR )
         else:
             try:
                 try:
                     con = self.__proof.getConnection(self.__db_name)
                     cursor = con.getCursor(ret_dict=ret_dict)
-                    cursor.execute(sql)
+                    cursor.execute(sql, args)
                     return cursor.fetchall()
                 except:
                     self.log( "Exception in query: %s" % (traceBack()), logging.ERROR )
             finally:
                 self.__proof.closeConnection(con)
 
-    def __execute(self, sql, con=None):
+    def __execute(self, sql, con=None, raise_error=False, args=None):
         """ A convenient method to make insert/update/delete to database.
 
             @param con A existed Connection instance.
             @param sql A complete SQL executing string.
+            @param raise_error If true, an exception with an existed connection
+                   is raised again so that the transaction can be rolled back.
+            @param args A list of values bound to the %s placeholders in
+                   sql, or None if the values are inlined.
         """
         if con:
             # execute only without closing the connection
             try:
                 cursor = con.getCursor()
-                return cursor.execute(sql)
+                return cursor.execute(sql, args)
             except:
                 self.log( "Exception in execute: %s" % (traceBack()), logging.ERROR )
+                if raise_error:
+                    raise
         else:
             try:
                 try:
                     con = self.__proof.getConnection(self.__db_name)
                     cursor = con.getCursor()
-                    return cursor.execute(sql)
+                    return cursor.execute(sql, args)
                 except:
                     self.log( "Exception in execute: %s" % (traceBack()), logging.ERROR )
             finally:
@@ -138,6 +169,17 @@ class BaseFactory:
     
         return results
     
+    def __invalidate(self, tables):
+        """ Invalidate the query results which read any of the tables changed
+            by this factory.
+
+            @param tables A list of table names.
+        """
+        cache = self.__proof.getQueryCache()
+        if cache and tables:
+            cache.invalidate( self.__db_name,
+                              [ string.split(table)[0] for table in tables ] )
+
     # DELETE
     #===========
 
@@ -164,9 +206,11 @@ class BaseFactory:
                                                 sql_expr.build( column,
                                                                 value,
                                                                 SQLConstants.EQUAL ) )
-            self.log("%s.deleteAll: %s" % (self.__class__.__name__, sql))
+            self.debug("%s.deleteAll: %s", self.__class__.__name__, sql)
             
-            return self.__commit( [sql] )
+            results = self.__commit( [sql] )
+            self.__invalidate([table])
+            return results
 
     def doDelete( self, criteria ):
         """ Method to perform deletes based on values and keys in a Criteria.
@@ -185,6 +229,7 @@ class BaseFactory:
                                      useTransaction=criteria.isUseTransaction() )
             result = self.__delete(criteria, con)
             transaction.commit()
+            self.__invalidate(result.keys())
         except:
             self.log( "Exception in doDelete: %s" % (traceBack()), logging.ERROR )
             transaction.safeRollback()
@@ -256,7 +301,7 @@ class BaseFactory:
             if whereStr:
                 sql += " WHERE %s" % (whereStr)
 
-                self.log( "%s.doDelete: %s" % (self.__class__.__name__, sql) )
+                self.debug( "%s.doDelete: %s", self.__class__.__name__, sql )
                 
                 results[table] = self.__execute(sql, con)
 
@@ -282,6 +327,7 @@ class BaseFactory:
                                      useTransaction=criteria.isUseTransaction() )
             id = self.__insert(criteria, con)
             transaction.commit()
+            self.__invalidate([criteria.getTableName(criteria.keys()[0])])
         except:
             self.log( "Exception in doInsert: %s" % (traceBack()), logging.ERROR )
             transaction.safeRollback()
@@ -356,32 +402,176 @@ class BaseFactory:
 
         sql_expr = SQLExpression.SQLExpression()
         #self.log("doInsert: (%s) (%s)"%(column_list, value_list), level=logging.INFO)
-        (column_list, value_list) = sql_expr.buildInsertList(column_list, value_list)
+        args = []
+        (column_list, value_list) = sql_expr.buildInsertParams(column_list, value_list, args)
 
         sql = "INSERT INTO %s (%s) VALUES (%s)" % ( table_name,
                                                     string.join(column_list, ", "),
                                                     string.join(value_list, ", ") )
 
-        self.log( "%s.doInsert: %s" % (self.__class__.__name__, sql) )
+        self.debug( "%s.doInsert: %s %s", self.__class__.__name__, sql, args )
 
-        self.__execute(sql, con)
+        self.__execute(sql, con, args=args)
 
         if pk and key_gen and key_gen.isPostInsert():
             id = key_gen.getId(connection=con, key_info=key_info)
 
         return id
 
+    def doInsertList( self,
+                      rows,
+                      chunk_size     = ProofConstants.DEFAULT_INSERT_CHUNK_SIZE,
+                      useTransaction = True ):
+        """ Method to insert many rows into one table with multi-row INSERT
+            statements. The rows are split into chunks of chunk_size, and
+            each chunk is inserted in its own transaction. Inside a chunk,
+            consecutive rows with the same columns share one statement.
+            <p>
+            For an auto incremented primary key, the ids are derived from the
+            first insert id of each statement and the row count, which relies
+            on the database to allocate consecutive ids in a multi-row insert
+            (MySQL does for InnoDB with innodb_autoinc_lock_mode 0 or 1).
+
+            @param rows A list of dictionaries with 'Table.Column' keys. All
+                   rows should be in the same table.
+            @param chunk_size The maximum number of rows in one transaction.
+            @param useTransaction Whether to use transactions.
+            @return A list of ids in the same order as rows. If a chunk fails,
+                    it is rolled back, and its ids and the ids of the rows
+                    after it are None.
+        """
+        ids = [None] * len(rows)
+        if not rows:
+            return ids
+
+        keys = rows[0].keys()
+        if keys:
+            table_name = string.split(keys[0], '.')[0]
+        else:
+            raise ProofException.ProofImproperUseException( \
+                    "Database insert attempted without anything specified to insert." )
+
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start+chunk_size]
+
+            transaction = Transaction.Transaction(self.__proof, logger=self.__logger)
+            try:
+                con = transaction.begin( self.__db_name,
+                                         useTransaction=useTransaction )
+                chunk_ids = self.__insertList(table_name, chunk, con)
+                transaction.commit()
+                self.__invalidate([table_name])
+            except:
+                self.log( "Exception in doInsertList: %s" % (traceBack()), logging.ERROR )
+                transaction.safeRollback()
+                break
+
+            ids[start:start+len(chunk)] = chunk_ids
+
+        return ids
+
+    def __insertList( self, table_name, rows, con ):
+        """ Insert a list of rows with multi-row INSERT statements on a
+            connection. Refer to doInsertList.
+
+            @param table_name The table name.
+            @param rows A list of dictionaries with 'Table.Column' keys.
+            @param con A Connection.
+            @return A list of ids in the same order as rows.
+        """
+        db_map      = self.__proof.getDatabaseMap(self.__db_name)
+        table_map   = db_map.getTable(table_name)
+        column_maps = table_map.getColumns()
+        key_info    = table_map.getPrimaryKeyMethodInfo()
+        key_gen     = table_map.getIdGenerator()
+
+        pk = None
+        for column_map in column_maps:
+            if column_map.isPrimaryKey():
+                pk = column_map
+                break
+
+        pk_name = pk and pk.getFullyQualifiedName()
+
+        # columns of each row, with the generated pk added if required
+        ids         = []
+        row_columns = []
+        for row in rows:
+            if not row or string.split(row.keys()[0], '.')[0] != table_name:
+                raise ProofException.ProofImproperUseException( \
+                        "%s.doInsertList: all rows should be in table '%s'." % \
+                        (self.__class__.__name__, table_name) )
+
+            id = None
+            if pk and not row.has_key(pk_name):
+                if not key_gen:
+                    raise ProofException.ProofNotFoundException( \
+                        "IDGenerator for table '%s' is None" % (table_name) )
+
+                if key_gen.isPriorToInsert():
+                    id = key_gen.getId(connection=con, key_info=key_info)
+                    row = row.copy()
+                    row[pk_name] = id
+            elif pk:
+                id = row[pk_name]
+            ids.append(id)
+
+            column_list = []
+            for column in column_maps:
+                column_name = column.getFullyQualifiedName()
+                if row.has_key(column_name):
+                    column_list.append(column_name)
+            row_columns.append((column_list, row))
+
+        sql_expr = SQLExpression.SQLExpression()
+
+        # one statement for each run of rows with the same columns
+        i = 0
+        while i < len(row_columns):
+            column_list = row_columns[i][0]
+            j = i
+            values = []
+            args   = []
+            while j < len(row_columns) and row_columns[j][0] == column_list:
+                row = row_columns[j][1]
+                (columns, value_list) = sql_expr.buildInsertParams( column_list,
+                                                                    [ row[k] for k in column_list ],
+                                                                    args )
+                values.append("(%s)" % (string.join(value_list, ", ")))
+                j += 1
+
+            sql = "INSERT INTO %s (%s) VALUES %s" % ( table_name,
+                                                      string.join(columns, ", "),
+                                                      string.join(values, ", ") )
+
+            self.debug( "%s.doInsertList: %d rows into %s",
+                        self.__class__.__name__, j - i, table_name )
+
+            self.__execute(sql, con, raise_error=True, args=args)
+
+            if pk and key_gen and key_gen.isPostInsert() and \
+                   pk_name not in column_list:
+                first_id = key_gen.getId(connection=con, key_info=key_info)
+                for k in range(i, j):
+                    ids[k] = first_id + (k - i)
+
+            i = j
+
+        return ids
+
     # SELECT
     #===========
 
-    def createQueryString(self, criteria):
+    def createQueryString(self, criteria, args=None):
         """ Method to create an SQL query for actual execution based on values in a
             Criteria.
             
             @param criteria A Criteria.
+            @param args If a list is given, the values in the where clause
+                   are replaced by %s placeholders and appended to it.
             @return the SQL query for actual execution
         """
-        query = self.createQuery(criteria)
+        query = self.createQuery(criteria, args)
 
         #adapter = self.__proof.getAdapter(criteria.getDbName())
         #
@@ -407,18 +597,20 @@ class BaseFactory:
 
         sql = str(query)
 
-        self.log( "SQL: %s" % (sql) )
+        self.debug( "SQL: %s %s", sql, args or '' )
 
         return sql
 
-    def createTotalQueryString(self, criteria, count_str=None):
+    def createTotalQueryString(self, criteria, count_str=None, args=None):
         """ Method to create a SQL query for the total records using actual execution
             based on values in a Criteria.
             
             @param criteria A Criteria.
+            @param args If a list is given, the values in the where clause
+                   are replaced by %s placeholders and appended to it.
             @return the SQL query for the total records
         """
-        query = self.createQuery(criteria)
+        query = self.createQuery(criteria, args)
 
         if count_str:
             query.setSelectClause([count_str])
@@ -429,37 +621,75 @@ class BaseFactory:
         
         sql = str(query)
 
-        self.log( "SQL for total: %s" % (sql) )
+        self.debug( "SQL for total: %s %s", sql, args or '' )
 
         return sql
     
-    def createRawQueryString(self, criteria, select_clause=[]):
+    def createRawQueryString(self, criteria, select_clause=[], args=None):
         """ Method to create a SQL query for any columns using actual execution
             based on values in a Criteria.
             
             @param criteria A Criteria.
+            @param args If a list is given, the values in the where clause
+                   are replaced by %s placeholders and appended to it.
             @return the SQL query string.
         """
-        query = self.createQuery(criteria)
+        query = self.createQuery(criteria, args)
         query.setSelectClause(select_clause)
         query.setSelectModifiers(UniqueList.UniqueList())
         
         sql = str(query)
 
-        self.log( "SQL for raw query: %s" % (sql) )
+        self.debug( "SQL for raw query: %s %s", sql, args or '' )
 
         return sql
 
 
-    def createQuery(self, criteria):
+    def createQuery(self, criteria, args=None):
         """ Method to create a SQL query based on values in a Criteria.  Note that
             final manipulation of the limit and offset are performed when the query
             is actually executed.
+            <p>
+            If args is given, the values in the where clause are replaced by
+            %s placeholders and appended to args, which is also set to the
+            query. Queries which only differ in their values then have the
+            same SQL, and the database doesn't need to parse a new statement.
+            Such a query is compiled once for each shape of the criteria
+            (refer to Criteria.__shape__) and cached by the ProofInstance,
+            and later only the values are bound.
             
             @param criteria A Criteria.
+            @param args A list which the bound values are appended to, or
+                   None to inline the values.
             @return the Query object
         """
-        self.log( "start %s create query" % (self.__class__.__name__) )
+        if args == None:
+            return self.__compileQuery(criteria)
+
+        values = []
+        key = criteria.__shape__(values)
+
+        template = self.__proof.getQueryTemplate(key)
+        if template == None:
+            query = self.__compileQuery(criteria, args)
+            self.__proof.setQueryTemplate(key, query.copy())
+            return query
+
+        args.extend(values)
+        query = template.copy()
+        query.setArgs(args)
+        return query
+
+    def __compileQuery(self, criteria, args=None):
+        """ Build a SQL query based on values in a Criteria. Refer to
+            createQuery.
+
+            @param criteria A Criteria.
+            @param args A list which the bound values are appended to, or
+                   None to inline the values.
+            @return the Query object
+        """
+        self.debug( "start %s create query", self.__class__.__name__ )
         query     = Query.Query()
         adapter   = self.__proof.getAdapter(criteria.getDbName())
         db_map    = self.__proof.getDatabaseMap(criteria.getDbName())
@@ -501,7 +731,13 @@ class BaseFactory:
         for key in aliases.keys():
             select_clause.append( "%s AS %s%s%s" % (aliases[key], str_delimiter, key, str_delimiter))
 
-        where_clause = UniqueList.UniqueList()
+        # with bound values, criterions on the same column and comparison
+        # build the same placeholder SQL, and each of them has its values in
+        # args, so none of them can be dropped as a duplicate
+        if args == None:
+            where_clause = UniqueList.UniqueList()
+        else:
+            where_clause = []
         for key in criteria.keys():
             criterion = criteria.getCriterion(key)
             attached_criteria = criterion.getAttachedCriterion()
@@ -519,7 +755,9 @@ class BaseFactory:
                 crit.setIgnoreCase(ignorCase)
 
             criterion.setAdapter(adapter)
-            where_clause.append( str(criterion) )
+            sql = criterion.buildSQL(args)
+            if sql:
+                where_clause.append(sql)
 
         sql_expr = SQLExpression.SQLExpression()
         joinL = criteria.getJoinL()
@@ -552,7 +790,11 @@ class BaseFactory:
                 ignorCase = (criteria.isIgnoreCase() and \
                              db_map.getTable(table).getColumn(column_name).getType()==type(""))
 
-                where_clause.append(sql_expr.buildInnerJoin(L, R, ignorCase, adapter))
+                join = sql_expr.buildInnerJoin(L, R, ignorCase, adapter)
+                if args != None:
+                    join = string.replace(join, '%', '%%')
+                if join not in where_clause:
+                    where_clause.append(join)
 
         group_by_clause = UniqueList.UniqueList()
         if group_by:
@@ -599,8 +841,8 @@ class BaseFactory:
 
                 from_clause.append(table_name2)
                 
-                self.log("TABLE NAME 2: %s"%(table_name2))
-                self.log("Column Name: %s" %(column_name))
+                self.debug("TABLE NAME 2: %s", table_name2)
+                self.debug("Column Name: %s", column_name)
                 column = db_map.getTable(table_name2).getColumn(column_name)
                 if not cast_type and column.getType() == type(""):
                     icolumn_name = adapter.ignoreCaseInOrderBy("%s.%s" % (table_name2,column_name))
@@ -631,12 +873,13 @@ class BaseFactory:
         query.setWhereClause(where_clause)
         query.setOrderByClause(order_by_clause)
         query.setGroupByClause(group_by_clause)
+        query.setArgs(args)
         
         #self.log("LIMIT String: %s"%(limit_string), level=logging.INFO)
         if limit_string:
             query.setLimit(limit_string)
 
-        self.log( "return query" )
+        self.debug( "return query" )
         return query
 
     def createQueryDisplayString(self, criteria):
@@ -655,7 +898,7 @@ class BaseFactory:
             @param criteria A Criteria.
             @return A list of rows.
         """
-        self.log( "start %s doSelect" % (self.__class__.__name__) )
+        self.debug( "start %s doSelect", self.__class__.__name__ )
         
         transaction = Transaction.Transaction(self.__proof, logger=self.__logger)
 
@@ -671,7 +914,7 @@ class BaseFactory:
             self.log( "Exception in doSelect: %s" % (traceBack()), logging.ERROR )
             transaction.safeRollback()
 
-        self.log( "return %s doSelect result" % (self.__class__.__name__) )
+        self.debug( "return %s doSelect result", self.__class__.__name__ )
         return results
 
     def __select(self, criteria, con, ret_dict=0):
@@ -681,8 +924,34 @@ class BaseFactory:
             @param con A Connection.
             @return A list of Objects this Factory represents.
         """
-        sql = self.createQueryString(criteria)
-        results = self.__query(sql, con, ret_dict)
+        args = []
+        sql = self.createQueryString(criteria, args)
+        results = self.__query(sql, con, ret_dict, args)
+
+        return results
+
+    def doSelectSQL(self, sql, ret_dict=0, useTransaction=False, args=None):
+        """ Returns all results of a complete SQL query string. It is used
+            when a query can't be expressed by a Criteria, e.g. LEFT JOIN.
+
+            @param sql A complete SQL query string.
+            @param ret_dict If true, return rows as dictionaries.
+            @param useTransaction If true, execute within a transaction.
+            @param args A list of values bound to the %s placeholders in
+                   sql, or None if the values are inlined.
+            @return A list of rows.
+        """
+        transaction = Transaction.Transaction(self.__proof, logger=self.__logger)
+
+        results = []
+        try:
+            con = transaction.begin( self.__db_name,
+                                     useTransaction=useTransaction )
+            results = self.__query(sql, con, ret_dict, args) or []
+            transaction.commit()
+        except:
+            self.log( "Exception in doSelectSQL: %s" % (traceBack()), logging.ERROR )
+            transaction.safeRollback()
 
         return results
 
@@ -713,8 +982,9 @@ class BaseFactory:
             @param con A Connection.
             @return An integer indicating the total.
         """
-        sql = self.createTotalQueryString(criteria, count_str)
-        result = self.__query(sql, con)
+        args = []
+        sql = self.createTotalQueryString(criteria, count_str, args)
+        result = self.__query(sql, con, args=args)
         
         return result[0][0]
     
@@ -745,14 +1015,17 @@ class BaseFactory:
             @param con A Connection.
             @return A list of record dicts.
         """
-        sql = self.createRawQueryString(criteria, select_clause)
-        return self.__query(sql, con)
+        args = []
+        sql = self.createRawQueryString(criteria, select_clause, args)
+        return self.__query(sql, con, args=args)
         
     
-    def doPageSelect(self, criteria):
+    def doPageSelect(self, criteria, keyset=False):
         """ Return a PageSelect.
 
             @param criteria A Criteria.
+            @param keyset If true, the pages are fetched in keyset mode,
+                   refer to PageSelect.setKeyset.
             @return A PageSelect object.
         """
         limit = criteria.getLimit();
@@ -760,7 +1033,8 @@ class BaseFactory:
         return PageSelect.PageSelect( criteria,
                                       limit,
                                       self,
-                                      logger = self.__logger )
+                                      logger = self.__logger,
+                                      keyset = keyset )
 
     def getPrimaryKey(self, criteria):
         """ Helper method which returns the primary key contained
@@ -814,13 +1088,48 @@ class BaseFactory:
                                      useTransaction=update_criteria.isUseTransaction() )
             result = self.__update(update_criteria, con, where_criteria)
             transaction.commit()
+            self.__invalidate(result.keys())
         except:
             self.log( "Exception in doUpdate: %s" % (traceBack()), logging.ERROR )
             transaction.safeRollback()
 
         return result
 
-    def __update(self, update_criteria, con, where_criteria=None):
+    def doUpdateList(self, updates, useTransaction=True):
+        """ Run a list of updates on one connection in one transaction. If any
+            of the updates fails, the whole transaction is rolled back.
+
+            @param updates A list of ( update_criteria, where_criteria ) pairs.
+                   The statements are executed in the order of the list.
+            @param useTransaction Whether to use a transaction.
+            @return A list of the results of doUpdate, or None if the updates
+                    were rolled back.
+        """
+        transaction = Transaction.Transaction(self.__proof, logger=self.__logger)
+
+        results = None
+        try:
+            con = transaction.begin( self.__db_name,
+                                     useTransaction=useTransaction )
+            results = []
+            for update_criteria, where_criteria in updates:
+                results.append( self.__update( update_criteria,
+                                               con,
+                                               where_criteria,
+                                               raise_error = True ) )
+            transaction.commit()
+            tables = UniqueList.UniqueList()
+            for result in results:
+                tables.extend(result.keys())
+            self.__invalidate(tables)
+        except:
+            self.log( "Exception in doUpdateList: %s" % (traceBack()), logging.ERROR )
+            transaction.safeRollback()
+            results = None
+
+        return results
+
+    def __update(self, update_criteria, con, where_criteria=None, raise_error=False):
         """ Convenience method used to update rows in the DB.
 
             @param update_criteria A Criteria object containing values used in
@@ -828,6 +1137,7 @@ class BaseFactory:
             @param con A Connection.
             @param where_criteria A Criteria object containing values used in
                     where clause.
+            @param raise_error If true, a failed statement raises an exception.
         """
         if where_criteria:
             assert isinstance(where_criteria, Criteria.Criteria)
@@ -860,27 +1170,32 @@ class BaseFactory:
             column_maps = table_map.getColumns()
 
             where_clause = UniqueList.UniqueList()
+            where_args   = []
             column_list  = []
             value_list   = []
             for column_map in column_maps:
                 k = column_map.getFullyQualifiedName()
                 if where_criteria.has_key(k):
                     if where_criteria.getComparison(k) == SQLConstants.CUSTOM:
-                        where_clause.append(where_criteria[k])
+                        where_clause.append(string.replace(where_criteria[k], '%', '%%'))
                     else:
-                        where_clause.append( sql_expr.build(
+                        where_clause.append( sql_expr.buildParam(
                             column_map.getColumnName(),
                             where_criteria.getValue(k),
                             where_criteria.getComparison(k),
+                            where_args,
                             where_criteria.isIgnoreCase(),
                             adapter ) )
               
-                # build set clause using buildInsertList method
+                # build set clause using buildInsertParams method
                 if update_criteria.has_key(k):
                     column_list.append(k)
                     value_list.append(update_criteria[k])
         
-            (column_list, value_list) = sql_expr.buildInsertList(column_list, value_list)
+            # the set values come before the where values in the statement
+            args = []
+            (column_list, value_list) = sql_expr.buildInsertParams(column_list, value_list, args)
+            args.extend(where_args)
 
             set_clause = UniqueList.UniqueList()
             for column, value in zip(column_list, value_list):
@@ -891,9 +1206,9 @@ class BaseFactory:
             
             sql = "UPDATE %s set %s WHERE %s" % (table, set_str, where_str)
 
-            self.log("%s.doUpdate: %s" % (self.__class__.__name__, sql))
+            self.debug("%s.doUpdate: %s %s", self.__class__.__name__, sql, args)
             
-            results[table] = self.__execute(sql, con)
+            results[table] = self.__execute(sql, con, raise_error, args)
 
         return results
 
@@ -912,6 +1227,7 @@ class BaseFactory:
     def setLogger(self, logger):
         self.__logger = Logger.makeLogger(logger)
         self.log = self.__logger.write
+        self.debug = LazyLog.LazyLog(self.__logger)
  
     def __getstate__(self):
         """ Used by pickle when the class is serialized.
@@ -921,6 +1237,7 @@ class BaseFactory:
         d = copy.copy(self.__dict__)
         del d["__logger"]
         del d["log"]
+        del d["debug"]
         del d["__proof"]
         return d
     
@@ -932,6 +1249,7 @@ class BaseFactory:
         logger = Logger.makeLogger(None)
         d["__logger"] = logger
         d["log"] = logger.write
+        d["debug"] = LazyLog.LazyLog(logger)
         d["__proof"] = None
         self.__dict__ = d
             
@@ -16,8 +16,10 @@ import copy
 
 import util.logger.Logger as Logger
 import util.UniqueList as UniqueList
+import util.memory as memory
 
 import proof.ProofException as ProofException
+import proof.ProofConstants as ProofConstants
 import proof.pk.ObjectKey as ObjectKey
 import proof.sql.Criteria as Criteria
 import proof.ObjectFactory as ObjectFactory
@@ -59,15 +61,12 @@ class BaseObject:
         """
         proof = self.__aggregate.getProofInstance()
         self.__db_name = proof.getDBName(self.__db_schema)
-        db_map      = proof.getDatabaseMap(self.__db_name)
-        table_map   = db_map.getTable(self.__table_name)
-        column_maps = table_map.getColumns()
 
-        for column_map in column_maps:
-            if not column_map.isPrimaryKey():
-                self.__attributes[column_map.getColumnName()] = None
+        mapper = self.__getRowMapper()
+        for key in mapper.getAttributeNames():
+            self.__attributes[key] = None
 
-        self.__timestamp_column = table_map.getTimestampColumn()
+        self.__timestamp_column = mapper.getTimestampColumn()
 
 
     def isInitialized(self):
@@ -76,18 +75,25 @@ class BaseObject:
     def setInitialized(self, initialized=True):
         self.__initialized = initialized
 
-    def initialize(self, attrs):
+    def initialize(self, attrs, row_mapper=None):
         """ Intialize all attributes for this object.
 
             @param attrs A dictionary with column_name/value pairs.
+            @param row_mapper The RowMapper of this table if the caller has it.
         """
-        for key in self.__attributes.keys():
-            if attrs.has_key( "%s.%s" % (self.__table_name, key) ):
-                self.__attributes[key] = attrs["%s.%s" % (self.__table_name, key)]
-            elif attrs.has_key( key ):
-                self.__attributes[key] = attrs[key]
+        if not row_mapper:
+            row_mapper = self.__getRowMapper()
+        row_mapper.mapAttributes(attrs, self.__attributes)
         self.__initialized = True
 
+    def __getRowMapper(self):
+        """ Get the compiled RowMapper of this table.
+        """
+        proof     = self.__aggregate.getProofInstance()
+        db_map    = proof.getDatabaseMap(self.__db_name)
+        table_map = db_map.getTable(self.__table_name)
+        return table_map.getRowMapper()
+
     def isDirty(self):
         return self.__is_dirty
     
@@ -128,6 +134,12 @@ class BaseObject:
         """
         return self.__dirty_attrs
 
+    def getSize(self):
+        """ Return the estimated size of the attributes in bytes. The object
+            is not loaded.
+        """
+        return memory.sizeof(self.__attributes) + memory.sizeof(self.__dirty_attrs)
+
     def __getitem__(self, key):
         """ Like a dict.
         """
@@ -158,8 +170,14 @@ class BaseObject:
         return self.__attributes.has_key(key)
 
     def load(self):
-        """ Load the attribute values.
+        """ Load the attribute values. An unloaded root object is loaded
+            together with the other unloaded roots in the repository.
         """
+        if not self.__initialized and \
+               self.__aggregate.isRootObjectName(self.__table_name) and \
+               type(self.__pk.getValue()) != type([]):
+            self.__loadBatch()
+
         if not self.__initialized:
             proof = self.__aggregate.getProofInstance()
             criteria = Criteria.Criteria( proof,
@@ -191,6 +209,54 @@ class BaseObject:
             
             self.__initialized = True
 
+    def __loadBatch(self):
+        """ Load this object and the unloaded root objects of the same
+            repository with one IN query.
+        """
+        proof = self.__aggregate.getProofInstance()
+        repository = proof.getInstanceForRepository( self.__table_name,
+                                                     schema = self.__db_schema )
+
+        objects = { str(self.__pk.getValue()) : self }
+        for obj in repository.getUnloadedRoots(ProofConstants.DEFAULT_LOAD_BATCH_SIZE):
+            pk = obj.getPK()
+            if not obj.isInitialized() and \
+                   obj.getTableName() == self.__table_name and \
+                   type(pk.getValue()) != type([]):
+                objects[str(pk.getValue())] = obj
+
+        # nothing to batch
+        if len(objects) < 2:
+            return
+
+        criteria = Criteria.Criteria( proof,
+                                      db_name = self.__db_name,
+                                      logger  = self.__logger )
+        criteria.addIn( self.__pk.getFullyQualifiedName(),
+                        [ obj.getPK().getValue() for obj in objects.values() ] )
+
+        # select column
+        select_columns = UniqueList.UniqueList()
+        select_columns.append(self.__pk.getFullyQualifiedName())
+        for key in self.__attributes.keys():
+            select_columns.append("%s.%s" % (self.__table_name, key))
+        criteria.setSelectColumns(select_columns)
+
+        factory = ObjectFactory.ObjectFactory( self.__aggregate,
+                                               schema_name = self.__db_schema,
+                                               table_name  = self.__table_name,
+                                               logger      = self.__logger )
+        results = factory.doSelect(criteria, ret_dict=1)
+
+        pk_name = self.__pk.getColumnName()
+        for row in results or []:
+            obj = objects.get(str(row.get(pk_name, None)), None)
+            if obj and not obj.isInitialized():
+                obj.initialize(row)
+
+        # same as the single load, a missing row leaves this object empty
+        self.__initialized = True
+
     def unload(self):
         """ Unload attribute values from this object.
         """
@@ -215,6 +281,28 @@ class BaseObject:
                    then the timestamp column will set to NULL.
         """
         result = 0
+        criterias = self._getUpdateCriteria(force)
+        if criterias:
+            update_criteria, where_criteria = criterias
+
+            factory = ObjectFactory.ObjectFactory( self.__aggregate,
+                                                   schema_name = self.__db_schema,
+                                                   table_name  = self.__table_name,
+                                                   logger      = self.__logger )
+
+            result = factory.doUpdate(update_criteria, where_criteria)
+
+            self._setUpdated()
+
+        return result
+
+    def _getUpdateCriteria(self, force=False):
+        """ Build the criterias to update this object.
+
+            @param force Refer to update().
+            @return A tuple of ( update_criteria, where_criteria ), or None if
+                    there is nothing to update.
+        """
         if self.__is_dirty or (force and self.__timestamp_column):
             proof = self.__aggregate.getProofInstance()
 
@@ -239,22 +327,21 @@ class BaseObject:
             else:
                 where_criteria[self.__pk.getFullyQualifiedName()] = pk_value
 
-            factory = ObjectFactory.ObjectFactory( self.__aggregate,
-                                                   schema_name = self.__db_schema,
-                                                   table_name  = self.__table_name,
-                                                   logger      = self.__logger )
-
-            result = factory.doUpdate(update_criteria, where_criteria)
+            return (update_criteria, where_criteria)
 
-            # update the attribute dict
-            for key, value in self.__dirty_attrs.items():
-                self.__attributes[key] = value
-                
-            # clean up dirty attrs
-            self.__dirty_attrs = {}
-            self.__is_dirty = False
+        return None
 
-        return result
+    def _setUpdated(self):
+        """ Move the dirty attributes into the attribute dict after they are
+            written to database.
+        """
+        # update the attribute dict
+        for key, value in self.__dirty_attrs.items():
+            self.__attributes[key] = value
+            
+        # clean up dirty attrs
+        self.__dirty_attrs = {}
+        self.__is_dirty = False
 
     def cancel(self):
         """ Revert the changes.
@@ -315,8 +402,6 @@ class BaseObject:
             Remove the 'proof', 'logger' attributes before serialization.
             @hidden
         """
-        self.log = None
-        self.__logger = None
         d = copy.copy(self.__dict__)
         del d["log"]
         del d["_BaseObject__logger"]
@@ -13,13 +13,10 @@ __author__ = "Duan Guoqiang (mattgduan@gmail.com)"
 
 import logging
 
-from util.Import import my_import
 import util.UniqueList as UniqueList
 
 import proof.ProofException as ProofException
 import proof.BaseFactory as BaseFactory
-import proof.pk.ObjectKey as ObjectKey
-import proof.pk.ComboKey as ComboKey
 import proof.Aggregate as Aggregate
 
 
@@ -55,6 +52,9 @@ class ObjectFactory(BaseFactory.BaseFactory):
         # whether self.init_select() called
         self.__initialized = 0
 
+        # compiled row mapper of the table
+        self.__row_mapper = None
+
     def initialize(self):
         """ Initialize required select and where fields for the aggregate.
         """
@@ -133,6 +133,16 @@ class ObjectFactory(BaseFactory.BaseFactory):
             @param criteria A Criteria.
             @return A list of objects.
         """
+        results = self.doSelectRows(criteria)
+        return self.constructObjects(results)
+
+    def doSelectRows(self, criteria):
+        """ Returns all rows with the columns of this table. Any AS columns
+            already added to the criteria are kept in the rows.
+        
+            @param criteria A Criteria.
+            @return A list of row dicts.
+        """
         if not self.isInitialized():
             self.initialize()
 
@@ -140,60 +150,52 @@ class ObjectFactory(BaseFactory.BaseFactory):
         criteria.setSelectColumns(UniqueList.UniqueList())
         criteria.setAsColumns(self.__as_columns)
 
-        results = self.doSelect(criteria, ret_dict=1)
-        return self.constructObjects(results)
+        return self.doSelect(criteria, ret_dict=1)
         
-    def constructObjects(self, rows):
+    def constructObjects(self, rows, aggregate=None):
         """ Convert a list of rows to a list of Objects.
 
             @param rows A list of rows from the table this Factory represents.
+            @param aggregate The aggregate the objects belong to. Default to
+                   the aggregate of this factory.
             @return A list of Objects this Factory represents.
         """
         results = []
         #self.log("Rows: %s"%(rows,), level=logging.INFO)
         if rows:
+            construct = self.constructObject
             for row in rows:
-                results.append(self.constructObject(row))
+                results.append(construct(row, aggregate))
         return results
 
-    def constructObject(self, row):
+    def constructObject(self, row, aggregate=None):
         """ Convert a row to an Object.
 
             @param rows A rows from the table this Factory represents.
+            @param aggregate The aggregate the object belongs to. Default to
+                   the aggregate of this factory.
             @return An Object this Factory represents.
         """
+        if not aggregate:
+            aggregate = self.__aggregate
+
+        if not self.__row_mapper:
+            self.__row_mapper = self.getRowMapper(self.__table_name)
+        mapper = self.__row_mapper
+
         # create the pk object
-        proof       = self.__aggregate.getProofInstance()
-        db_map      = proof.getDatabaseMap(self.getDBName())
-        table_map   = db_map.getTable(self.__table_name)
-        column_maps = table_map.getColumns()
-        pk_list     = []
-        for column in column_maps:
-            column_name = column.getFullyQualifiedName()
-            if column.isPrimaryKey() and \
-                   row.has_key(column_name):
-                pk_list.append( ObjectKey.ObjectKey( row[column_name],
-                                                     column_name ) )
-        pk = None
-        if pk_list:
-            if len(pk_list) == 1:
-                pk = pk_list[0]
-            else:
-                pk = ComboKey.ComboKey(pk_list)
+        pk = mapper.makePK(row)
 
         obj = None
         if pk:
             # assume the tablename is the object name
-            obj = self.__aggregate.getObject(self.__table_name, pk)
+            obj = aggregate.getObject(self.__table_name, pk, load=False)
             
             if not obj:
                 # create the object
-                module_name = proof.getModuleForObject(self.__table_name, schema=self.getSchemaName())
-                class_name  = proof.getClassForObject(self.__table_name, schema=self.getSchemaName())
-                object_module = my_import(module_name)
-                obj = getattr(object_module, class_name)
-                obj = obj(self.__aggregate, pk, logger=self.getLogger())
-                obj.initialize(row)
+                obj = mapper.getObjectClass(self.getSchemaName())
+                obj = obj(aggregate, pk, logger=self.getLogger())
+                obj.initialize(row, mapper)
         else:
             self.log("%s: no pk was found in '%s'!" % (self.__class__.__name__, row), logging.WARNING)
         
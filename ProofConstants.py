@@ -14,11 +14,13 @@ RESOURCE_TYPE_LIST = [ NONE, MYSQL ]
 
 # States for Aggregates
 AGGR_NEW      = "STATE_NEW"
+AGGR_PARTIAL  = "STATE_PARTIAL"
 AGGR_LOADED   = "STATE_LOADED"
 AGGR_DIRTY    = "STATE_DIRTY"
 AGGR_UNLOADED = "STATE_UNLOADED"
 
 AGGR_STATE_LIST = [ AGGR_NEW,
+                    AGGR_PARTIAL,
                     AGGR_LOADED,
                     AGGR_DIRTY,
                     AGGR_UNLOADED ]
@@ -35,8 +37,43 @@ DEFAULT_MEMORY_THRESHOLD = 150000000
 MIN_REPOSITORY_GC_INTERVAL     = 60   # 1 minute
 DEFAULT_REPOSITORY_GC_INTERVAL = 180  # 3 minutes
 
+# The number of lock stripes a repository container is split into
+DEFAULT_REPOSITORY_STRIPES = 16
+
+# The seconds covered by a bucket of the repository expiry timer wheel
+REPOSITORY_EXPIRY_RESOLUTION = 10
+
 # repository thread session lifetime in seconds
 THREAD_SESSION_LIFETIME = 18  # httpd.conf KeepAliveTimeout 15
 
+# The pks which are found not existing are remembered by a repository
+DEFAULT_MISSED_PK_CAPACITY = 10000
+DEFAULT_MISSED_PK_TTL      = 30  # 30 seconds
+
 # A maximum limit to prevent selectAll on a big table
 DEFAULT_SELECTALL_LIMIT = 100
+
+# The maximum number of rows in one multi-row INSERT statement
+DEFAULT_INSERT_CHUNK_SIZE = 500
+
+# The maximum number of unloaded objects loaded together by one query
+DEFAULT_LOAD_BATCH_SIZE = 100
+
+# The interval in seconds to save repository snapshots, refer to
+# ProofInstance.setSnapshotDir
+DEFAULT_SNAPSHOT_INTERVAL = 600  # 10 minutes
+
+# The file name suffix of repository snapshots
+SNAPSHOT_SUFFIX = "snapshot"
+
+# The shared query result cache, refer to proof.cache.QueryCache
+DEFAULT_QUERY_CACHE_CAPACITY = 1000
+DEFAULT_QUERY_CACHE_TTL      = 60  # 1 minute
+
+# The number of server-side prepared statements cached by a pooled
+# connection, 0 is disabled. Refer to proof.driver.StatementCache
+DEFAULT_STATEMENT_CACHE_SIZE = 0
+
+# The number of compiled queries cached by BaseFactory.createQuery, 0 is
+# disabled
+DEFAULT_QUERY_TEMPLATE_CAPACITY = 500
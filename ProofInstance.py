@@ -11,14 +11,18 @@ ProofResource object.
 __version__='$Revision: 3194 $'[11:-2]
 __author__ = "Duan Guoqiang (mattgduan@gmail.com)"
 
+import os
 import sys
+import string
 import logging
 import time
 import thread
 import threading
 
 import util.logger.Logger as Logger
+import util.LazyLog as LazyLog
 import util.memory as memory
+import util.LRUDict as LRUDict
 from util.Import import my_import
 from util.Trace import traceBack
 
@@ -62,12 +66,37 @@ class ProofInstance:
         
         # a shortcut function for logger
         self.log = self.__logger.write
+        self.debug = LazyLog.LazyLog(self.__logger)
 
         # repository pool
         self.__repository_pool = {}
 
         # connection pool
         self.__connection_pool = {}
+
+        # resolved classes
+        # structure: { ( schema, table, kind ) : class }
+        self.__class_cache = {}
+
+        # the second level aggregate cache shared by processes
+        self.__l2_cache = None
+
+        # the aggregate query result cache shared by threads
+        self.__query_cache = None
+
+        # the compiled queries of BaseFactory.createQuery
+        # structure: { criteria shape : Query }
+        self.__query_templates = LRUDict.LRUDict(ProofConstants.DEFAULT_QUERY_TEMPLATE_CAPACITY)
+        self.__query_templates_lock = thread.allocate_lock()
+
+        # the directory and interval to save repository snapshots
+        self.__snapshot_dir      = None
+        self.__snapshot_interval = ProofConstants.DEFAULT_SNAPSHOT_INTERVAL
+        self.__snapshot_time     = time.time()
+
+        # per thread aggregate factory instances
+        # structure: local.factories = { ( schema, aggregate name ) : factory }
+        self.__local = threading.local()
     
         # new age
         if self.__is_age(aggr_new_age):
@@ -174,6 +203,41 @@ class ProofInstance:
 
     def getModuleForRepository(self, table, schema=None):
         return self.__resource.getModuleForRepository(schema, table)
+
+    def getCapacityForRepository(self, table, schema=None):
+        return self.__resource.getCapacityForRepository(schema, table)
+
+    def getByteBudgetForRepository(self, table, schema=None):
+        return self.__resource.getByteBudgetForRepository(schema, table)
+
+    def getLazyLoadForAggregate(self, table, schema=None):
+        return self.__resource.getLazyLoadForAggregate(schema, table)
+
+    def getResolvedClass(self, kind, table, schema=None):
+        """ Return the class of a kind for a table. The class is imported
+            once and cached.
+
+            @param kind One of 'Object', 'Aggregate', 'Factory',
+                   'AggregateFactory' and 'Repository'.
+            @param table The table name.
+            @param schema The schema name.
+            @return A class object.
+        """
+        key = (schema, table, kind)
+        cls = self.__class_cache.get(key, None)
+        if not cls:
+            module_name = getattr(self.__resource, "getModuleFor%s" % (kind))(schema, table)
+            class_name  = getattr(self.__resource, "getClassFor%s" % (kind))(schema, table)
+            module = my_import(module_name)
+            cls    = getattr(module, class_name)
+            self.__class_cache[key] = cls
+        return cls
+
+    def clearClassCache(self):
+        """ Clear the resolved classes, e.g. after modules are reloaded.
+        """
+        self.__class_cache = {}
+        self.__local = threading.local()
     
     def getInstanceForRepository( self,
                                   aggregate_name,
@@ -194,10 +258,7 @@ class ProofInstance:
         
             if not self.__repository_pool[db_name].has_key(aggregate_name):
                 # create a new repository
-                module_name = self.getModuleForRepository(aggregate_name, schema=schema)
-                class_name  = self.getClassForRepository(aggregate_name, schema=schema)
-                module = my_import(module_name)
-                obj    = getattr(module, class_name)
+                obj = self.getResolvedClass('Repository', aggregate_name, schema=schema)
                 
                 self.__repository_pool[db_name][aggregate_name] = obj(self,
                                                                       logger = self.__logger)
@@ -209,16 +270,33 @@ class ProofInstance:
 
     def getInstanceForAggregateFactory( self,
                                         aggregate_name,
-                                        schema = None ):
+                                        schema = None,
+                                        reuse  = True ):
+        """ Return an aggregate factory. By default the factory is shared by
+            all calls from the same thread, so settings made on it, like
+            setBatchLoad, are kept for the thread.
+
+            @param aggregate_name The aggregate name.
+            @param schema The schema name.
+            @param reuse If false, a new factory is always created.
+        """
         #self.log("start get factory instance for '%s'" % (aggregate_name))
-        module_name = self.getModuleForAggregateFactory(aggregate_name, schema=schema)
-        class_name  = self.getClassForAggregateFactory(aggregate_name, schema=schema)
-        module = my_import(module_name)
-        obj    = getattr(module, class_name)
+        if reuse:
+            factories = getattr(self.__local, "factories", None)
+            if factories == None:
+                factories = self.__local.factories = {}
+            factory = factories.get((schema, aggregate_name), None)
+            if factory:
+                return factory
+
+        obj = self.getResolvedClass('AggregateFactory', aggregate_name, schema=schema)
 
         #exec("factory = module.%s(self,logger=self.__logger)" % (class_name))
 
         factory = obj(self, logger=self.__logger)
+
+        if reuse:
+            factories[(schema, aggregate_name)] = factory
         
         #self.log("return factory instance for '%s'" % (aggregate_name))
         return factory
@@ -238,11 +316,14 @@ class ProofInstance:
                 username = db_config['username']
                 password = db_config['password']
                 adapter  = self.getAdapter(db_name)
+                statement_cache_size = db_config.get( 'statement_cache_size',
+                                                      ProofConstants.DEFAULT_STATEMENT_CACHE_SIZE )
                 
                 con = ConnectionPool.ConnectionPool( host, username, password, db_name,
                                                      adapter,
                                                      logger        = self.__logger,
-                                                     log_interval  = log_interval )
+                                                     log_interval  = log_interval,
+                                                     statement_cache_size = statement_cache_size )
             
                 self.__connection_pool[db_name] = con
             elif self.__connection_pool[db_name].getLogInterval() != log_interval:
@@ -251,7 +332,7 @@ class ProofInstance:
         finally:
             self.lock.release()
         
-        self.log("return connection for '%s'" % (database))
+        self.debug("return connection for '%s'", database)
         return self.__connection_pool[db_name].getConnection()
     
     def closeConnection(self, con):
@@ -267,6 +348,87 @@ class ProofInstance:
     def getGCInterval(self):
         return self.__gc_interval
 
+    def getAggrNewAge(self):
+        return self.__aggr_new_age
+
+    def getAggrLoadedAge(self):
+        return self.__aggr_loaded_age
+
+    def getAggrDirtyAge(self):
+        return self.__aggr_dirty_age
+
+    def getL2Cache(self):
+        return self.__l2_cache
+
+    def setL2Cache(self, cache):
+        """ Set the second level aggregate cache used by all repositories.
+
+            @param cache A proof.cache.Cache object, or None to disable it.
+        """
+        self.__l2_cache = cache
+
+    def getQueryCache(self):
+        return self.__query_cache
+
+    def setQueryCache(self, cache):
+        """ Set the aggregate query result cache shared by all threads.
+
+            @param cache A proof.cache.QueryCache object, or None to disable it.
+        """
+        self.__query_cache = cache
+
+    def getQueryTemplate(self, key):
+        """ Get a compiled query of BaseFactory.createQuery.
+
+            @param key The shape of a Criteria.
+            @return A Query object, or None if it isn't cached. The Query
+                    should be copied before it is changed.
+        """
+        if self.__query_templates.getCapacity() <= 0:
+            return None
+
+        self.__query_templates_lock.acquire()
+        try:
+            return self.__query_templates.get(key, None)
+        finally:
+            self.__query_templates_lock.release()
+
+    def setQueryTemplate(self, key, query):
+        """ Cache a compiled query of BaseFactory.createQuery, and evict the
+            least recently used one if there are too many.
+
+            @param key The shape of a Criteria.
+            @param query A Query object with args, which isn't changed after.
+        """
+        if self.__query_templates.getCapacity() <= 0:
+            return
+
+        self.__query_templates_lock.acquire()
+        try:
+            self.__query_templates[key] = query
+            while self.__query_templates.isOverflow():
+                self.__query_templates.popOldest()
+        finally:
+            self.__query_templates_lock.release()
+
+    def getQueryTemplateCapacity(self):
+        return self.__query_templates.getCapacity()
+
+    def setQueryTemplateCapacity(self, capacity):
+        """ Set the maximum number of compiled queries.
+
+            @param capacity An integer, 0 disables the cache.
+        """
+        self.__query_templates_lock.acquire()
+        try:
+            self.__query_templates.setCapacity(capacity)
+            if capacity <= 0:
+                self.__query_templates.clear()
+            while self.__query_templates.isOverflow():
+                self.__query_templates.popOldest()
+        finally:
+            self.__query_templates_lock.release()
+
     def gc(self):
         """ Loop through all repositories and do housekeeping work.
         """
@@ -276,6 +438,86 @@ class ProofInstance:
                                self.__aggr_loaded_age,
                                self.__aggr_dirty_age )
 
+        if self.__snapshot_dir and \
+               time.time() - self.__snapshot_time > self.__snapshot_interval:
+            self.__snapshot_time = time.time()
+            self.saveSnapshots(self.__snapshot_dir)
+
+    def getSnapshotDir(self):
+        return self.__snapshot_dir
+
+    def setSnapshotDir( self,
+                        directory,
+                        interval = ProofConstants.DEFAULT_SNAPSHOT_INTERVAL ):
+        """ Let the monitor save the snapshots of all repositories to a
+            directory periodically. Refer to saveSnapshots.
+
+            @param directory A directory, or None to stop saving snapshots.
+            @param interval The interval in seconds.
+        """
+        self.__snapshot_dir      = directory
+        self.__snapshot_interval = interval
+
+    def saveSnapshots(self, directory):
+        """ Save the loaded aggregates of all repositories to snapshot files
+            in a directory, one file named 'schema.aggregate.snapshot' for
+            each repository.
+
+            @param directory The directory.
+        """
+        for db in self.__repository_pool.keys():
+            for name, repository in self.__repository_pool[db].items():
+                path = os.path.join( directory,
+                                     "%s.%s.%s" % ( repository.getDBSchema(),
+                                                    name,
+                                                    ProofConstants.SNAPSHOT_SUFFIX ) )
+                try:
+                    repository.saveSnapshot(path)
+                except:
+                    self.log( "Can't save snapshot '%s':\n%s" % (path, traceBack()),
+                              logging.ERROR )
+
+    def loadSnapshots(self, directory):
+        """ Load the snapshot files in a directory into their repositories,
+            normally when the process starts. Refer to Repository.loadSnapshot.
+
+            @param directory The directory.
+            @return The number of aggregates loaded.
+        """
+        count = 0
+        if not os.path.isdir(directory):
+            return count
+
+        for file_name in os.listdir(directory):
+            parts = string.split(file_name, '.')
+            if len(parts) < 3 or parts[-1] != ProofConstants.SNAPSHOT_SUFFIX:
+                continue
+
+            schema = string.join(parts[:-2], '.')
+            name   = parts[-2]
+            path   = os.path.join(directory, file_name)
+            try:
+                repository = self.getInstanceForRepository(name, schema=schema)
+                count += repository.loadSnapshot(path)
+            except:
+                self.log( "Can't load snapshot '%s':\n%s" % (path, traceBack()),
+                          logging.ERROR )
+
+        return count
+
+    def getMemoryStats(self):
+        """ Return the estimated memory used by all repositories.
+
+            @return A dictionary { db_name : { aggregate name : stats } },
+                    refer to Repository.getMemoryStats.
+        """
+        stats = {}
+        for db in self.__repository_pool.keys():
+            stats[db] = {}
+            for name, repository in self.__repository_pool[db].items():
+                stats[db][name] = repository.getMemoryStats()
+        return stats
+
     def getMemoryThreshold(self):
         return self.__mem_threshold
 
@@ -68,7 +68,10 @@ aggregate_maps = {
                                            'factorymodule'    : 'dddddd',
                                            'factoryclass'     : 'wwwwww',
                                            'repositorymodule' : 'wwwwww',
-                                           'repositoryclass'  : 'wwwwww' },
+                                           'repositoryclass'  : 'wwwwww',
+                                           'capacity'         : 1000,
+                                           'byte_budget'      : 50000000,
+                                           'lazy_load'        : 0 },
                      'aggregate_nameX' : { 'module'           : 'xxxxxx',
                                            'class'            : 'ssssss',
                                            'factorymodule'    : 'dddddd',
@@ -85,7 +88,8 @@ namespace_maps = {
   'schema_nameX' : { 'namespaceX' : { 'dbname'   : 'databasename',
                                       'host'     : 'hostname',
                                       'username' : 'guest',
-                                      'password' : '12345' },
+                                      'password' : '12345',
+                                      'statement_cache_size' : 100 },
                      ... ...
                      },
   ... ...
@@ -444,6 +448,50 @@ class ProofResource:
             raise ProofException.ProofResourceFailure( "Can't find aggregate repositorymodule for (%s, %s):\n%s" \
                                                        % (database, table, Trace.traceBack()) )
 
+    def getCapacityForRepository(self, database, table):
+        """ Return the maximum number of aggregates kept in a repository.
+            The 'capacity' of an aggregate is optional, and 0 means unlimited.
+        """
+        if self.__aggregate_strategy == STRATEGY_DYNAMIC:
+            return 0
+
+        schema = self.getSchemaName(database)
+        try:
+            return self.aggregate_maps[schema][table].get('capacity', 0)
+        except:
+            raise ProofException.ProofResourceFailure( "Can't find aggregate for (%s, %s):\n%s" \
+                                                       % (database, table, Trace.traceBack()) )
+
+    def getByteBudgetForRepository(self, database, table):
+        """ Return the maximum estimated bytes of aggregates kept in a
+            repository. The 'byte_budget' of an aggregate is optional, and 0
+            means unlimited.
+        """
+        if self.__aggregate_strategy == STRATEGY_DYNAMIC:
+            return 0
+
+        schema = self.getSchemaName(database)
+        try:
+            return self.aggregate_maps[schema][table].get('byte_budget', 0)
+        except:
+            raise ProofException.ProofResourceFailure( "Can't find aggregate for (%s, %s):\n%s" \
+                                                       % (database, table, Trace.traceBack()) )
+
+    def getLazyLoadForAggregate(self, database, table):
+        """ Return whether the related objects of an aggregate are left to
+            be loaded on first access. The 'lazy_load' of an aggregate is
+            optional, and 0 means the objects are loaded with the root.
+        """
+        if self.__aggregate_strategy == STRATEGY_DYNAMIC:
+            return False
+
+        schema = self.getSchemaName(database)
+        try:
+            return self.aggregate_maps[schema][table].get('lazy_load', 0) != 0
+        except:
+            raise ProofException.ProofResourceFailure( "Can't find aggregate for (%s, %s):\n%s" \
+                                                       % (database, table, Trace.traceBack()) )
+
 
     def __parseXMLConfig(self, config):
         """ Parse XML config file.
@@ -635,6 +683,9 @@ class ResourceFactory:
                 aggregate_maps[schema][table]['factoryclass'] = self.aggregates[schema][table]['factoryclass']
                 aggregate_maps[schema][table]['repositorymodule'] = self.aggregates[schema][table]['repositorymodule']
                 aggregate_maps[schema][table]['repositoryclass'] = self.aggregates[schema][table]['repositoryclass']
+                aggregate_maps[schema][table]['capacity'] = int(self.aggregates[schema][table].get('capacity', 0))
+                aggregate_maps[schema][table]['byte_budget'] = int(self.aggregates[schema][table].get('byte_budget', 0))
+                aggregate_maps[schema][table]['lazy_load'] = int(self.aggregates[schema][table].get('lazy_load', 0))
 
         return aggregate_maps
 
@@ -649,6 +700,7 @@ class ResourceFactory:
                 namespace_maps[schema][name]['host'] = self.namespaces[schema][name]['host']
                 namespace_maps[schema][name]['username'] = self.namespaces[schema][name]['username']
                 namespace_maps[schema][name]['password'] = self.namespaces[schema][name]['password']
+                namespace_maps[schema][name]['statement_cache_size'] = int(self.namespaces[schema][name].get('statement_cache_size', 0))
 
         return namespace_maps
 
@@ -11,23 +11,43 @@ give different types of aggregates (by different criterias).
 To make the container maintainable, it is important to garbage collect un-
 frequently used aggregates from the Repository. Here we use three time-out
 limits to control an aggregate lifetime. They are responding to three AGEs
-in Aggregate (refer to Aggregate).
+in Aggregate (refer to Aggregate). The container can also be bounded by the
+'capacity' of the aggregate in the resource config. When it is full, the least
+recently used aggregate is evicted. The estimated bytes of the cached
+aggregates are kept as well, and the container can also be bounded by the
+'byte_budget' of the aggregate. A repository with a byte budget is cleaned up
+by its ages on every gc, instead of only when the process memory is over the
+threshold.
+
+To reduce lock contention, the container and the thread sessions are split
+into stripes by the hash of their keys. Each stripe has its own lock and its
+own LRU order, and the capacity is shared evenly among the stripes.
 
 There should also have different mechanisms to keep these aggregates, like
-memory, dbm, session, files, etc. These are not implemented here and will be
-considered in the future.
+memory, dbm, session, files, etc. A second level cache shared by processes can
+be set to the ProofInstance (refer to proof.cache). Aggregates missed in the
+container are looked up there, and clean aggregates added to the container are
+stored there in pickled form, with the NEW_AGE or LOADED_AGE as time-to-live.
+The loaded aggregates can also be saved to a snapshot file and loaded back when
+a process starts, so that it doesn't start with an empty container.
 """
 
 __version__='$Revision: 3194 $'[11:-2]
 __author__ = "Duan Guoqiang (mattgduan@gmail.com)"
 
 
+import os
 import time
 import logging
 import thread
+import cPickle
 
 import util.logger.Logger as Logger
+import util.LazyLog as LazyLog
 import util.memory as memory
+import util.LRUDict as LRUDict
+import util.CountingLock as CountingLock
+import util.TimerWheel as TimerWheel
 from util.Import import my_import
 from util.Trace import traceBack
 
@@ -72,23 +92,53 @@ class Repository:
         # NOTE: this will be used by both aggregate and aggregate factory
         self.__relation_map = relation_map
 
-        # aggregate container
-        self.__container = {}
+        # number of lock stripes
+        self.__stripes = ProofConstants.DEFAULT_REPOSITORY_STRIPES
 
-        # timestamp container
-        self.__timestamps = {}
+        # a lock for each stripe
+        self.__locks = [ CountingLock.CountingLock() for i in range(self.__stripes) ]
+
+        # aggregate containers in least recently used order, one per stripe
+        self.__capacity = self.__proof.getCapacityForRepository( self.__aggr_name,
+                                                                 schema = self.__db_schema )
+        self.__containers = [ LRUDict.LRUDict() for i in range(self.__stripes) ]
+        self.setCapacity(self.__capacity)
+
+        # estimated aggregate sizes in bytes and their totals, one per stripe
+        self.__sizes = [ {} for i in range(self.__stripes) ]
+        self.__bytes = [ 0 for i in range(self.__stripes) ]
+        self.setByteBudget( self.__proof.getByteBudgetForRepository( self.__aggr_name,
+                                                                     schema = self.__db_schema ) )
+
+        # timestamp containers, one per stripe
+        self.__timestamps = [ {} for i in range(self.__stripes) ]
+
+        # pks found not existing by findByPK, in least recently used order
+        # structure: { ( column name, value string ) : expire time }
+        self.__missed = LRUDict.LRUDict(ProofConstants.DEFAULT_MISSED_PK_CAPACITY)
+        self.__missed_lock = thread.allocate_lock()
+
+        # ids of the aggregates whose root objects are not initialized,
+        # e.g. after they are unloaded by gc, to be loaded in batches
+        # structure: { id : None }
+        self.__unloaded = {}
+        self.__unloaded_lock = thread.allocate_lock()
+
+        # aggregate ids by the deadlines they should be checked by gc
+        self.__expiry = TimerWheel.TimerWheel(ProofConstants.REPOSITORY_EXPIRY_RESOLUTION)
         
-        # a thread based session cache
+        # a thread based session cache, one per stripe
         # structure: { 'thread id' : [ timestamp, { 'finger_print' : [ aggregate id list ],
         #                                           ... ... } ],
         #              ... ... }
-        self.__thread_sessions = {}
+        self.__thread_sessions = [ {} for i in range(self.__stripes) ]
 
         # logger
         self.__logger = Logger.makeLogger(logger)
         self.log = self.__logger.write
+        self.debug = LazyLog.LazyLog(self.__logger)
 
-        # acquire a thread lock for serializing access to its data
+        # acquire a thread lock for serializing access to the data of subclasses
         self.lock = thread.allocate_lock()
 
     def getProofInstance(self):
@@ -102,6 +152,101 @@ class Repository:
 
     def getRelationMap(self):
         return self.__relation_map
+
+    def getCapacity(self):
+        return self.__capacity
+
+    def setCapacity(self, capacity):
+        """ Set the maximum number of aggregates in the container. 0 means
+            unlimited. The capacity is shared evenly among the stripes.
+        """
+        self.__capacity = capacity
+        stripe_capacity = 0
+        if capacity > 0:
+            stripe_capacity = (capacity + self.__stripes - 1) / self.__stripes
+        for container in self.__containers:
+            container.setCapacity(stripe_capacity)
+
+    def getByteBudget(self):
+        return self.__byte_budget
+
+    def setByteBudget(self, byte_budget):
+        """ Set the maximum estimated bytes of the aggregates in the
+            container. 0 means unlimited. The budget is shared evenly among
+            the stripes.
+        """
+        self.__byte_budget = byte_budget
+        self.__stripe_budget = 0
+        if byte_budget > 0:
+            self.__stripe_budget = (byte_budget + self.__stripes - 1) / self.__stripes
+
+    def getSize(self):
+        """ Return the estimated bytes of all the cached aggregates.
+        """
+        return reduce(lambda x, y: x + y, self.__bytes, 0)
+
+    def getMemoryStats(self):
+        """ Return the estimated memory used by the container.
+
+            @return A dictionary with 'aggregates', 'bytes', 'byte_budget',
+                    'capacity' and 'average_bytes'.
+        """
+        count = 0
+        for container in self.__containers:
+            count += len(container)
+        size = self.getSize()
+
+        average = 0
+        if count:
+            average = size / count
+
+        return { 'aggregates'    : count,
+                 'bytes'         : size,
+                 'byte_budget'   : self.__byte_budget,
+                 'capacity'      : self.__capacity,
+                 'average_bytes' : average }
+
+    def __resize(self, i, id, size):
+        """ Set the estimated size of an aggregate. The lock of the stripe
+            must be held.
+
+            @param i The stripe index.
+            @param id The aggregate id.
+            @param size The bytes, or None to remove it.
+        """
+        sizes = self.__sizes[i]
+        self.__bytes[i] -= sizes.get(id, 0)
+        if size == None:
+            if sizes.has_key(id):
+                del sizes[id]
+        else:
+            sizes[id] = size
+            self.__bytes[i] += size
+
+    def getContentionStats(self):
+        """ Return the lock statistics of all stripes.
+
+            @return A dictionary with 'acquisitions', 'contentions' and
+                    'wait_time' in seconds.
+        """
+        stats = { 'acquisitions' : 0,
+                  'contentions'  : 0,
+                  'wait_time'    : 0.0 }
+        for lock in self.__locks:
+            acquisitions, contentions, wait_time = lock.getStats()
+            stats['acquisitions'] += acquisitions
+            stats['contentions']  += contentions
+            stats['wait_time']    += wait_time
+        return stats
+
+    def resetContentionStats(self):
+        for lock in self.__locks:
+            lock.resetStats()
+
+    def __stripe(self, key):
+        """ Return the stripe index of a key.
+        """
+        return hash(key) % self.__stripes
     
     def getRelationList(self, obj_name):
         """ Get the left/right join list from relation map.
@@ -130,31 +275,128 @@ class Repository:
 
         return relation
 
-    def add(self, aggregate, id=None):
+    def add(self, aggregate, id=None, shared=True):
         """ Add an aggregate to the container. Make sure it is thread-safe.
+            If the container is full, the least recently used aggregates are
+            evicted, and their changes are committed or cancelled first.
 
             @aggregate The aggregate.
+            @shared If true, the aggregate is also stored in the L2 cache.
         """
         if not id:
             pk = aggregate.getPK()
             id = str(pk)
 
+        # sampled out of the lock
+        size = aggregate.getSize()
+
+        i = self.__stripe(id)
+        container = self.__containers[i]
+
         # be thread safe
-        self.lock.acquire()
+        self.__locks[i].acquire()
         try:
-            #old = self.__container.get(id, None)
+            #old = container.get(id, None)
             #if old and old == aggregate:
             #    old.load()
             #    return old
             
-            self.__container[id] = aggregate
+            container[id] = aggregate
+            self.__resize(i, id, size)
+            evicted = self.__evict(i)
         finally:
-            self.lock.release()
+            self.__locks[i].release()
+
+        # database access is done out of the lock
+        self.__settleEvicted(evicted)
 
         aggregate.touch()
+        self.__schedule(id, aggregate)
+
+        root = aggregate.getRoot()
+        if root and not root.isInitialized():
+            self.addUnloaded(aggregate, id)
+
+        if len(self.__missed):
+            self.removeMissed(aggregate.getPK())
+
+        if shared:
+            self.__setShared(id, aggregate)
 
         return aggregate
 
+    def resize(self, aggregate, id=None):
+        """ Measure the estimated size of a cached aggregate again, e.g.
+            after its related objects are loaded. If the container is over
+            its byte budget then, the least recently used aggregates are
+            evicted.
+
+            @aggregate The aggregate.
+        """
+        if not id:
+            id = str(aggregate.getPK())
+
+        # sampled out of the lock
+        size = aggregate.getSize()
+
+        i = self.__stripe(id)
+        evicted = []
+
+        # be thread safe
+        self.__locks[i].acquire()
+        try:
+            if self.__containers[i].peek(id, None) is aggregate:
+                self.__resize(i, id, size)
+                evicted = self.__evict(i)
+        finally:
+            self.__locks[i].release()
+
+        # database access is done out of the lock
+        self.__settleEvicted(evicted)
+
+    def __evict(self, i):
+        """ Evict the least recently used aggregates of a stripe while it is
+            over its capacity or byte budget. The lock of the stripe must be
+            held.
+
+            @param i The stripe index.
+            @return A list of ( id, aggregate ) evicted, which should be
+                    settled by __settleEvicted out of the lock.
+        """
+        container  = self.__containers[i]
+        timestamps = self.__timestamps[i]
+
+        evicted = []
+        while container.isOverflow() or \
+                  ( self.__stripe_budget and len(container) > 1 and \
+                    self.__bytes[i] > self.__stripe_budget ):
+            old_id, old = container.popOldest()
+            if timestamps.has_key(old_id):
+                del timestamps[old_id]
+            self.__resize(i, old_id, None)
+            evicted.append((old_id, old))
+
+        return evicted
+
+    def __settleEvicted(self, evicted):
+        """ Stop checking the evicted aggregates, and commit or cancel their
+            changes.
+
+            @param evicted A list of ( id, aggregate ).
+        """
+        for old_id, old in evicted:
+            self.__expiry.cancel(old_id)
+            self.__removeUnloaded(old_id)
+            self.__settle(old)
+
+    def refresh(self, aggregate):
+        """ Store the current aggregate in the L2 cache, e.g. after its
+            changes are committed.
+
+            @aggregate The aggregate.
+        """
+        self.__setShared(str(aggregate.getPK()), aggregate)
+
     def add_timestamp(self, timestamp, aggregate, id=None):
         """ Add an aggregate timestamp to timestamp dict. Make sure it is thread-safe.
 
@@ -165,31 +407,102 @@ class Repository:
             pk = aggregate.getPK()
             id = str(pk)
 
+        i = self.__stripe(id)
+
         # be thread safe
-        self.lock.acquire()
+        self.__locks[i].acquire()
         try:
-            self.__timestamps[id] = timestamp
+            self.__timestamps[i][id] = timestamp
         finally:
-            self.lock.release()
+            self.__locks[i].release()
 
-    def remove(self, aggregate, id=None):
+    def remove(self, aggregate, id=None, shared=True):
         """ Remove an aggregate from the container. Make sure it is thread-safe.
 
             @aggregate The aggregate.
+            @shared If true, the aggregate is also removed from the L2 cache.
         """
         if not id:
             pk = aggregate.getPK()
             id = str(pk)
 
+        i = self.__stripe(id)
+
         # be thread safe
-        self.lock.acquire()
+        self.__locks[i].acquire()
         try:
-            if self.__container.has_key(id):
-                del self.__container[id]
-            if self.__timestamps.has_key(id):
-                del self.__timestamps[id]
+            if self.__containers[i].has_key(id):
+                del self.__containers[i][id]
+            if self.__timestamps[i].has_key(id):
+                del self.__timestamps[i][id]
+            self.__resize(i, id, None)
         finally:
-            self.lock.release()
+            self.__locks[i].release()
+
+        self.__expiry.cancel(id)
+        self.__removeUnloaded(id)
+
+        cache = self.__proof.getL2Cache()
+        if shared and cache:
+            cache.delete(self.__sharedKey(id))
+
+    def __missedKey(self, pk):
+        """ Return the key of a pk in the missed pks, which doesn't depend on
+            the type of the pk value.
+        """
+        pk_value = pk.getValue()
+        if type(pk_value) == type([]):
+            # a ComboKey by the keys of its columns
+            return tuple([ self.__missedKey(key) for key in pk_value ])
+        return (pk.getFullyQualifiedName(), str(pk_value))
+
+    def isMissed(self, pk):
+        """ Check whether a pk was found not existing recently.
+
+            @param pk An ObjectKey object.
+        """
+        key = self.__missedKey(pk)
+
+        self.__missed_lock.acquire()
+        try:
+            expire = self.__missed.get(key, None)
+            if expire == None:
+                return False
+            if expire < time.time():
+                del self.__missed[key]
+                return False
+            return True
+        finally:
+            self.__missed_lock.release()
+
+    def addMissed(self, pk):
+        """ Remember a pk found not existing for a short time.
+
+            @param pk An ObjectKey object.
+        """
+        key = self.__missedKey(pk)
+
+        self.__missed_lock.acquire()
+        try:
+            self.__missed[key] = time.time() + ProofConstants.DEFAULT_MISSED_PK_TTL
+            while self.__missed.isOverflow():
+                self.__missed.popOldest()
+        finally:
+            self.__missed_lock.release()
+
+    def removeMissed(self, pk):
+        """ Forget a pk found not existing, e.g. after it is created.
+
+            @param pk An ObjectKey object.
+        """
+        key = self.__missedKey(pk)
+
+        self.__missed_lock.acquire()
+        try:
+            if self.__missed.has_key(key):
+                del self.__missed[key]
+        finally:
+            self.__missed_lock.release()
 
     def get(self, id):
         """ Get an aggregate from container.
@@ -197,12 +510,177 @@ class Repository:
             @param id An ObjectKey object or its string.
             @return An aggregate or None.
         """
+        id = str(id)
+        i = self.__stripe(id)
+
         # be thread safe
-        self.lock.acquire()
+        self.__locks[i].acquire()
+        try:
+            aggregate = self.__containers[i].get(id, None)
+        finally:
+            self.__locks[i].release()
+
+        if aggregate == None:
+            aggregate = self.__getShared(id)
+            if aggregate:
+                self.add(aggregate, id, shared=False)
+
+        return aggregate
+
+    def __sharedKey(self, id):
+        """ Return the L2 cache key of an aggregate id.
+        """
+        return "%s:%s" % (self.__db_name, id)
+
+    def __getShared(self, id):
+        """ Get an aggregate from the L2 cache.
+
+            @param id The aggregate id.
+            @return An aggregate or None.
+        """
+        cache = self.__proof.getL2Cache()
+        if not cache:
+            return None
+
+        return self.__loadShared(id, cache.get(self.__sharedKey(id)))
+
+    def __getSharedMulti(self, ids):
+        """ Get many aggregates from the L2 cache with one request.
+
+            @param ids A list of aggregate ids.
+            @return A dictionary of the aggregates found, by their ids.
+        """
+        cache = self.__proof.getL2Cache()
+        if not cache or not ids:
+            return {}
+
+        keys = {}
+        for id in ids:
+            keys[self.__sharedKey(id)] = id
+
+        aggregates = {}
+        for key, data in cache.getMulti(keys.keys()).items():
+            aggregate = self.__loadShared(keys[key], data)
+            if aggregate:
+                aggregates[keys[key]] = aggregate
+        return aggregates
+
+    def __loadShared(self, id, data):
+        """ Unpickle an aggregate got from the L2 cache.
+
+            @param id The aggregate id.
+            @param data The pickled aggregate or None.
+            @return An aggregate or None.
+        """
+        if not data:
+            return None
+
+        try:
+            aggregate = cPickle.loads(data)
+        except:
+            self.log( "%s: can't unpickle aggregate '%s' from L2 cache:\n%s" % \
+                      (self.__class__.__name__, id, traceBack()), logging.WARNING )
+            return None
+
+        aggregate.setProofInstance(self.__proof)
+        return aggregate
+
+    def __setShared(self, id, aggregate):
+        """ Store a clean aggregate in the L2 cache.
+
+            @param id The aggregate id.
+            @param aggregate The aggregate.
+        """
+        cache = self.__proof.getL2Cache()
+        if not cache:
+            return
+
+        state = aggregate.getState()
+        if state == ProofConstants.AGGR_DIRTY:
+            # never share changes not committed
+            return
+        elif state in [ ProofConstants.AGGR_PARTIAL,
+                        ProofConstants.AGGR_LOADED ]:
+            ttl = self.__proof.getAggrLoadedAge()
+        else:
+            ttl = self.__proof.getAggrNewAge()
+
+        try:
+            data = cPickle.dumps(aggregate, cPickle.HIGHEST_PROTOCOL)
+        except:
+            self.log( "%s: can't pickle aggregate '%s' for L2 cache:\n%s" % \
+                      (self.__class__.__name__, id, traceBack()), logging.WARNING )
+            return
+
+        cache.set(self.__sharedKey(id), data, ttl)
+
+    def addUnloaded(self, aggregate, id=None):
+        """ Record an aggregate whose root object is not initialized, e.g.
+            after it is unloaded, so that getUnloadedRoots can find it
+            without scanning the container.
+
+            @aggregate The aggregate.
+        """
+        if not id:
+            id = str(aggregate.getPK())
+
+        self.__unloaded_lock.acquire()
         try:
-            return self.__container.get(str(id), None)
+            self.__unloaded[id] = None
         finally:
-            self.lock.release()
+            self.__unloaded_lock.release()
+
+    def __removeUnloaded(self, id):
+        """ Forget an aggregate id recorded by addUnloaded.
+        """
+        self.__unloaded_lock.acquire()
+        try:
+            if self.__unloaded.has_key(id):
+                del self.__unloaded[id]
+        finally:
+            self.__unloaded_lock.release()
+
+    def getUnloadedRoots(self, limit=ProofConstants.DEFAULT_LOAD_BATCH_SIZE):
+        """ Get the root objects in the container which are not initialized,
+            e.g. after their aggregates are unloaded by gc. The ids are taken
+            from the ones recorded by addUnloaded, and the ones whose roots
+            have been loaded since are dropped.
+
+            @param limit The maximum number of root objects to return.
+            @return A list of BaseObjects.
+        """
+        roots = []
+
+        while len(roots) < limit:
+            # take a batch of ids out of the lock of the stripes
+            self.__unloaded_lock.acquire()
+            try:
+                ids = []
+                while self.__unloaded and len(ids) < limit - len(roots):
+                    ids.append(self.__unloaded.popitem()[0])
+            finally:
+                self.__unloaded_lock.release()
+
+            if not ids:
+                break
+
+            for id in ids:
+                i = self.__stripe(id)
+                # be thread safe
+                self.__locks[i].acquire()
+                try:
+                    aggregate = self.__containers[i].peek(id, None)
+                finally:
+                    self.__locks[i].release()
+
+                if aggregate == None:
+                    continue
+
+                root = aggregate.getRoot()
+                if root and not root.isInitialized():
+                    roots.append(root)
+
+        return roots
 
     def add_thread_session_query_result(self, finger_print, aggregates):
         """ Add a query result to a thread session. Make sure it is thread-safe.
@@ -216,34 +694,37 @@ class Repository:
         aggr_id_list = [ aggr.getPK().__str__() for aggr in aggregates ]
 
         thread_id = thread.get_ident()
+        i = self.__stripe(thread_id)
+        sessions = self.__thread_sessions[i]
         
         # be thread safe
-        self.lock.acquire()
+        self.__locks[i].acquire()
         try:
-            if not self.__thread_sessions.has_key(thread_id):
-                self.__thread_sessions[thread_id] = [ time.time(),
-                                                      { finger_print : aggr_id_list } ]
+            if not sessions.has_key(thread_id):
+                sessions[thread_id] = [ time.time(),
+                                        { finger_print : aggr_id_list } ]
             else:
-                self.__thread_sessions[thread_id][0] = time.time()
-                self.__thread_sessions[thread_id][1][finger_print] = aggr_id_list
+                sessions[thread_id][0] = time.time()
+                sessions[thread_id][1][finger_print] = aggr_id_list
         finally:
-            self.lock.release()
+            self.__locks[i].release()
 
     def touch_thread_session(self):
         """ Update timestamp for a thread session.
         """
 
         thread_id = thread.get_ident()
+        i = self.__stripe(thread_id)
         
         # be thread safe
-        self.lock.acquire()
+        self.__locks[i].acquire()
         try:
             try:
-                self.__thread_sessions[thread_id][0] = time.time()
+                self.__thread_sessions[i][thread_id][0] = time.time()
             except:
                 pass
         finally:
-            self.lock.release()
+            self.__locks[i].release()
 
     def get_thread_session_query_result(self, finger_print):
         """ Try to get a query result from thread session.
@@ -254,16 +735,18 @@ class Repository:
             @return A list of aggregates from the query or None.
         """
         thread_id = thread.get_ident()
+        i = self.__stripe(thread_id)
+        sessions = self.__thread_sessions[i]
         query_result = None
 
         # be thread safe
-        self.lock.acquire()
+        self.__locks[i].acquire()
         try:
-            if self.__thread_sessions.has_key(thread_id) and \
-                            self.__thread_sessions[thread_id][1].has_key(finger_print):
-                query_result = self.__thread_sessions[thread_id][1][finger_print]
+            if sessions.has_key(thread_id) and \
+                            sessions[thread_id][1].has_key(finger_print):
+                query_result = sessions[thread_id][1][finger_print]
         finally:
-            self.lock.release()
+            self.__locks[i].release()
         
         if query_result != None and type(query_result) == type([]):
             aggregates = []
@@ -288,60 +771,241 @@ class Repository:
 
             @param thread_id A thread id.
         """
-        self.lock.acquire()
+        i = self.__stripe(thread_id)
+
+        self.__locks[i].acquire()
         try:
             try:
-                del self.__thread_sessions[thread_id]
+                del self.__thread_sessions[i][thread_id]
             except:
                 pass
         finally:
-            self.lock.release()
+            self.__locks[i].release()
+
+    def saveSnapshot(self, path):
+        """ Save the loaded aggregates to a snapshot file with their root
+            timestamps. The file is written to a temporary file first and
+            then renamed, so a reader never sees a partial snapshot.
+
+            @param path The file path.
+            @return The number of aggregates saved.
+        """
+        items = []
+        for i in range(self.__stripes):
+            self.__locks[i].acquire()
+            try:
+                timestamps = self.__timestamps[i]
+                for id, aggregate in self.__containers[i].items():
+                    items.append( (id, aggregate, timestamps.get(id, None)) )
+            finally:
+                self.__locks[i].release()
+
+        count = 0
+        tmp_path = "%s.tmp" % (path)
+        f = open(tmp_path, 'wb')
+        try:
+            for id, aggregate, timestamp in items:
+                if aggregate.getState() not in [ ProofConstants.AGGR_PARTIAL,
+                                                 ProofConstants.AGGR_LOADED ]:
+                    continue
+                try:
+                    data = cPickle.dumps(aggregate, cPickle.HIGHEST_PROTOCOL)
+                except:
+                    self.log( "%s: can't pickle aggregate '%s' for snapshot:\n%s" % \
+                              (self.__class__.__name__, id, traceBack()), logging.WARNING )
+                    continue
+                cPickle.dump((id, timestamp, data), f, cPickle.HIGHEST_PROTOCOL)
+                count += 1
+        finally:
+            f.close()
+
+        os.rename(tmp_path, path)
+
+        self.log( "%s: %s aggregates saved to snapshot '%s'." % \
+                  (self.__class__.__name__, count, path) )
+        return count
+
+    def loadSnapshot(self, path):
+        """ Load the aggregates of a snapshot file into the container. The
+            aggregates are revalidated in batches by the timestamps of their
+            root rows. An aggregate is reused if its timestamp is up-to-date,
+            otherwise it is fetched again from the database, and it is dropped
+            if its root row no longer exists. Without a timestamp column, all
+            aggregates are fetched again by their pks.
+
+            @param path The file path.
+            @return The number of aggregates loaded.
+        """
+        if not os.path.exists(path):
+            return 0
+
+        entries = []
+        f = open(path, 'rb')
+        try:
+            try:
+                while 1:
+                    entries.append(cPickle.load(f))
+            except EOFError:
+                pass
+            except:
+                self.log( "%s: snapshot '%s' is broken after %s entries:\n%s" % \
+                          (self.__class__.__name__, path, len(entries), traceBack()),
+                          logging.WARNING )
+        finally:
+            f.close()
+
+        factory = self.__proof.getInstanceForAggregateFactory( self.__aggr_name,
+                                                               schema=self.__db_schema )
+
+        count = 0
+        batch_size = ProofConstants.DEFAULT_LOAD_BATCH_SIZE
+        for start in range(0, len(entries), batch_size):
+
+            aggregates = []
+            for id, timestamp, data in entries[start:start+batch_size]:
+                try:
+                    aggregate = cPickle.loads(data)
+                except:
+                    self.log( "%s: can't unpickle aggregate '%s' from snapshot:\n%s" % \
+                              (self.__class__.__name__, id, traceBack()), logging.WARNING )
+                    continue
+                aggregate.setProofInstance(self.__proof)
+                aggregates.append( (id, timestamp, aggregate) )
+
+            current = factory.doSelectTimestamps( [ aggregate.getPK()
+                                                    for id, timestamp, aggregate in aggregates ] )
+
+            stale = []
+            for id, timestamp, aggregate in aggregates:
+                if current == None:
+                    stale.append(aggregate.getPK())
+                elif current.has_key(id):
+                    if timestamp and current[id] and not timestamp < current[id]:
+                        self.add(aggregate, id, shared=False)
+                        self.add_timestamp(current[id], aggregate, id)
+                        count += 1
+                    else:
+                        stale.append(aggregate.getPK())
+
+            if stale:
+                count += len( [ aggregate for aggregate in self.findByPKs(stale)
+                                if aggregate ] )
+
+        self.log( "%s: %s aggregates loaded from snapshot '%s'." % \
+                  (self.__class__.__name__, count, path) )
+        return count
 
     def gc(self, new_age, loaded_age, dirty_age):
         """ garbage collection on the repository.
         """
-        mem = memory.memory()
-        if mem > self.__proof.getMemoryThreshold():
+        if self.__byte_budget or \
+               memory.memory() > self.__proof.getMemoryThreshold():
             #self.log( "Start clean-up %s aggregates ..." % (self.__class__.__name__) )
             self.gc_container(new_age, loaded_age, dirty_age)
         #self.log( "Start clean-up %s sessions ..." % (self.__class__.__name__) )
         self.gc_session()
 
     def gc_container(self, new_age, loaded_age, dirty_age):
-        """ garbage collection on container.
+        """ garbage collection on container. Only the aggregates whose
+            deadlines in the expiry timer wheel have passed are checked.
+            Since touch() only updates the access time, an aggregate which
+            has been accessed since is rescheduled to its new deadline.
         """
         now = time.time()
 
         # clean up container
-        for id, aggregate in self.__container.items():
-                    
-            # state transitions
-            state = aggregate.getState()
-            last_access = aggregate._access_time()
+        for id in self.__expiry.popExpired(now):
+            try:
+                self.__gc_aggregate(id, now, new_age, loaded_age, dirty_age)
+            except:
+                self.log( "%s: gc failed on aggregate '%s':\n%s" % \
+                          (self.__class__.__name__, id, traceBack()), logging.ERROR )
+                # the id is out of the timer wheel, so check it again later
+                self.__expiry.schedule(id, now + min(new_age, loaded_age, dirty_age))
+
+    def __gc_aggregate(self, id, now, new_age, loaded_age, dirty_age):
+        """ Check an aggregate whose deadline has passed, and schedule its
+            next check.
+        """
+        i = self.__stripe(id)
+        self.__locks[i].acquire()
+        try:
+            aggregate = self.__containers[i].peek(id, None)
+        finally:
+            self.__locks[i].release()
 
-            if state == ProofConstants.AGGR_DIRTY:
+        if aggregate == None:
+            return
 
-                if (now - last_access) > dirty_age:
-                    if aggregate.isAutoCommit():
-                        aggregate.commit()
-                    else:
-                        self.log( "%s change was cancelled by %s.gc. The changed attributes are '%s'." % \
-                                  ( str(aggregate.getPK()),
-                                    self.__class__.__name__,
-                                    aggregate.getDirtyAttributes() ) )
-                        aggregate.cancel()
+        # state transitions
+        state = aggregate.getState()
+        last_access = aggregate._access_time()
 
-            elif state == ProofConstants.AGGR_LOADED:
+        if state == ProofConstants.AGGR_DIRTY:
 
-                if (now - last_access) > loaded_age:
-                    aggregate.unload()
+            if (now - last_access) > dirty_age:
+                self.__settle(aggregate)
 
-            else:
+        elif state in [ ProofConstants.AGGR_PARTIAL,
+                        ProofConstants.AGGR_LOADED ]:
 
-                if (now - last_access) > new_age:
-                    #del aggregate
-                    self.remove(aggregate, id)
+            if (now - last_access) > loaded_age:
+                aggregate.unload()
 
+        else:
+
+            if (now - last_access) > new_age:
+                #del aggregate
+                self.remove(aggregate, id, shared=False)
+                return
+
+        # sample the size again, since objects may be unloaded
+        self.resize(aggregate, id)
+
+        self.__schedule(id, aggregate, new_age, loaded_age, dirty_age)
+
+    def __schedule( self,
+                    id,
+                    aggregate,
+                    new_age    = None,
+                    loaded_age = None,
+                    dirty_age  = None ):
+        """ Schedule the next gc check of an aggregate by its state and last
+            access time. As any aggregate can become dirty without telling
+            the repository, the deadline is never later than the dirty age.
+        """
+        if new_age == None:
+            new_age    = self.__proof.getAggrNewAge()
+            loaded_age = self.__proof.getAggrLoadedAge()
+            dirty_age  = self.__proof.getAggrDirtyAge()
+
+        state = aggregate.getState()
+        if state in [ ProofConstants.AGGR_PARTIAL,
+                      ProofConstants.AGGR_LOADED ]:
+            age = loaded_age
+        elif state == ProofConstants.AGGR_DIRTY:
+            age = dirty_age
+        else:
+            age = new_age
+
+        self.__expiry.schedule(id, aggregate._access_time() + min(age, dirty_age))
+
+
+    def __settle(self, aggregate):
+        """ Commit the changes of a dirty aggregate if it is auto commit, or
+            cancel them.
+        """
+        if aggregate.getState() != ProofConstants.AGGR_DIRTY:
+            return
+
+        if aggregate.isAutoCommit():
+            aggregate.commit()
+        else:
+            self.log( "%s change was cancelled by %s.gc. The changed attributes are '%s'." % \
+                      ( str(aggregate.getPK()),
+                        self.__class__.__name__,
+                        aggregate.getDirtyAttributes() ) )
+            aggregate.cancel()
 
     def gc_session(self):
         """ garbage collection on thread_sessions.
@@ -349,8 +1013,16 @@ class Repository:
 
         now = time.time()
 
+        items = []
+        for i in range(self.__stripes):
+            self.__locks[i].acquire()
+            try:
+                items.extend(self.__thread_sessions[i].items())
+            finally:
+                self.__locks[i].release()
+
         # clean up sessions
-        for thread_id, session in self.__thread_sessions.items():
+        for thread_id, session in items:
             if (now - session[0]) > ProofConstants.THREAD_SESSION_LIFETIME:
                 self.remove_thread_session(thread_id)
             
@@ -360,7 +1032,7 @@ class Repository:
 
             @param criteria A Criteria object.
         """
-        self.log( "start %s findByCriteria" % (self.__class__.__name__) )
+        self.debug( "start %s findByCriteria", self.__class__.__name__ )
         factory = self.__proof.getInstanceForAggregateFactory( self.__aggr_name,
                                                                schema=self.__db_schema )
         return factory.doSelectAggregate(criteria)
@@ -427,19 +1099,22 @@ class Repository:
         """
         assert( issubclass(pk.__class__, ObjectKey.ObjectKey) )
 
-        self.log( "start findByPK for '%s'" % (str(pk)) )
+        self.debug( "start findByPK for '%s'", pk )
         
-        aggregate = self.__container.get(str(pk), None)
+        aggregate = self.get(pk)
         if aggregate:
             return aggregate
 
+        if self.isMissed(pk):
+            return None
+
         criteria = Criteria.Criteria( self.__proof,
                                       db_name = self.__db_name,
                                       logger  = self.__logger )
         pk_value = pk.getValue()
         if type(pk_value) == type([]):
-            for pk in pk_value:
-                criteria[pk.getFullyQualifiedName()] = pk.getValue()
+            for key in pk_value:
+                criteria[key.getFullyQualifiedName()] = key.getValue()
         else:
             criteria[pk.getFullyQualifiedName()] = pk_value
 
@@ -453,6 +1128,7 @@ class Repository:
                      (self.__class__.__name__, results))
             return results[0]
 
+        self.addMissed(pk)
         return None
 
     getByPK = findByPK
@@ -462,7 +1138,7 @@ class Repository:
 
             @param id An integer or string.
         """
-        self.log( "start findById for '%s' from '%s'" % (id, col) )
+        self.debug( "start findById for '%s' from '%s'", id, col )
         
         if not id:
             return None
@@ -476,6 +1152,102 @@ class Repository:
 
     getById = findById
 
+    def findByPKs(self, pks):
+        """ Return a list of aggregates based on a list of pks. Cached
+            aggregates are served from the container or the L2 cache, and
+            the rest are fetched with one IN query per pk column.
+
+            @param pks A list of ObjectKey objects.
+            @return A list of aggregates in the same order as pks. None is
+                    put in the place of a pk which doesn't exist.
+        """
+        self.debug( "start findByPKs for %s pks", len(pks) )
+
+        results = {}
+
+        # group the pks by stripe to take each lock once
+        stripes = {}
+        for pk in pks:
+            assert( issubclass(pk.__class__, ObjectKey.ObjectKey) )
+            id = str(pk)
+            stripes.setdefault(self.__stripe(id), []).append(id)
+
+        for i, ids in stripes.items():
+            # be thread safe
+            self.__locks[i].acquire()
+            try:
+                for id in ids:
+                    aggregate = self.__containers[i].get(id, None)
+                    if aggregate:
+                        results[id] = aggregate
+            finally:
+                self.__locks[i].release()
+
+        # the rest may be shared by other processes in the L2 cache
+        if self.__proof.getL2Cache():
+            ids = [ str(pk) for pk in pks if not results.has_key(str(pk)) ]
+            for id, aggregate in self.__getSharedMulti(ids).items():
+                results[id] = self.add(aggregate, id, shared=False)
+
+        # group the missed pks by the pk column
+        missed = {}
+        for pk in pks:
+            if results.has_key(str(pk)):
+                continue
+            if self.isMissed(pk):
+                results[str(pk)] = None
+                continue
+            if type(pk.getValue()) == type([]):
+                # combo pk can't be put in an IN clause
+                results[str(pk)] = self.findByPK(pk)
+            else:
+                missed.setdefault(pk.getFullyQualifiedName(), {})[str(pk.getValue())] = pk
+
+        for column_name, pk_dict in missed.items():
+            criteria = Criteria.Criteria( self.__proof,
+                                          db_name = self.__db_name,
+                                          logger  = self.__logger )
+            criteria.addIn(column_name, [ pk.getValue() for pk in pk_dict.values() ])
+
+            for aggregate in self.getByCriteria(criteria):
+                pk = pk_dict.get(str(aggregate.getId()), None)
+                if pk:
+                    results[str(pk)] = aggregate
+
+            for pk in pk_dict.values():
+                if not results.has_key(str(pk)):
+                    self.addMissed(pk)
+
+        return [ results.get(str(pk), None) for pk in pks ]
+
+    getByPKs = findByPKs
+
+    def findByIds(self, ids, col='Id'):
+        """ Return a list of aggregates based on a list of Id values.
+
+            @param ids A list of integers or strings.
+            @return A list of aggregates in the same order as ids. None is
+                    put in the place of an id which doesn't exist.
+        """
+        self.debug( "start findByIds for %s ids from '%s'", len(ids), col )
+
+        if col.find(".") != -1:
+            col = col.split(".")[-1]
+        column_name = "%s.%s" % (self.__aggr_name, col)
+
+        pks = []
+        for id in ids:
+            if id:
+                pks.append(ObjectKey.ObjectKey(id, column_name=column_name))
+
+        results = {}
+        for pk, aggregate in zip(pks, self.findByPKs(pks)):
+            results[str(pk.getValue())] = aggregate
+
+        return [ results.get(str(id), None) for id in ids ]
+
+    getByIds = findByIds
+
 
     #===========================================================================
 
@@ -492,6 +1264,7 @@ class Repository:
     def setLogger(self, logger):
         self.__logger = Logger.makeLogger(logger)
         self.log = self.__logger.write
+        self.debug = LazyLog.LazyLog(self.__logger)
 
     def __getstate__(self):
         """ Used by pickle when the class is serialized.
@@ -502,6 +1275,7 @@ class Repository:
         del d["__logger"]
         del d["__proof"]
         del d["log"]
+        del d["debug"]
         del d["lock"]
         return d
     
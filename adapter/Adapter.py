@@ -119,6 +119,18 @@ class Adapter:
         """
         return self.ignoreCase(s)
 
+    def ignoreCaseInPrefixLike(self, s):
+        """ This method is used to ignore case in a LIKE which only has a
+            trailing wildcard, e.g. LIKE 'fre%', on both the column and the
+            value. Usually it is the same as ignoreCase, but a database
+            which compares strings without case by default may return s
+            as it is, so that an index on the column can serve the LIKE.
+            
+            @param s The string whose case to ignore.
+            @return The string in a case that can be ignored.
+        """
+        return self.ignoreCase(s)
+
     def supportsNativeLimit(self):
         """ This method is used to check whether the database natively
             supports limiting the size of the resultset.
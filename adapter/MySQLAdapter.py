@@ -80,6 +80,17 @@ class MySQLAdapter(Adapter.Adapter):
         """
         return self.toUpperCase(s)
 
+    def ignoreCaseInPrefixLike(self, s):
+        """ This method is used to ignore case in a LIKE which only has a
+            trailing wildcard. The default collations of MySQL compare
+            strings without case, so s is returned as it is, and an index
+            on the column can serve the LIKE with a range scan.
+            
+            @param s The string whose case to ignore.
+            @return The string as it is.
+        """
+        return s
+
     def supportsNativeLimit(self):
         """ This method is used to check whether the database natively
             supports limiting the size of the resultset.
@@ -0,0 +1,97 @@
+"""
+The base class of the second level (L2) aggregate caches. An L2 cache is shared
+by processes, so that an aggregate loaded by one process can be used by the
+others. The values are strings, normally pickled aggregates, and each value has
+its own time-to-live.
+
+The cache is always best effort. A backend should never raise an exception to
+its callers, and a failed get is the same as a miss.
+"""
+
+__version__='$Revision: 3194 $'[11:-2]
+__author__ = "Duan Guoqiang (mattgduan@gmail.com)"
+
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+import util.logger.Logger as Logger
+
+import proof.ProofException as ProofException
+
+# The maximum length of a key used by backends
+MAX_KEY_LENGTH = 250
+
+
+class Cache:
+
+    def __init__(self, logger=None):
+        """ Constructor.
+
+            @param logger A Logger object.
+        """
+        self.__logger = Logger.makeLogger(logger)
+        self.log = self.__logger.write
+
+    def get(self, key):
+        """ Get a value.
+
+            @param key A string.
+            @return The string value or None if missed or expired.
+        """
+        raise ProofException.ProofNotImplementedException( \
+            "%s.get: need to be overrided by subclass." % (self.__class__.__name__) )
+
+    def getMulti(self, keys):
+        """ Get many values. A backend which can get them in one request
+            should override it.
+
+            @param keys A list of strings.
+            @return A dictionary of the values found, by their keys.
+        """
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value != None:
+                values[key] = value
+        return values
+
+    def set(self, key, value, ttl=0):
+        """ Set a value.
+
+            @param key A string.
+            @param value A string.
+            @param ttl The time-to-live in seconds. 0 means never expired.
+            @return True if the value is stored.
+        """
+        raise ProofException.ProofNotImplementedException( \
+            "%s.set: need to be overrided by subclass." % (self.__class__.__name__) )
+
+    def delete(self, key):
+        """ Delete a value.
+
+            @param key A string.
+        """
+        raise ProofException.ProofNotImplementedException( \
+            "%s.delete: need to be overrided by subclass." % (self.__class__.__name__) )
+
+    def makeKey(self, key):
+        """ Convert a key to a safe one, which has no spaces or control
+            characters and is not longer than MAX_KEY_LENGTH.
+
+            @param key A string.
+            @return A string.
+        """
+        if len(key) > MAX_KEY_LENGTH or \
+               [ c for c in key if ord(c) < 33 or ord(c) == 127 ]:
+            return md5(key).hexdigest()
+        return key
+
+    def getLogger(self):
+        return self.__logger
+
+    def setLogger(self, logger):
+        self.__logger = Logger.makeLogger(logger)
+        self.log = self.__logger.write
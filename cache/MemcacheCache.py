@@ -0,0 +1,180 @@
+"""
+An L2 cache backend using the memcached text protocol. It works with a
+memcached server or any local stand-in speaking the same protocol. One socket
+is kept for each cache object and shared by the threads under a lock. The
+socket is reconnected on the next call after an error.
+"""
+
+__version__='$Revision: 3194 $'[11:-2]
+__author__ = "Duan Guoqiang (mattgduan@gmail.com)"
+
+
+import socket
+import thread
+import logging
+
+from util.Trace import traceBack
+
+import proof.cache.Cache as Cache
+
+# default server
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 11211
+
+# default socket timeout: 3 seconds
+DEFAULT_TIMEOUT = 3
+
+# the maximum number of keys in one get request
+MAX_MULTI_KEYS = 100
+
+
+class MemcacheCache(Cache.Cache):
+
+    def __init__( self,
+                  host    = DEFAULT_HOST,
+                  port    = DEFAULT_PORT,
+                  timeout = DEFAULT_TIMEOUT,
+                  logger  = None ):
+        """ Constructor. The connection is made on the first call.
+
+            @param host The server host.
+            @param port The server port.
+            @param timeout The socket timeout in seconds.
+            @param logger A Logger object.
+        """
+        Cache.Cache.__init__(self, logger)
+
+        self.__address = (host, port)
+        self.__timeout = timeout
+        self.__socket  = None
+        self.__file    = None
+
+        self.lock = thread.allocate_lock()
+
+    def get(self, key):
+        key = self.makeKey(key)
+
+        self.lock.acquire()
+        try:
+            try:
+                self.__send("get %s\r\n" % (key))
+                line = self.__readline()
+                if line == "END":
+                    return None
+                if not line.startswith("VALUE "):
+                    raise IOError("unexpected reply '%s'" % (line))
+                length = int(line.split()[3])
+                value = self.__file.read(length + 2)[:length]
+                self.__readline()   # END
+                return value
+            except:
+                self.log( "Exception in %s.get: %s" % \
+                          (self.__class__.__name__, traceBack()), logging.ERROR )
+                self.__close()
+                return None
+        finally:
+            self.lock.release()
+
+    def getMulti(self, keys):
+        """ Get many values with one get request for every MAX_MULTI_KEYS
+            keys.
+        """
+        # the keys sent to the server
+        made = {}
+        for key in keys:
+            made[self.makeKey(key)] = key
+        made_keys = made.keys()
+
+        values = {}
+        self.lock.acquire()
+        try:
+            try:
+                for start in range(0, len(made_keys), MAX_MULTI_KEYS):
+                    self.__send( "get %s\r\n" % \
+                                 (" ".join(made_keys[start:start+MAX_MULTI_KEYS])) )
+                    while 1:
+                        line = self.__readline()
+                        if line == "END":
+                            break
+                        if not line.startswith("VALUE "):
+                            raise IOError("unexpected reply '%s'" % (line))
+                        tokens = line.split()
+                        length = int(tokens[3])
+                        value = self.__file.read(length + 2)[:length]
+                        if made.has_key(tokens[1]):
+                            values[made[tokens[1]]] = value
+                return values
+            except:
+                self.log( "Exception in %s.getMulti: %s" % \
+                          (self.__class__.__name__, traceBack()), logging.ERROR )
+                self.__close()
+                return values
+        finally:
+            self.lock.release()
+
+    def set(self, key, value, ttl=0):
+        key = self.makeKey(key)
+
+        self.lock.acquire()
+        try:
+            try:
+                self.__send( "set %s 0 %d %d\r\n%s\r\n" % \
+                             (key, int(ttl), len(value), value) )
+                return self.__readline() == "STORED"
+            except:
+                self.log( "Exception in %s.set: %s" % \
+                          (self.__class__.__name__, traceBack()), logging.ERROR )
+                self.__close()
+                return False
+        finally:
+            self.lock.release()
+
+    def delete(self, key):
+        key = self.makeKey(key)
+
+        self.lock.acquire()
+        try:
+            try:
+                self.__send("delete %s\r\n" % (key))
+                self.__readline()
+            except:
+                self.log( "Exception in %s.delete: %s" % \
+                          (self.__class__.__name__, traceBack()), logging.ERROR )
+                self.__close()
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            self.__close()
+        finally:
+            self.lock.release()
+
+    def __connect(self):
+        if not self.__socket:
+            self.__socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.__socket.settimeout(self.__timeout)
+            self.__socket.connect(self.__address)
+            self.__file = self.__socket.makefile('rb')
+
+    def __close(self):
+        try:
+            if self.__file:
+                self.__file.close()
+            if self.__socket:
+                self.__socket.close()
+        except:
+            pass
+        self.__file   = None
+        self.__socket = None
+
+    def __send(self, data):
+        self.__connect()
+        self.__socket.sendall(data)
+
+    def __readline(self):
+        line = self.__file.readline()
+        if not line:
+            raise IOError("connection closed by server")
+        return line.rstrip("\r\n")
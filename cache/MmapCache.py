@@ -0,0 +1,158 @@
+"""
+An L2 cache backend in a memory mapped file, shared by all processes on one
+host which open the same file. The file is divided into fixed size slots and
+each key is hashed into one slot, so a new value may replace an old value of
+another key. A value larger than a slot is not cached.
+
+Each slot is guarded by a POSIX record lock for other processes and by a
+thread lock for the threads of this process.
+"""
+
+__version__='$Revision: 3194 $'[11:-2]
+__author__ = "Duan Guoqiang (mattgduan@gmail.com)"
+
+
+import os
+import time
+import mmap
+import fcntl
+import struct
+import thread
+import logging
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+from util.Trace import traceBack
+
+import proof.cache.Cache as Cache
+
+# slot header: key digest, expire time, value length
+HEADER_FORMAT = "!16sdI"
+HEADER_SIZE   = struct.calcsize(HEADER_FORMAT)
+
+# default number of slots: 4096
+DEFAULT_SLOTS = 4096
+
+# default slot size: 16K
+DEFAULT_SLOT_SIZE = 16 * 1024
+
+
+class MmapCache(Cache.Cache):
+
+    def __init__( self,
+                  filename,
+                  slots     = DEFAULT_SLOTS,
+                  slot_size = DEFAULT_SLOT_SIZE,
+                  logger    = None ):
+        """ Constructor. The file is created if it doesn't exist. All
+            processes sharing the file should use the same slots and
+            slot_size.
+
+            @param filename The file path.
+            @param slots The number of slots.
+            @param slot_size The size of each slot in bytes, including the
+                   slot header.
+            @param logger A Logger object.
+        """
+        Cache.Cache.__init__(self, logger)
+
+        assert slot_size > HEADER_SIZE
+
+        self.__slots     = slots
+        self.__slot_size = slot_size
+        size = slots * slot_size
+
+        self.__fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0600)
+        if os.fstat(self.__fd).st_size < size:
+            os.ftruncate(self.__fd, size)
+        self.__map = mmap.mmap(self.__fd, size)
+
+        self.lock = thread.allocate_lock()
+
+    def get(self, key):
+        digest = md5(key).digest()
+        offset = self.__offset(digest)
+
+        self.__lock(offset, fcntl.LOCK_SH)
+        try:
+            try:
+                header = self.__map[offset:offset+HEADER_SIZE]
+                slot_digest, expire, length = struct.unpack(HEADER_FORMAT, header)
+                if slot_digest != digest or length == 0 or \
+                       (expire and expire < time.time()):
+                    return None
+                start = offset + HEADER_SIZE
+                return self.__map[start:start+length]
+            except:
+                self.log( "Exception in %s.get: %s" % \
+                          (self.__class__.__name__, traceBack()), logging.ERROR )
+                return None
+        finally:
+            self.__unlock(offset)
+
+    def set(self, key, value, ttl=0):
+        if len(value) > self.__slot_size - HEADER_SIZE:
+            return False
+
+        digest = md5(key).digest()
+        offset = self.__offset(digest)
+
+        expire = 0
+        if ttl:
+            expire = time.time() + ttl
+
+        self.__lock(offset, fcntl.LOCK_EX)
+        try:
+            try:
+                start = offset + HEADER_SIZE
+                self.__map[start:start+len(value)] = value
+                self.__map[offset:start] = struct.pack( HEADER_FORMAT,
+                                                        digest,
+                                                        expire,
+                                                        len(value) )
+                return True
+            except:
+                self.log( "Exception in %s.set: %s" % \
+                          (self.__class__.__name__, traceBack()), logging.ERROR )
+                return False
+        finally:
+            self.__unlock(offset)
+
+    def delete(self, key):
+        digest = md5(key).digest()
+        offset = self.__offset(digest)
+
+        self.__lock(offset, fcntl.LOCK_EX)
+        try:
+            header = self.__map[offset:offset+HEADER_SIZE]
+            if struct.unpack(HEADER_FORMAT, header)[0] == digest:
+                self.__map[offset:offset+HEADER_SIZE] = \
+                        struct.pack(HEADER_FORMAT, '\0' * 16, 0, 0)
+        finally:
+            self.__unlock(offset)
+
+    def close(self):
+        self.__map.close()
+        os.close(self.__fd)
+
+    def __offset(self, digest):
+        """ Return the offset of the slot for a key digest.
+        """
+        return (struct.unpack("!I", digest[:4])[0] % self.__slots) * self.__slot_size
+
+    def __lock(self, offset, mode):
+        self.lock.acquire()
+        try:
+            fcntl.lockf(self.__fd, mode, self.__slot_size, offset)
+        except:
+            self.lock.release()
+            raise
+
+    def __unlock(self, offset):
+        try:
+            fcntl.lockf(self.__fd, fcntl.LOCK_UN, self.__slot_size, offset)
+        finally:
+            self.lock.release()
@@ -0,0 +1,176 @@
+"""
+QueryCache keeps the results of aggregate queries in memory, shared by all the
+threads of a process. A result is the list of aggregate ids selected by a
+Criteria, keyed by the Criteria finger print, so identical queries from
+different threads are answered without going to the database.
+
+Each entry remembers the tables its query reads. Any insert, update or delete
+on one of these tables through a factory invalidates the entry. An entry also
+expires after its time-to-live, which covers changes made outside PROOF, and
+the least recently used entries are dropped when the cache is full.
+"""
+
+__version__='$Revision: 3194 $'[11:-2]
+__author__ = "Duan Guoqiang (mattgduan@gmail.com)"
+
+
+import time
+import thread
+
+import util.logger.Logger as Logger
+import util.LRUDict as LRUDict
+
+import proof.ProofConstants as ProofConstants
+
+
+class QueryCache:
+
+    def __init__( self,
+                  capacity = ProofConstants.DEFAULT_QUERY_CACHE_CAPACITY,
+                  ttl      = ProofConstants.DEFAULT_QUERY_CACHE_TTL,
+                  logger   = None ):
+        """ Constructor.
+
+            @param capacity The maximum number of query results.
+            @param ttl The time-to-live of a query result in seconds.
+            @param logger A Logger object.
+        """
+        self.__ttl = ttl
+
+        # structure: { key : [ expire time, id list, ( db_name, table ) list ] }
+        self.__entries = LRUDict.LRUDict(capacity)
+
+        # structure: { ( db_name, table ) : { key : 1 } }
+        self.__tables = {}
+
+        self.__lock = thread.allocate_lock()
+
+        # statistics
+        self.__hits   = 0
+        self.__misses = 0
+
+        self.__logger = Logger.makeLogger(logger)
+        self.log = self.__logger.write
+
+    def getTTL(self):
+        return self.__ttl
+
+    def setTTL(self, ttl):
+        self.__ttl = ttl
+
+    def getCapacity(self):
+        return self.__entries.getCapacity()
+
+    def setCapacity(self, capacity):
+        self.__lock.acquire()
+        try:
+            self.__entries.setCapacity(capacity)
+            self.__evict()
+        finally:
+            self.__lock.release()
+
+    def getStats(self):
+        """ Return the statistics.
+
+            @return A tuple of ( entries, hits, misses ).
+        """
+        return (len(self.__entries), self.__hits, self.__misses)
+
+    def get(self, key):
+        """ Get a query result.
+
+            @param key A query key, normally ( db_name, aggregate name,
+                   finger print ).
+            @return A list of aggregate ids or None if missed or expired.
+        """
+        self.__lock.acquire()
+        try:
+            entry = self.__entries.get(key, None)
+            if entry and entry[0] < time.time():
+                self.__remove(key)
+                entry = None
+
+            if entry:
+                self.__hits += 1
+                return entry[1]
+            else:
+                self.__misses += 1
+                return None
+        finally:
+            self.__lock.release()
+
+    def set(self, key, ids, db_name, tables):
+        """ Set a query result.
+
+            @param key A query key.
+            @param ids A list of aggregate ids.
+            @param db_name The database name.
+            @param tables A list of the table names read by the query.
+        """
+        table_keys = [ (db_name, table) for table in tables ]
+
+        self.__lock.acquire()
+        try:
+            if self.__entries.has_key(key):
+                self.__remove(key)
+
+            self.__entries[key] = [ time.time() + self.__ttl, ids, table_keys ]
+            for table_key in table_keys:
+                self.__tables.setdefault(table_key, {})[key] = 1
+
+            self.__evict()
+        finally:
+            self.__lock.release()
+
+    def invalidate(self, db_name, tables):
+        """ Remove all the query results reading any of the tables.
+
+            @param db_name The database name.
+            @param tables A list of table names.
+        """
+        self.__lock.acquire()
+        try:
+            for table in tables:
+                keys = self.__tables.get((db_name, table), None)
+                if keys:
+                    for key in keys.keys():
+                        self.__remove(key)
+        finally:
+            self.__lock.release()
+
+    def clear(self):
+        self.__lock.acquire()
+        try:
+            self.__entries.clear()
+            self.__tables = {}
+        finally:
+            self.__lock.release()
+
+    def __evict(self):
+        """ Drop the least recently used entries. The lock must be held.
+        """
+        while self.__entries.isOverflow():
+            key, entry = self.__entries.oldest()
+            self.__remove(key)
+
+    def __remove(self, key):
+        """ Remove an entry with its table index. The lock must be held.
+        """
+        entry = self.__entries.peek(key, None)
+        if entry == None:
+            return
+
+        del self.__entries[key]
+        for table_key in entry[2]:
+            keys = self.__tables.get(table_key, None)
+            if keys and keys.has_key(key):
+                del keys[key]
+                if not keys:
+                    del self.__tables[table_key]
+
+    def getLogger(self):
+        return self.__logger
+
+    def setLogger(self, logger):
+        self.__logger = Logger.makeLogger(logger)
+        self.log = self.__logger.write
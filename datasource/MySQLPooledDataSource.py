@@ -20,7 +20,8 @@ class MySQLPooledDataSource(PooledDataSource.PooledDataSource):
                   password,
                   dbname,
                   pool,
-                  logger = None ):
+                  logger = None,
+                  statement_cache_size = 0 ):
         # init logger object
         PooledDataSource.PooledDataSource.__init__( self,
                                                     host,
@@ -36,6 +37,9 @@ class MySQLPooledDataSource(PooledDataSource.PooledDataSource):
         self.__dbname     = dbname
         self.__pool       = pool
 
+        # the number of prepared statements cached by each connection
+        self.__statement_cache_size = statement_cache_size
+
     def getPooledConnection( self,
                              host = None,
                              username = None,
@@ -55,5 +59,6 @@ class MySQLPooledDataSource(PooledDataSource.PooledDataSource):
                                                             db     = self.__dbname,
                                                             pool   = self.__pool,
                                                             unix_socket = unix_socket,
-                                                            read_default_file = read_default_file )
+                                                            read_default_file = read_default_file,
+                                                            statement_cache_size = self.__statement_cache_size )
     
@@ -32,11 +32,13 @@ class PooledDataSourceFactory:
             password = kargs.get('password', '')
             dbname   = kargs.get('dbname', '')
             logger   = kargs.get('logger', None)
+            statement_cache_size = kargs.get('statement_cache_size', 0)
             return MySQLPooledDataSource.MySQLPooledDataSource( host,
                                                                 username,
                                                                 password,
                                                                 dbname,
                                                                 pool,
-                                                                logger )
+                                                                logger,
+                                                                statement_cache_size )
         else:
             return None
@@ -17,6 +17,13 @@ class Cursor:
     def close(self):
         self.connection = None
 
+    def setStatementCache(self, cache):
+        """ Set a StatementCache to execute the queries with args as
+            prepared statements. It is ignored if the driver doesn't
+            support it.
+        """
+        pass
+
     def execute(self, q, args=None):
         """ Return query rowcount.
         """
@@ -8,11 +8,13 @@ __author__ = "Duan Guoqiang (mattgduan@gmail.com)"
 
 #import mysql
 import MySQLdb
+import MySQLdb.constants.CLIENT as CLIENT
 
 import proof.ProofException as ProofException
 import proof.driver.Connection as Connection
 import proof.driver.MySQLCursor as MySQLCursor
 import proof.driver.MySQLDictCursor as MySQLDictCursor
+import proof.driver.StatementCache as StatementCache
 
 class MySQLConnection(Connection.Connection):
 
@@ -20,9 +22,21 @@ class MySQLConnection(Connection.Connection):
     """
 
     def __init__(self, **kwargs):
+        # the number of prepared statements cached by this connection,
+        # 0 is disabled.
+        statement_cache_size = kwargs.pop('statement_cache_size', 0)
+
+        # prepared statements are executed with multi-statement queries
+        if statement_cache_size > 0:
+            kwargs['client_flag'] = kwargs.get('client_flag', 0) | CLIENT.MULTI_STATEMENTS
+
         self.__connection = MySQLdb.Connection( **kwargs )
         self.__autocommit = True
 
+        self.__statements = None
+        if statement_cache_size > 0:
+            self.__statements = StatementCache.StatementCache(statement_cache_size)
+
     def close(self):
         self.__connection.close()
 
@@ -37,12 +51,19 @@ class MySQLConnection(Connection.Connection):
 
     def cursor(self, ret_dict=0):
         if ret_dict:
-            return self.__connection.cursor(cursorclass=MySQLDictCursor.MySQLDictCursor)
+            cursor = self.__connection.cursor(cursorclass=MySQLDictCursor.MySQLDictCursor)
         else:
-            return self.__connection.cursor(cursorclass=MySQLCursor.MySQLCursor)
+            cursor = self.__connection.cursor(cursorclass=MySQLCursor.MySQLCursor)
+        cursor.setStatementCache(self.__statements)
+        return cursor
 
     getCursor = cursor
 
+    def getStatementCache(self):
+        """ Return the StatementCache, or None if it is disabled.
+        """
+        return self.__statements
+
     def setAutoCommit(self, b):
         self.__autocommit = b
 
@@ -17,14 +17,23 @@ class MySQLDictCursor(Cursor.Cursor):
     def __init__(self, connection):
         self.connection = connection
         self.__cursor = cursors.DictCursor(connection)
+        self.__statements = None
 
     def close(self):
         self.__cursor.close()
         self.connection = None
 
+    def setStatementCache(self, cache):
+        """ Set the StatementCache of the connection.
+        """
+        self.__statements = cache
+
     def execute(self, q, args=None):
-        """ Return query rowcount.
+        """ Return query rowcount. With a StatementCache, a query with
+            args is executed as a prepared statement.
         """
+        if args != None and self.__statements != None:
+            return self.__statements.execute(self.__cursor, q, args)
         return self.__cursor.execute(q, args)
         
     def query(self, q):
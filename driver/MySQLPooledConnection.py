@@ -19,13 +19,15 @@ class MySQLPooledConnection(MySQLConnection.MySQLConnection):
         db                = kwargs['db']
         unix_socket       = kwargs.get('unix_socket', '/tmp/mysql.sock')
         read_default_file = kwargs.get('read_default_file', '/etc/my.cnf')
+        statement_cache_size = kwargs.get('statement_cache_size', 0)
         MySQLConnection.MySQLConnection.__init__( self, 
                                                   host              = host, 
                                                   user              = user, 
                                                   passwd            = passwd, 
                                                   db                = db,
                                                   unix_socket       = unix_socket,
-                                                  read_default_file = read_default_file )
+                                                  read_default_file = read_default_file,
+                                                  statement_cache_size = statement_cache_size )
         
         self.__pool = kwargs.get('pool', None)
         # make sure self is not in the pool
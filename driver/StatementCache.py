@@ -0,0 +1,154 @@
+"""
+A cache of server-side prepared statements on one connection, keyed by the
+SQL with %s placeholders. MySQLdb interpolates the parameters on the client,
+so a statement is prepared with SQL PREPARE and run with EXECUTE ... USING,
+and the parameters are passed in user variables. The SET of the variables
+and the EXECUTE are sent together as one multi-statement query, so the
+connection has to be opened with CLIENT.MULTI_STATEMENTS. The server doesn't
+parse a cached statement again, and an execution takes one round trip.
+"""
+
+__version__='$Revision: 3194 $'[11:-2]
+__author__ = "Duan Guoqiang (mattgduan@gmail.com)"
+
+
+import re
+import string
+
+import util.LRUDict as LRUDict
+
+
+# MySQL error of an unknown prepared statement, e.g. after a reconnect
+ER_UNKNOWN_STMT_HANDLER = 1243
+
+# the placeholders and the escaped '%' in a statement for the driver
+PLACEHOLDER_PATTERN = re.compile('%s|%%')
+
+
+class StatementCache:
+
+    def __init__(self, capacity):
+        """ Constructor.
+
+            @param capacity The maximum number of prepared statements.
+        """
+        # structure: { sql : ( statement name, number of parameters ) }
+        self.__statements = LRUDict.LRUDict(capacity)
+
+        self.__count  = 0
+        self.__hits   = 0
+        self.__misses = 0
+
+    def getCapacity(self):
+        return self.__statements.getCapacity()
+
+    def __len__(self):
+        return len(self.__statements)
+
+    def getStats(self):
+        """ Return the statistics.
+
+            @return A tuple of ( hits, misses, prepared statements ).
+        """
+        return (self.__hits, self.__misses, len(self.__statements))
+
+    def clear(self):
+        """ Forget the prepared statements. It is used when the session of
+            the connection is lost, which deallocates them on the server.
+        """
+        self.__statements.clear()
+
+    def execute(self, cursor, sql, args):
+        """ Execute a statement as a prepared statement, which is prepared
+            first if it isn't cached.
+
+            @param cursor A MySQLdb cursor of the connection.
+            @param sql A statement with %s placeholders.
+            @param args A sequence of the values bound to the placeholders.
+            @return The rowcount of the statement.
+        """
+        try:
+            return self.__execute(cursor, sql, args)
+        except Exception, e:
+            if not e.args or e.args[0] != ER_UNKNOWN_STMT_HANDLER:
+                raise
+            # the statements were deallocated with the session
+            self.clear()
+            return self.__execute(cursor, sql, args)
+
+    def __execute(self, cursor, sql, args):
+        statement = self.__statements.get(sql, None)
+        if statement == None:
+            self.__misses += 1
+            statement = self.__prepare(cursor, sql)
+        else:
+            self.__hits += 1
+
+        name, n = statement
+        if not n:
+            return cursor.execute("EXECUTE %s" % (name))
+
+        # SET and EXECUTE in one round trip, the result of EXECUTE is the
+        # second one
+        variables = [ "@proof_p%d" % (i) for i in range(n) ]
+        cursor.execute( "SET %s; EXECUTE %s USING %s" % \
+                        ( string.join([ "%s=%%s" % (v) for v in variables ], ", "),
+                          name,
+                          string.join(variables, ", ") ),
+                        tuple(args) )
+        cursor.nextset()
+        return cursor.rowcount
+
+    def __prepare(self, cursor, sql):
+        """ Prepare a statement on the server, and evict the least recently
+            used one if there are too many.
+
+            @return A tuple of ( statement name, number of parameters ).
+        """
+        n = PLACEHOLDER_PATTERN.findall(sql).count('%s')
+        text = PLACEHOLDER_PATTERN.sub( lambda m: m.group(0) == '%s' and '?' or '%',
+                                        sql )
+
+        self.__count += 1
+        name = "proof_stmt_%d" % (self.__count)
+        cursor.execute("PREPARE %s FROM %%s" % (name), (text,))
+
+        statement = self.__statements[sql] = (name, n)
+
+        while self.__statements.isOverflow():
+            old_sql, (old_name, old_n) = self.__statements.popOldest()
+            cursor.execute("DEALLOCATE PREPARE %s" % (old_name))
+
+        return statement
+
+
+# only used for test
+if __name__ == '__main__':
+
+    print
+    print "StatementCache Test"
+    print
+
+    class _Cursor:
+        rowcount = 0
+        def execute(self, q, args=None):
+            if args != None:
+                q = q % tuple([ `arg` for arg in args ])
+            print "    %s" % (q)
+            return 0
+        def nextset(self):
+            return 1
+
+    cache = StatementCache(1)
+    cursor = _Cursor()
+    print "cache.execute(SELECT ... WHERE A.B=%s AND A.C LIKE '10%%', [ 1 ]) =>"
+    cache.execute(cursor, "SELECT A.B FROM A WHERE A.B=%s AND A.C LIKE '10%%'", [ 1 ])
+    print "cache.execute(SELECT ... WHERE A.B=%s AND A.C LIKE '10%%', [ 2 ]) =>"
+    cache.execute(cursor, "SELECT A.B FROM A WHERE A.B=%s AND A.C LIKE '10%%'", [ 2 ])
+    print "cache.execute(SELECT ... FROM A, []) =>"
+    cache.execute(cursor, "SELECT A.B FROM A", [])
+    print "cache.getStats() => %s" % (`cache.getStats()`)
+    print
+
+    print "done."
+    print
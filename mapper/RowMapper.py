@@ -0,0 +1,122 @@
+"""
+RowMapper is a compiled form of a TableMap used to convert database rows into
+objects. The primary key columns, the attribute keys and the object classes are
+worked out once per TableMap, so that converting a row is only a few dictionary
+lookups.
+"""
+
+__version__= '$Revision: 3194 $'[11:-2]
+__author__ = "Duan Guoqiang (mattgduan@gmail.com)"
+
+
+import proof.pk.ObjectKey as ObjectKey
+import proof.pk.ComboKey as ComboKey
+
+
+class RowMapper:
+
+    def __init__(self, table_map):
+        """ Constructor.
+
+            @param table_map A TableMap object.
+        """
+        table_name  = table_map.getName()
+
+        pk_columns = []
+        attr_names = []
+        for column_map in table_map.getColumns():
+            if column_map.isPrimaryKey():
+                pk_columns.append(column_map.getFullyQualifiedName())
+            else:
+                attr_names.append(column_map.getColumnName())
+
+        # fully qualified primary key column names
+        self.__pk_columns = tuple(pk_columns)
+
+        # attribute names
+        self.__attr_names = tuple(attr_names)
+
+        # ( attribute name, fully qualified column name ) pairs
+        self.__attr_keys = tuple([ (name, "%s.%s" % (table_name, name))
+                                   for name in attr_names ])
+
+        # timestamp column
+        self.__timestamp_column = table_map.getTimestampColumn()
+
+        # object classes by schema name
+        self.__object_classes = {}
+
+    def getPKColumns(self):
+        """ Get the fully qualified names of the primary key columns.
+
+            @return A tuple of strings.
+        """
+        return self.__pk_columns
+
+    def getAttributeNames(self):
+        """ Get the names of the non-primary key columns.
+
+            @return A tuple of strings.
+        """
+        return self.__attr_names
+
+    def getAttributeKeys(self):
+        """ Get the attribute names with their fully qualified column names.
+
+            @return A tuple of ( attribute name, column name ) pairs.
+        """
+        return self.__attr_keys
+
+    def getTimestampColumn(self):
+        """ Get the timestamp column.
+
+            @return A ColumnMap object or None.
+        """
+        return self.__timestamp_column
+
+    def getObjectClass(self, schema):
+        """ Get the object class resolved for a schema.
+
+            @param schema The schema name.
+            @return A BaseObject subclass or None.
+        """
+        return self.__object_classes.get(schema, None)
+
+    def setObjectClass(self, schema, object_class):
+        """ Set the object class resolved for a schema.
+
+            @param schema The schema name.
+            @param object_class A BaseObject subclass.
+        """
+        self.__object_classes[schema] = object_class
+
+    def makePK(self, row):
+        """ Make the primary key from a row.
+
+            @param row A dictionary with column_name/value pairs.
+            @return An ObjectKey, a ComboKey or None.
+        """
+        pk_list = []
+        for column_name in self.__pk_columns:
+            if row.has_key(column_name):
+                pk_list.append( ObjectKey.ObjectKey( row[column_name],
+                                                     column_name ) )
+        if not pk_list:
+            return None
+        elif len(pk_list) == 1:
+            return pk_list[0]
+        else:
+            return ComboKey.ComboKey(pk_list)
+
+    def mapAttributes(self, row, attributes):
+        """ Copy the attribute values from a row.
+
+            @param row A dictionary with column_name/value pairs. The column
+                   name can be either fully qualified or not.
+            @param attributes The attribute dictionary to update.
+        """
+        for key, column_name in self.__attr_keys:
+            if row.has_key(column_name):
+                attributes[key] = row[column_name]
+            elif row.has_key(key):
+                attributes[key] = row[key]
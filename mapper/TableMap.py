@@ -12,6 +12,7 @@ import datetime
 import proof.pk.IDMethod as IDMethod
 
 import proof.mapper.ColumnMap as ColumnMap
+import proof.mapper.RowMapper as RowMapper
 
 class TableMap:
 
@@ -50,6 +51,9 @@ class TableMap:
         # the timestamp column
         self.__timestamp_column = None
 
+        # the compiled row mapper, built on first use
+        self.__row_mapper = None
+
     def containsColumn(self, column):
         """ Does this table contain the specified column?
         
@@ -149,6 +153,16 @@ class TableMap:
         """
         return self.__columns.get(name)
 
+    def getRowMapper(self):
+        """ Get the compiled RowMapper of this table. It is rebuilt after
+            the columns are changed.
+
+            @return A RowMapper.
+        """
+        if not self.__row_mapper:
+            self.__row_mapper = RowMapper.RowMapper(self)
+        return self.__row_mapper
+
     def addColumnMap(self, cmap):
         """ Add a pre-created column to this table.  It will replace any
             existing column.
@@ -156,6 +170,7 @@ class TableMap:
             @param cmap A ColumnMap.
         """
         self.__columns[cmap.getColumnName()] = cmap
+        self.__row_mapper = None
 
     def addColumn( self,
                    name,
@@ -190,6 +205,7 @@ class TableMap:
         col.setForeignKey(fkTable, fkColumn)
         col.setSize(size)
         self.__columns[name] = col
+        self.__row_mapper = None
 
     def addPrimaryKey(self, name, type, size=0):
         """ Add a primary key column to this Table.
@@ -261,6 +277,7 @@ class TableMap:
             @param column A ColumnMap object.
         """
         self.__timestamp_column = column
+        self.__row_mapper = None
 
     def removeUnderScores(self, value):
         """ Removes the PREFIX, removes the underscores and makes
@@ -71,6 +71,15 @@ class ComboKey(ObjectKey.ObjectKey):
         
     setValue = setKey
 
+    def getKey(self):
+        """ Get the underlying ObjectKeys.
+
+            @return a list of ObjectKeys
+        """
+        return self.__key
+
+    getValue = getKey
+
     def getTableName(self):
         # all table names should be same
         return self.__key[0].getTableName()
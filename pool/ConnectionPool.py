@@ -44,7 +44,8 @@ class ConnectionPool:
                   expiry_time     = DEFAULT_EXPIRY_TIME,
                   wait_timeout    = DEFAULT_CONNECTION_WAIT_TIMEOUT,
                   logger          = None,
-                  log_interval    = 0
+                  log_interval    = 0,
+                  statement_cache_size = 0
                   ):
         """ Creates a <code>ConnectionPool</code> with the default
             attributes.
@@ -58,6 +59,8 @@ class ConnectionPool:
             @param wait_timeout timeout
             @param logger The logger object.
             @param log_interval log interval
+            @param statement_cache_size The number of prepared statements
+                   cached by each pooled connection, 0 is disabled.
         """
         self.__host              = host
         self.__username          = username
@@ -104,7 +107,8 @@ class ConnectionPool:
                                               username = self.__username,
                                               password = self.__password,
                                               dbname = self.__dbname,
-                                              logger = self.__logger )
+                                              logger = self.__logger,
+                                              statement_cache_size = statement_cache_size )
         
         if not self.__pooled_ds:
             raise ProofException.ProofNotFoundException( \
@@ -74,6 +74,10 @@ class Criteria(dict):
         self.__aliases          = {}
         
         self.__useTransaction   = False
+
+        # The cached finger print, None if it has to be built again.
+        # Refer to __finger_print__.
+        self.__finger_print     = None
         
         # the log.
         self.__logger           = Logger.makeLogger(logger)
@@ -114,6 +118,7 @@ class Criteria(dict):
         self.__limit            = -1
         self.__aliases.clear()
         self.__useTransaction   = False
+        self.__finger_print     = None
 
     #------------------------------------------------------------------------
     #
@@ -140,6 +145,7 @@ class Criteria(dict):
             @return A modified Criteria object.
         """
         self.__ignoreCase = ignoreCase
+        self._changed()
         return self
 
     def getSingleRecord(self):
@@ -159,6 +165,7 @@ class Criteria(dict):
             @return A modified Criteria object.
         """
         self.__singleRecord = singleRecord
+        self._changed()
         return self
 
     def getCascade(self):
@@ -171,6 +178,7 @@ class Criteria(dict):
             @return A modified Criteria object.
         """
         self.__cascade = cascade
+        self._changed()
         return self
 
     def getSelectModifiers(self):
@@ -178,6 +186,8 @@ class Criteria(dict):
 
     def setSelectModifiers(self, selectModifiers):
         if isinstance(selectModifiers, UniqueList.UniqueList):
+            if selectModifiers != self.__selectModifiers:
+                self._changed()
             self.__selectModifiers = selectModifiers
         else:
             raise TypeError( """Criteria.setSelectModifiers() argument must be a UniqueList (not "%s")""" % \
@@ -188,6 +198,8 @@ class Criteria(dict):
 
     def setSelectColumns(self, selectColumns):
         if isinstance(selectColumns, UniqueList.UniqueList):
+            if selectColumns != self.__selectColumns:
+                self._changed()
             self.__selectColumns = selectColumns
         else:
             raise TypeError( """Criteria.setSelectColumns() argument must be a UniqueList (not "%s")""" % \
@@ -198,6 +210,8 @@ class Criteria(dict):
 
     def setOrderByColumns(self, orderByColumns):
         if isinstance(orderByColumns, UniqueList.UniqueList):
+            if orderByColumns != self.__orderByColumns:
+                self._changed()
             self.__orderByColumns = orderByColumns
         else:
             raise TypeError( """Criteria.setOrderByColumns() argument must be a UniqueList (not "%s")""" % \
@@ -208,6 +222,8 @@ class Criteria(dict):
 
     def setGroupByColumns(self, groupByColumns):
         if isinstance(groupByColumns, UniqueList.UniqueList):
+            if groupByColumns != self.__groupByColumns:
+                self._changed()
             self.__groupByColumns = groupByColumns
         else:
             raise TypeError( """Criteria.setGroupByColumns() argument must be a UniqueList (not "%s")""" % \
@@ -235,6 +251,7 @@ class Criteria(dict):
         else:
             self.__dbName = self.__proof_instance.getDefaultDB()
         self.__schema_name = self.__proof_instance.getSchemaName(self.__dbName)
+        self._changed()
 
     def getSchemaName(self):
         return self.__schema_name
@@ -242,6 +259,7 @@ class Criteria(dict):
     def setSchemaName(self, schema_name):
         self.__schema_name = schema_name
         self.__dbName = self.__proof_instance.getDBName(schema_name)
+        self._changed()
     
     def getLimit(self):
         return self.__limit
@@ -253,6 +271,7 @@ class Criteria(dict):
             @return A modified Criteria object.
         """
         self.__limit = limit
+        self._changed()
         return self
 
     def getOffset(self):
@@ -265,6 +284,7 @@ class Criteria(dict):
             @return A modified Criteria object.
         """
         self.__offset = offset
+        self._changed()
         return self
 
     def getAlias(self):
@@ -318,6 +338,7 @@ class Criteria(dict):
         """
         if isinstance(having, Criterion):
             self.__having = having
+            self._changed()
             return self
         else:
             raise TypeError( """Criteria.setHaving argument must be a Criterion (not "%s")""" % \
@@ -328,12 +349,14 @@ class Criteria(dict):
 
     def setJoinL(self, joinL):
         self.__joinL = joinL
+        self._changed()
 
     def getJoinR(self):
         return self.__joinR
 
     def setJoinR(self, joinR):
         self.__joinR = joinR
+        self._changed()
 
     def setLogger(self, logger):
         self.__logger = logger
@@ -377,6 +400,32 @@ class Criteria(dict):
         """
         self.__aliases.get(alias)
 
+    def getReadTables(self):
+        """ Returns the names of all the tables a select with this criteria
+            reads, with aliases resolved.
+
+            @return A UniqueList of table names.
+        """
+        names = UniqueList.UniqueList()
+        for key in self.keys():
+            names.extend(self.getCriterion(key).getAllTables())
+
+        columns = self.__joinL + self.__joinR + \
+                  list(self.__selectColumns) + \
+                  list(self.__orderByColumns) + \
+                  list(self.__groupByColumns)
+        for column in columns:
+            column = column.split(' ')[0].split('(')[-1]
+            if column.find('.') > 0:
+                names.append(column.split('.')[0])
+
+        tables = UniqueList.UniqueList()
+        for name in names:
+            if name:
+                tables.append(self.__aliases.get(name, name))
+
+        return tables
+
     def isUseTransaction(self):
         return self.__useTransaction
 
@@ -462,6 +511,7 @@ class Criteria(dict):
             dict.__setitem__( self,
                               "%s.%s" % (criterion.getTable(), criterion.getColumn()),
                               criterion )
+        self._changed()
         return self
     
     def getColumnName(self, name):
@@ -598,6 +648,7 @@ class Criteria(dict):
         """
         self.__joinL.append(left)
         self.__joinR.append(right)
+        self._changed()
 
         return self
 
@@ -650,9 +701,12 @@ class Criteria(dict):
         """ Adds "ALL " to the SQL statement.
         """
         self.__selectModifiers.append( SQLConstants.ALL )
+        self._changed()
 
     def setDistinct(self):
-        self.__selectModifiers.append( SQLConstants.DISTINCT )
+        if SQLConstants.DISTINCT not in self.__selectModifiers:
+            self.__selectModifiers.append( SQLConstants.DISTINCT )
+            self._changed()
 
     isIgnoreCase = getIgnoreCase
 
@@ -667,6 +721,7 @@ class Criteria(dict):
             @return A modified Criteria object.
         """
         self.__selectColumns.append(name)
+        self._changed()
         return self
 
     def addGroupByColumn(self, groupBy):
@@ -676,6 +731,7 @@ class Criteria(dict):
             @return A modified Criteria object.
         """
         self.__groupByColumns.append(groupBy)
+        self._changed()
         return self
 
     def addAscendingOrderByColumn(self, name):
@@ -685,6 +741,7 @@ class Criteria(dict):
             @return A modified Criteria object.
         """
         self.__orderByColumns.append("%s %s" % (name, SQLConstants.ASC))
+        self._changed()
         return self
 
     def addDescendingOrderByColumn(self, name):
@@ -694,6 +751,7 @@ class Criteria(dict):
             @return A modified Criteria object.
         """
         self.__orderByColumns.append("%s %s" % (name, SQLConstants.DESC))
+        self._changed()
         return self
 
     addHaving = setHaving
@@ -708,8 +766,32 @@ class Criteria(dict):
         removed = self.get(key, None)
         if removed:
             dict.__delitem__(self, key)
+            self._changed()
+        return removed
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._changed()
+
+    def pop(self, key, *args):
+        removed = dict.pop(self, key, *args)
+        self._changed()
         return removed
 
+    def popitem(self):
+        item = dict.popitem(self)
+        self._changed()
+        return item
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._changed()
+
+    def setdefault(self, key, default=None):
+        if not self.has_key(key):
+            self._changed()
+        return dict.setdefault(self, key, default)
+
     def __str__(self):
         """ Build a string representation of the Criteria.
      
@@ -763,9 +845,20 @@ class Criteria(dict):
 
         return False
 
+    def _changed(self):
+        """ Drop the cached finger print. It is called by all the methods
+            changing this Criteria or its Criterion objects. The lists
+            returned by the getters should not be changed in place.
+        """
+        self.__finger_print = None
+
     def __finger_print__(self):
-        """ An unique string used to represent this object.
+        """ An unique string used to represent this object. It is built once
+            and cached until this Criteria is changed.
         """
+        if self.__finger_print != None:
+            return self.__finger_print
+
         s = "%s:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s" % ( len(self),
                                                          self.__offset,
                                                          self.__limit,
@@ -783,6 +876,36 @@ class Criteria(dict):
             criterion = self.getCriterion(k)
             s += ":%s:%s" % (k, criterion.__finger_print__())
 
+        self.__finger_print = s
+        return s
+
+    def __shape__(self, args):
+        """ A string which represents the structure of this object without
+            the values of the criterions, which are appended to args in the
+            order of the where clause built by BaseFactory.createQuery.
+            Criteria objects with the same shape only differ in the values
+            bound to the placeholders of their queries.
+
+            @param args A list which the bound values are appended to.
+            @return A String.
+        """
+        s = "%s:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s" % ( self.__dbName,
+                                                         self.__offset,
+                                                         self.__limit,
+                                                         self.__ignoreCase,
+                                                         self.__selectModifiers,
+                                                         self.__selectColumns,
+                                                         self.__asColumns,
+                                                         self.__aliases,
+                                                         self.__orderByColumns,
+                                                         self.__groupByColumns,
+                                                         self.__having,
+                                                         self.__joinL,
+                                                         self.__joinR )
+        for k in self.keys():
+            criterion = self.getCriterion(k)
+            s += ":%s:(%s)" % (k, criterion.__shape__(args))
+
         return s
     
         
@@ -1050,6 +1173,7 @@ class Criterion:
         """
         assert isinstance(criteria, Criteria)
         self.__criteria = criteria
+        criteria._changed()
 
     def getColumn(self):
         """ Get the column name.
@@ -1064,6 +1188,7 @@ class Criterion:
             @param name A String with the table name.
         """
         self.__table = name
+        self.__changed()
 
     def getTable(self):
         """ Get the table name.
@@ -1121,7 +1246,9 @@ class Criterion:
             @param b True if case should be ignored.
             @return A modified Criteria object.
         """
-        self.__ignoreCase = bool
+        if self.__ignoreCase != bool:
+            self.__ignoreCase = bool
+            self.__changed()
         return self
 
     def getIgnoreCase(self):
@@ -1149,6 +1276,7 @@ class Criterion:
         assert isinstance(criterion, self.__class__)
         self.__clauses.append(criterion)
         self.__conjunctions.append(SQLConstants.AND)
+        self.__changed()
         return self
 
     def orCriterion(self, criterion):
@@ -1157,11 +1285,29 @@ class Criterion:
         assert isinstance(criterion, self.__class__)
         self.__clauses.append(criterion)
         self.__conjunctions.append(SQLConstants.OR)
+        self.__changed()
         return self
 
+    def __changed(self):
+        """ Tell the Criteria that the finger print is changed.
+        """
+        if self.__criteria:
+            self.__criteria._changed()
+
     def __str__(self):
         """ The string representation of the Criterion.
         """
+        return self.buildSQL()
+
+    def buildSQL(self, args=None):
+        """ Build the SQL of the Criterion and its clauses.
+
+            @param args If a list is given, the values are replaced by %s
+                   placeholders and appended to it for the driver to bind,
+                   and a '%' in a custom clause is doubled. Otherwise the
+                   values are inlined as literals.
+            @return A String with the SQL.
+        """
         if not self.__column:
             return ""
 
@@ -1169,19 +1315,30 @@ class Criterion:
 
         if self.__comparison == SQLConstants.CUSTOM:
             if self.__value:
-                s += self.__value
+                if args == None:
+                    s += self.__value
+                else:
+                    s += string.replace(self.__value, '%', '%%')
         else:
             field = "%s.%s" % (self.__table, self.__column)
             sql_expr = SQLExpression.SQLExpression()
-            s += sql_expr.build( field,
-                                 self.__value,
-                                 self.__comparison,
-                                 self.__ignoreCase,
-                                 self.getDb() )
+            if args == None:
+                s += sql_expr.build( field,
+                                     self.__value,
+                                     self.__comparison,
+                                     self.__ignoreCase,
+                                     self.getDb() )
+            else:
+                s += sql_expr.buildParam( field,
+                                          self.__value,
+                                          self.__comparison,
+                                          args,
+                                          self.__ignoreCase,
+                                          self.getDb() )
 
         for i in range(0, len(self.__clauses)):
             s += self.__conjunctions[i]
-            s += self.__clauses[i].__str__()
+            s += self.__clauses[i].buildSQL(args)
             s += ")"
 
         return s
@@ -1214,10 +1371,11 @@ class Criterion:
     def __finger_print__(self):
         """ A string can be used to uniquely represent this object.
         """
-        s = "%s:%s:%s:%s" % ( self.__table,
-                              self.__column,
-                              self.__comparison,
-                              self.__value )
+        s = "%s:%s:%s:%s:%s" % ( self.__table,
+                                 self.__column,
+                                 self.__comparison,
+                                 self.__value,
+                                 self.__ignoreCase )
         
         for i in range(0, len(self.__clauses)):
             s += ":%s" % (self.__conjunctions[i])
@@ -1225,6 +1383,41 @@ class Criterion:
 
         return s
 
+    def __shape__(self, args):
+        """ A string which represents the structure of this object without
+            the values. Criterion objects with the same shape have the same
+            SQL from buildSQL(args). The values are appended to args in the
+            order of buildSQL(args).
+
+            @param args A list which the bound values are appended to.
+            @return A String.
+        """
+        if not self.__column:
+            return ""
+
+        if self.__comparison == SQLConstants.CUSTOM:
+            s = `self.__value`
+        else:
+            sql_expr = SQLExpression.SQLExpression()
+            s = "%s:%s:%s:%s" % ( self.__table,
+                                  self.__column,
+                                  sql_expr.bindParam( self.__value,
+                                                      self.__comparison,
+                                                      args ),
+                                  self.__ignoreCase )
+            # an ignore case LIKE is built with a different function for a
+            # prefix match, and the ignore case of the Criteria may be set
+            # on this criterion only when the query is built
+            if self.__comparison in [ SQLConstants.LIKE,
+                                      SQLConstants.NOT_LIKE ]:
+                s += ":%s" % (sql_expr.isPrefixLike(self.__value))
+
+        for i in range(0, len(self.__clauses)):
+            s += ":%s" % (self.__conjunctions[i])
+            s += ":(%s)" % (self.__clauses[i].__shape__(args))
+
+        return s
+
     def getAllTables(self):
         """ get all tables from nested criterion objects
             
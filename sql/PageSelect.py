@@ -55,6 +55,13 @@ Criteria</code> (perhaps created from the results of a search parameter
 page), page size, memory page limit and the corresponding factory instance
 and pickle this in Session.
 
+<p>Deep pages are expensive with an offset, as the DBMS has to produce and
+discard all the earlier rows. In keyset (seek) mode, the ORDER BY and primary
+key values of the last row of each page are remembered, and a window starting
+after a remembered row is fetched with a predicate on those values instead,
+e.g. <code>(A.NAME &gt; 'x' OR (A.NAME = 'x' AND A.ID &gt; 5))</code>, which
+an index on the ORDER BY columns can serve. Refer to <code>setKeyset()</code>.
+
 <p>...to move through the records. <code>PageSelect</code> implements a
 number of convenience methods that make it easy to add all of the necessary
 bells and whistles to your template.
@@ -64,7 +71,12 @@ __version__='$Revision: 3212 $'[11:-2]
 __author__ = "Duan Guoqiang (mattgduan@gmail.com)"
 
 
+import string
+import logging
+
 import util.logger.Logger as Logger
+import util.UniqueList as UniqueList
+import proof.sql.SQLConstants as SQLConstants
 
 
 # Constants
@@ -72,6 +84,9 @@ import util.logger.Logger as Logger
 DEFAULT_MEMORY_LIMIT_PAGES = 5
 DEFAULT_PAGE_SIZE          = 10
 
+# the criteria key of the keyset predicate
+KEYSET_KEY = "PageSelect.keyset"
+
 class PageSelect:
 
     def __init__( self,
@@ -79,7 +94,8 @@ class PageSelect:
                   pagesize,
                   factory,
                   mem_limit_pages = DEFAULT_MEMORY_LIMIT_PAGES,
-                  logger = None ):
+                  logger = None,
+                  keyset = False ):
         """ Constructor.
 
             @param criteria A Criteria object.
@@ -88,12 +104,14 @@ class PageSelect:
             @param mem_limit_pages The maximum number of pages worth of rows to
             be held in memory at one time.
             @param logger A logger object.
+            @param keyset If true, use the keyset mode, refer to setKeyset.
         """
         self.init( criteria,
                    pagesize,
                    factory,
                    mem_limit_pages,
-                   logger )
+                   logger,
+                   keyset )
         pass
 
     def init( self,
@@ -101,7 +119,8 @@ class PageSelect:
               pagesize,
               factory,
               mem_limit_pages = DEFAULT_MEMORY_LIMIT_PAGES,
-              logger = None ):
+              logger = None,
+              keyset = False ):
         import proof.BaseFactory as BaseFactory
         assert issubclass(factory.__class__, BaseFactory.BaseFactory)
 
@@ -142,10 +161,25 @@ class PageSelect:
 
         # The last page of results that were returned.
         self.__last_results = []
+
+        # Whether the keyset mode is on.
+        self.__keyset = False
+        # The columns which decide the order of the rows in keyset mode.
+        # structure: [ ( table.column, descending ), ... ]
+        self.__keyset_columns = []
+        # The key values of the row before a record number.
+        # structure: { record number : ( value, ... ) }
+        self.__keyset_marks = {}
+        # The ORDER BY columns added to the criteria in keyset mode, which
+        # are removed when the mode is turned off.
+        self.__keyset_order_by = []
         
         self.__logger = Logger.makeLogger(logger)
         self.log      = self.__logger.write
 
+        if keyset:
+            self.setKeyset(keyset)
+
         self.__startQuery(self.__page_size)
         self.__getTotal()
 
@@ -265,21 +299,231 @@ class PageSelect:
         if not init_size or type(init_size)!=type(1) or init_size<1:
             init_size = self.__page_size
         
+        # In keyset mode, seek to the nearest remembered row before the
+        # block, and skip the rest with an offset.
+        offset = self.__block_begin
+        mark = None
+        if self.__keyset and offset > 0:
+            mark = self.__getKeysetMark(offset)
+        if mark:
+            position, values = mark
+            offset -= position
+            self.__criteria.addCriterion( self.__buildKeysetCriterion(values),
+                                          KEYSET_KEY )
+            self.log( "__startQuery(): seek to record %s, offset %s" % \
+                      (position, offset) )
+
         # Use the criteria to limit the rows that are retrieved to the
         # block of records that fit in the predefined memoryLimit.
-        self.__criteria.setOffset(self.__block_begin)
+        self.__criteria.setOffset(offset)
         # Add 1 to memory limit to check if the query ends on a page break.
         #self.__criteria.setLimit(self.__mem_limit + 1)
         self.__criteria.setLimit(self.__mem_limit)
 
         import proof.ObjectFactory as ObjectFactory
         import proof.AggregateFactory as AggregateFactory
-        if isinstance(self.__factory, ObjectFactory.ObjectFactory):
-            self.__results = self.__factory.doSelectObject(self.__criteria)
-        elif isinstance(self.__factory, AggregateFactory.AggregateFactory):
-            self.__results = self.__factory.doSelectAggregate(self.__criteria)
-        else:
-            self.__results = self.__factory.doSelect(self.__criteria)
+        try:
+            if isinstance(self.__factory, ObjectFactory.ObjectFactory):
+                self.__results = self.__factory.doSelectObject(self.__criteria)
+            elif isinstance(self.__factory, AggregateFactory.AggregateFactory):
+                self.__results = self.__factory.doSelectAggregate(self.__criteria)
+            else:
+                self.__results = self.__factory.doSelect(self.__criteria)
+        finally:
+            if mark:
+                del self.__criteria[KEYSET_KEY]
+
+        if self.__keyset and self.__results:
+            self.__markKeyset()
+
+    def isKeyset(self):
+        return self.__keyset
+
+    def setKeyset(self, keyset):
+        """ Turn the keyset (seek) mode on or off. In keyset mode, the values
+            of the ORDER BY columns and the primary key of the last row of
+            each page are remembered, and a block starting after a remembered
+            row is fetched with a predicate on those values instead of an
+            offset. The primary key columns of the table of the first ORDER
+            BY column are appended to the ORDER BY, so that the order is
+            unique. A block which starts after no remembered row, e.g. by
+            getPage() to a page never seen, seeks to the nearest remembered
+            row before it and skips the rest with an offset.
+
+            The mode needs an ORDER BY of 'table.column ASC|DESC' columns
+            which are NOT NULL, since the predicate never matches a NULL,
+            and the values have to be found in the results, i.e. objects,
+            aggregates or rows. Otherwise it stays off.
+
+            The primary key columns appended to the ORDER BY are removed
+            when the mode is turned off.
+
+            @param keyset True to turn the mode on.
+            @return True if the mode is on.
+        """
+        self.__keyset = False
+        self.__keyset_columns = []
+        self.__keyset_marks = {}
+
+        if self.__keyset_order_by:
+            order_by = UniqueList.UniqueList()
+            for order in self.__criteria.getOrderByColumns():
+                if order not in self.__keyset_order_by:
+                    order_by.append(order)
+            self.__criteria.setOrderByColumns(order_by)
+            self.__keyset_order_by = []
+
+        if keyset:
+            columns = self.__getKeysetColumns()
+            if columns:
+                self.__keyset = True
+                self.__keyset_columns = columns
+
+        return self.__keyset
+
+    def __getKeysetColumns(self):
+        """ Get the columns which decide the order of the rows, and append
+            the primary key to the ORDER BY of the criteria.
+
+            @return A list of ( table.column, descending ) pairs, or None if
+                    the ORDER BY can't be used by keyset mode.
+        """
+        columns = []
+        for order in self.__criteria.getOrderByColumns():
+            tokens = string.split(order)
+            if len(tokens) != 2 or \
+                   tokens[0].find('.') < 1 or tokens[0].find('(') != -1 or \
+                   string.upper(tokens[1]) not in [ SQLConstants.ASC, SQLConstants.DESC ]:
+                self.log( "PageSelect: keyset mode is off for the ORDER BY '%s'." % (order),
+                          logging.WARNING )
+                return None
+            columns.append( (tokens[0], string.upper(tokens[1]) == SQLConstants.DESC) )
+
+        if not columns:
+            self.log( "PageSelect: keyset mode is off without ORDER BY.", logging.WARNING )
+            return None
+
+        db_map = self.__factory.getProofInstance().getDatabaseMap(self.__db_name)
+
+        # the rows with NULL values would be skipped by the predicate
+        for column, descending in columns:
+            table_name, column_name = column.split('.', 1)
+            table_map  = db_map.getTable(table_name)
+            column_map = table_map and table_map.getColumn(column_name)
+            if not column_map or not column_map.isNotNull():
+                self.log( "PageSelect: keyset mode is off for the nullable column '%s'." % \
+                          (column), logging.WARNING )
+                return None
+
+        table_name = columns[0][0].split('.', 1)[0]
+        table_map  = db_map.getTable(table_name)
+        if not table_map or not table_map.getRowMapper().getPKColumns():
+            self.log( "PageSelect: keyset mode is off without the primary key of '%s'." % \
+                      (table_name), logging.WARNING )
+            return None
+
+        names = [ column for column, descending in columns ]
+        for pk_column in table_map.getRowMapper().getPKColumns():
+            if pk_column not in names:
+                self.__criteria.addAscendingOrderByColumn(pk_column)
+                self.__keyset_order_by.append( "%s %s" % (pk_column, SQLConstants.ASC) )
+                columns.append( (pk_column, False) )
+
+        return columns
+
+    def __getKeysetMark(self, position):
+        """ Get the nearest remembered row before a record number.
+
+            @param position The record number.
+            @return A tuple of ( record number after the row, key values ),
+                    or None.
+        """
+        marks = [ n for n in self.__keyset_marks.keys() if n <= position ]
+        if not marks:
+            return None
+        n = max(marks)
+        return ( n, self.__keyset_marks[n] )
+
+    def __markKeyset(self):
+        """ Remember the key values of the last row of each page in the
+            block, and of the last row of the block.
+        """
+        last = len(self.__results) - 1
+        for i in range(len(self.__results)):
+            n = self.__block_begin + i + 1
+            if n % self.__page_size and i != last:
+                continue
+            values = self.__getKeyValues(self.__results[i])
+            if values:
+                self.__keyset_marks[n] = values
+
+    def __getKeyValues(self, result):
+        """ Get the values of the keyset columns from a result.
+
+            @param result An object, an aggregate or a row.
+            @return A tuple of the values, or None if any of them isn't found
+                    or is NULL, which can't be compared.
+        """
+        # the root object of an aggregate
+        if hasattr(result, 'getRootObject'):
+            result = result.getRootObject()
+
+        # an object, its primary key and attributes
+        if hasattr(result, 'getAttributes'):
+            row = {}
+            pk = result.getPK()
+            import proof.pk.ComboKey as ComboKey
+            if isinstance(pk, ComboKey.ComboKey):
+                keys = pk.getKey()
+            else:
+                keys = [ pk ]
+            for key in keys:
+                row[key.getFullyQualifiedName()] = key.getKey()
+            table_name = result.getTableName()
+            for name, value in result.getAttributes().items():
+                row["%s.%s" % (table_name, name)] = value
+            result = row
+
+        # a row as a tuple of the select columns
+        elif type(result) in [ type(()), type([]) ]:
+            select = list(self.__criteria.getSelectColumns())
+            if len(select) != len(result):
+                return None
+            result = dict(zip(select, result))
+
+        values = []
+        for column, descending in self.__keyset_columns:
+            value = result.get(column, None)
+            if value == None:
+                value = result.get(column.split('.', 1)[1], None)
+            if value == None:
+                return None
+            values.append(value)
+
+        return tuple(values)
+
+    def __buildKeysetCriterion(self, values):
+        """ Build the predicate of the rows after the given key values, e.g.
+            (A.NAME > 'x' OR (A.NAME = 'x' AND A.ID > 5)). A DESC column is
+            compared with <.
+
+            @param values The key values of a row.
+            @return A Criterion.
+        """
+        criterion = None
+        for i in range(len(self.__keyset_columns)-1, -1, -1):
+            column, descending = self.__keyset_columns[i]
+            if descending:
+                comparison = SQLConstants.LESS_THAN
+            else:
+                comparison = SQLConstants.GREATER_THAN
+            c = self.__criteria.getNewCriterion(column, values[i], comparison=comparison)
+            if criterion:
+                equal = self.__criteria.getNewCriterion(column, values[i])
+                c.orCriterion(equal.andCriterion(criterion))
+            criterion = c
+
+        return criterion
 
     def __getTotal(self):
         """ Query the total number of records for this PageSelect.
@@ -403,6 +647,12 @@ class PageSelect:
         self.__total_records = 0
         self.__current_page_number = 0
         self.__last_results = []
+        # the remembered rows are out of date, and the ORDER BY may have
+        # been changed since
+        if self.__keyset:
+            self.setKeyset(False)
+            self.setKeyset(True)
+        self.__keyset_marks = {}
 
     def __str__(self):
         """ Provide something useful for debugging purposes.
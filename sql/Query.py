@@ -31,6 +31,10 @@ class Query:
         self.__limit           = ""
         self.__rowcount        = ""
 
+        # the values bound to the placeholders in the where clause,
+        # or None if the values are inlined.
+        self.__args            = None
+
     def getSelectModifiers(self):
         """ Retrieve the modifier buffer in order to add modifiers to this
             query.  E.g. DISTINCT and ALL.
@@ -162,11 +166,54 @@ class Query:
         """
         return self.__rowcount
     
+    def setArgs(self, args):
+        """ Set the values bound to the %s placeholders in the where
+            clause. When args is set, a '%' in the other clauses is doubled
+            in the query statement for the driver.
+
+            @param args A list of values, or None if the values are inlined.
+        """
+        self.__args = args
+
+    def getArgs(self):
+        """ Get the values bound to the %s placeholders.
+
+            @return A list of values, or None if the values are inlined.
+        """
+        return self.__args
+
+    def copy(self):
+        """ Return a copy of this query, whose clauses can be changed
+            without changing this query.
+
+            @return A Query object.
+        """
+        query = Query()
+        query.setSelectModifiers(self.__selectModifiers[:])
+        query.setSelectClause(self.__selectColumns[:])
+        query.setFromClause(self.__fromTables[:])
+        query.setWhereClause(self.__whereCriteria[:])
+        query.setOrderByClause(self.__orderByColumns[:])
+        query.setGroupByClause(self.__groupByColumns[:])
+        query.setHaving(self.__having)
+        query.setLimit(self.__limit)
+        query.setRowcount(self.__rowcount)
+        if self.__args != None:
+            query.setArgs(self.__args[:])
+        return query
+
     def __str__(self):
         """ Outputs the query statement.
             
             @return A String with the query statement.
         """
+        # the where clause is built with its placeholders already,
+        # the other clauses have to be escaped when args are bound.
+        if self.__args == None:
+            escape = str
+        else:
+            escape = lambda s: string.replace(str(s), '%', '%%')
+
         stmt = ""
         
         if self.__rowcount:
@@ -174,11 +221,11 @@ class Query:
                     str(self.__rowcount) + \
                     " "
         stmt += SQLConstants.SELECT + \
-                string.join(map(str, self.__selectModifiers), " ") + \
+                string.join(map(escape, self.__selectModifiers), " ") + \
                 " " + \
-                string.join(map(str, self.__selectColumns), ", ") + \
+                string.join(map(escape, self.__selectColumns), ", ") + \
                 SQLConstants.FROM + \
-                string.join(map(str, self.__fromTables), ", ")
+                string.join(map(escape, self.__fromTables), ", ")
 
         if self.__whereCriteria:
             stmt += SQLConstants.WHERE + \
@@ -186,19 +233,19 @@ class Query:
 
         if self.__groupByColumns:
             stmt += SQLConstants.GROUP_BY + \
-                    string.join(map(str, self.__groupByColumns), ", ")
+                    string.join(map(escape, self.__groupByColumns), ", ")
 
         if self.__having:
             stmt += SQLConstants.HAVING + \
-                    str(self.__having)
+                    escape(self.__having)
 
         if self.__orderByColumns:
             stmt += SQLConstants.ORDER_BY + \
-                    string.join(map(str, self.__orderByColumns), ", ")
+                    string.join(map(escape, self.__orderByColumns), ", ")
 
         if self.__limit:
             stmt += SQLConstants.LIMIT + \
-                    str(self.__limit)
+                    escape(self.__limit)
         
         if self.__rowcount:
             stmt += SQLConstants.ROWCOUNT + \
@@ -13,6 +13,7 @@ __version__='$Revision: 3194 $'[11:-2]
 __author__ = "Duan Guoqiang (mattgduan@gmail.com)"
 
 
+import re
 import string
 import datetime
 import types
@@ -22,6 +23,73 @@ import proof.sql.SQLConstants as SQLConstants
 import util.UniqueList as UniqueList
 
 
+# the escaped characters and the wildcards of a like string
+LIKE_PATTERN = re.compile(r'\\([%_*?\\])|([%_*?])')
+
+# the SQL LIKE forms of the escaped characters and the wildcards
+LIKE_ESCAPES   = { '%' : '\\%',
+                   '_' : '\\_',
+                   '*' : '*',
+                   '?' : '?',
+                   SQLConstants.BACKSLASH : SQLConstants.BACKSLASH * 2 }
+LIKE_WILDCARDS = { '%' : '%',
+                   '_' : '_',
+                   '*' : '%',
+                   '?' : '_' }
+
+# the number of like strings translated by translateLikeString remembered
+LIKE_CACHE_CAPACITY = 1000
+
+# structure: { like string : ( sql string, is like, is prefix ) }
+_like_cache = {}
+
+
+def translateLikeString(criteria):
+    """ Translate a like string to SQL. Multicharacter wildcards % and * may
+        be used as well as single character wildcards, _ and ?. These
+        characters can be escaped with \.
+
+        e.g. "fre*"  -> ( "fre%", True, True )
+             "f?e%"  -> ( "f_e%", True, False )
+             "50\%"  -> ( "50%", False, False )
+
+        @param criteria The like string.
+        @return A tuple of ( sql string, is like, is prefix ). If the string
+                has no wildcards, it isn't a like and the sql string is the
+                string unescaped for =. A prefix like only has a trailing %,
+                e.g. 'fre%', which an index on the column can serve.
+    """
+    if not isinstance(criteria, types.StringTypes):
+        criteria = str(criteria)
+
+    result = _like_cache.get(criteria, None)
+    if result != None:
+        return result
+
+    wildcards = []
+    def _like(m):
+        if m.group(1):
+            return LIKE_ESCAPES[m.group(1)]
+        wildcards.append(m.end())
+        return LIKE_WILDCARDS[m.group(2)]
+
+    like_str = LIKE_PATTERN.sub(_like, criteria)
+    if wildcards:
+        prefix = len(wildcards) == 1 and \
+                 wildcards[0] == len(criteria) > 1 and \
+                 like_str[-1] == '%'
+        result = ( like_str, True, prefix )
+    else:
+        result = ( LIKE_PATTERN.sub(lambda m: m.group(1), criteria), False, False )
+
+    # a full cache is simply dropped, which is safe without a lock
+    if len(_like_cache) >= LIKE_CACHE_CAPACITY:
+        _like_cache.clear()
+    _like_cache[criteria] = result
+
+    return result
+
+
 class SQLExpression:
 
     def __init__(self):
@@ -66,27 +134,20 @@ class SQLExpression:
             @return A simple SQL expression, e.g. UPPER(table_a.column_a)
                     LIKE UPPER('ab%c').
         """
-        if str(criteria) == "None":
-            criteria = None
-
-        # If the criteria is None, check to see comparison
-        # is an =, <>, or !=.  If so, replace the comparison
-        # with the proper IS or IS NOT.
-        if criteria == None:
-            if comparison == SQLConstants.EQUAL:
-                comparison = SQLConstants.ISNULL
-            elif comparison == SQLConstants.NOT_EQUAL:
-                comparison = SQLConstants.ISNOTNULL
-            elif comparison == SQLConstants.ALT_NOT_EQUAL:
-                comparison = SQLConstants.ISNOTNULL
+        criteria, comparison = self.__processNull(criteria, comparison)
 
         if comparison in [ SQLConstants.LIKE,
                            SQLConstants.NOT_LIKE ]:
-            columnValue = self.__safeSQLString( criteria,
-                                                ignoreCase,
+            like_str, comparison = self.__processLikeString( criteria,
+                                                             comparison )
+            columnValue = self.__safeSQLString( like_str,
+                                                False,
                                                 db )
-            columnValue, comparison = self.__processLikeString( columnValue,
-                                                                comparison )
+            if ignoreCase and db:
+                ignore = self.__ignoreCaseInLike(criteria, comparison, db)
+                return "%s%s%s" % ( ignore(columnName),
+                                    comparison,
+                                    ignore(columnValue) )
         elif comparison in [ SQLConstants.IN,
                              SQLConstants.NOT_IN ]:
             self.__processInString( criteria,
@@ -110,6 +171,80 @@ class SQLExpression:
                             comparison,
                             columnValue )
 
+    def buildParam( self,
+                    columnName,
+                    criteria,
+                    comparison,
+                    args,
+                    ignoreCase = False,
+                    db = None ):
+        """ Builds a simple SQL expression like build, but the value is
+            replaced by a %s placeholder and appended to args for the driver
+            to bind, so that expressions which only differ in their values
+            have the same SQL.
+
+            @param columnName A column.
+            @param criteria The value to compare the column against.
+            @param comparison One of =, &lt;, &gt;, ^lt;=, &gt;=, &lt;&gt;,
+                   !=, LIKE, etc.
+            @param args A list which the bound values are appended to.
+            @return A simple SQL expression, e.g. UPPER(table_a.column_a)
+                    LIKE UPPER(%s).
+        """
+        n = len(args)
+        like = comparison in [ SQLConstants.LIKE,
+                               SQLConstants.NOT_LIKE ]
+        comparison = self.__bindParam(criteria, comparison, args)
+
+        if comparison in [ SQLConstants.ISNULL,
+                           SQLConstants.ISNOTNULL ]:
+            return "%s%s" % (columnName, comparison)
+
+        if like and ignoreCase and db:
+            ignore = self.__ignoreCaseInLike(criteria, comparison, db)
+            return "%s%s%s" % ( ignore(columnName),
+                                comparison,
+                                ignore(self.__placeholder()) )
+
+        columnValue = self.__placeholder(ignoreCase, db)
+        if comparison in [ SQLConstants.IN,
+                           SQLConstants.NOT_IN ]:
+            columnValue = "(%s)" % (string.join([columnValue] * (len(args) - n), ","))
+
+        if ignoreCase and db:
+            columnName  = db.ignoreCase(columnName)
+
+        return "%s%s%s" % ( columnName,
+                            comparison,
+                            columnValue )
+
+    def bindParam( self,
+                   criteria,
+                   comparison,
+                   args ):
+        """ Appends the values of an expression to args like buildParam,
+            without building the SQL.
+
+            @param criteria The value to compare the column against.
+            @param comparison One of =, &lt;, &gt;, ^lt;=, &gt;=, &lt;&gt;,
+                   !=, LIKE, etc.
+            @param args A list which the bound values are appended to.
+            @return A String of the comparison and the number of values,
+                    which decide the SQL built by buildParam, e.g. ' IN 3'.
+        """
+        n = len(args)
+        comparison = self.__bindParam(criteria, comparison, args)
+        return "%s%d" % (comparison, len(args) - n)
+
+    def isPrefixLike(self, criteria):
+        """ Check whether a like string is a prefix match, e.g. "fre%" or
+            "fre*", which an index on the column can serve.
+
+            @param criteria The like string.
+            @return True if the only wildcard is a trailing %.
+        """
+        return translateLikeString(criteria)[2]
+
     def buildInsertList( self,
                          column_list,
                          criteria_list,
@@ -138,6 +273,36 @@ class SQLExpression:
 
         return (column_list, criteria_list)
 
+    def buildInsertParams( self,
+                           column_list,
+                           criteria_list,
+                           args,
+                           ignoreCase = False,
+                           db = None ):
+        """ Build the insert column list and a %s placeholder for each value.
+            The values are appended to args for the driver to bind.
+
+            @param column_list The column fullnames
+            @param criteria_list The insert values
+            @param args A list which the bound values are appended to.
+            @param ignoreCase If true and columns represent Strings, the appropriate
+                   function defined for the database will be used to ignore
+                   differences in case.
+            @param db Represents the database in use for vendor-specific functions
+            @return Two lists of built columns and placeholders.
+        """
+        assert len(column_list) == len(criteria_list)
+
+        if ignoreCase and db:
+            column_list = map(db.ignoreCase, column_list)
+
+        placeholders = []
+        for criteria in criteria_list:
+            args.append(self.__safeSQLParam(criteria))
+            placeholders.append(self.__placeholder(ignoreCase, db))
+
+        return (column_list, placeholders)
+
     def quoteAndEscapeText(self, rawText, db=None):
         """ Quotes and escapes raw text for placement in a SQL expression.
             For simplicity, the text is assumed to be neither quoted nor
@@ -162,13 +327,71 @@ class SQLExpression:
                             SQLConstants.SINGLE_QUOTE )
         
 
-    def __processLikeString( self,
-                             criteria,
-                             comparison ):
+    def __bindParam(self, criteria, comparison, args):
+        """ Append the values to bind to args.
+
+            @param criteria The value to compare the column against.
+            @param comparison The comparison.
+            @param args A list which the bound values are appended to.
+            @return The comparison used in the SQL, e.g. ' IS NULL ' for
+                    None, or '=' for a LIKE without wildcards.
+        """
+        criteria, comparison = self.__processNull(criteria, comparison)
+
+        if comparison in [ SQLConstants.LIKE,
+                           SQLConstants.NOT_LIKE ]:
+            like_str, comparison = self.__processLikeString( criteria,
+                                                             comparison )
+            args.append(like_str)
+        elif comparison in [ SQLConstants.IN,
+                             SQLConstants.NOT_IN ]:
+            assert (isinstance(criteria, types.ListType) or \
+                     isinstance(criteria, UniqueList.UniqueList ))
+            for value in criteria:
+                args.append(self.__safeSQLParam(value))
+        elif comparison not in [ SQLConstants.ISNULL,
+                                 SQLConstants.ISNOTNULL ]:
+            args.append(self.__safeSQLParam(criteria))
+
+        return comparison
+
+    def __ignoreCaseInLike(self, criteria, comparison, db):
+        """ Return the function of the database to ignore case in a LIKE,
+            which may keep a prefix LIKE index-friendly.
+
+            @param criteria The like string.
+            @param comparison The comparison returned by __processLikeString.
+            @param db Represents the database in use for vendor specific functions.
+        """
+        if comparison != " = " and self.isPrefixLike(criteria):
+            return db.ignoreCaseInPrefixLike
+        return db.ignoreCase
+
+    def __processNull(self, criteria, comparison):
+        """ If the criteria is None, check to see comparison is an =, <>,
+            or !=.  If so, replace the comparison with the proper IS or
+            IS NOT.
+
+            @param criteria The value to compare the column against.
+            @param comparison The comparison.
+            @return A list with the criteria and comparison.
+        """
+        if str(criteria) == "None":
+            criteria = None
+
+        if criteria == None:
+            if comparison == SQLConstants.EQUAL:
+                comparison = SQLConstants.ISNULL
+            elif comparison == SQLConstants.NOT_EQUAL:
+                comparison = SQLConstants.ISNOTNULL
+            elif comparison == SQLConstants.ALT_NOT_EQUAL:
+                comparison = SQLConstants.ISNOTNULL
+
+        return ( criteria, comparison )
+
+    def __processLikeString(self, criteria, comparison):
         """ Takes a criteria and builds an SQL phrase based on whether
-            wildcards are present. Multicharacter wildcards % and * may
-            be used as well as single character wildcards, _ and ?. These
-            characters can be escaped with \.
+            wildcards are present, refer to translateLikeString.
             
             e.g. = "fre%" -> LIKE 'fre%'
                           -> LIKE UPPER('fre%')
@@ -176,51 +399,14 @@ class SQLExpression:
             
             @param criteria The value to compare the column against.
             @param comparison Whether to do a LIKE or a NOT LIKE
-            @return A list with appropriate criteria and comparison.
+            @return A list with the unquoted criteria and comparison.
         """
         # If selection criteria contains wildcards use LIKE otherwise
-        # use = (equals).  Wildcards can be escaped by prepending
-        # them with \ (backslash).
-        equalsOrLike = " = "
-
-        like_str = ""
-        criteria = str(criteria)
-        position = 0
-        length = len(criteria)
-        while position < length:
-            c = criteria[position]
-            if c == SQLConstants.BACKSLASH:
-                # Determine whether to skip over next character.
-                if (position+1) < length and \
-                   criteria[position+1] in [ '%',
-                                             '_',
-                                             '*',
-                                             '?',
-                                             SQLConstants.BACKSLASH ]:
-                    position += 1
-                    c = criteria[position+1]
-            elif c in [ '%', '_' ]:
-                equalsOrLike = comparison
-            elif c == '*':
-                equalsOrLike = comparison
-                c = '%'
-            elif c == '?':
-                equalsOrLike = comparison
-                c = '_'
-
-            like_str += c
-            position += 1
-
-        # make sure like_str is quoted
-        if like_str:
-            if like_str[0]  != SQLConstants.SINGLE_QUOTE:
-                like_str = SQLConstants.SINGLE_QUOTE + like_str
-            if like_str[-1] != SQLConstants.SINGLE_QUOTE:
-                like_str = like_str + SQLConstants.SINGLE_QUOTE
-        else:
-            like_str = "''"
-        
-        return ( like_str, equalsOrLike )
+        # use = (equals).
+        like_str, like, prefix = translateLikeString(criteria)
+        if like:
+            return ( like_str, comparison )
+        return ( like_str, " = " )
 
     def __processInString(self, criteria, ignoreCase=False, db=None):
         """ Creates an appropriate string for an 'IN' clause from an
@@ -291,3 +477,32 @@ class SQLExpression:
             ret = db.ignoreCase(ret)
 
         return ret
+
+    def __safeSQLParam(self, criteria):
+        """ Check that a value can be bound as a parameter. The driver
+            quotes and escapes the value.
+
+            @param criteria The value to bind.
+            @return The value to bind.
+        """
+        if isinstance(criteria, types.BooleanType):
+            return int(criteria)
+        elif criteria == None or \
+             isinstance(criteria, types.StringTypes) or \
+             isinstance(criteria, types.IntType) or \
+             isinstance(criteria, types.LongType) or \
+             isinstance(criteria, types.FloatType) or \
+             isinstance(criteria, decimal.Decimal) or \
+             isinstance(criteria, datetime.date):
+            return criteria
+        else:
+            raise TypeError( "SQLExpression.buildParam: criteria type %s (%s) isn't supported." %
+                             (type(criteria), str(criteria)) )
+
+    def __placeholder(self, ignoreCase=False, db=None):
+        """ Return the placeholder of a bound value, in UPPER() as
+            appropriate.
+        """
+        if ignoreCase and db:
+            return db.ignoreCase("%s")
+        return "%s"
@@ -33,6 +33,7 @@ namespaces = {
                         'host' :  'localhost',
                         'database' :  'database1',
                         'password' :  '1234',
+                        'statement_cache_size' :  0,
                         }
                 },
     }
@@ -112,6 +113,9 @@ aggregates = {
                         'repositoryclass' :  'FooAggregateRepository',
                         'class' :  'FooAggregate',
                         'module' :  'ddl.myservice.schema1.FooAggregate',
+                        'capacity' :  0,
+                        'byte_budget' :  0,
+                        'lazy_load' :  0,
                         },
                 },
     }
@@ -0,0 +1,193 @@
+"""
+PyUnit TestCase for AggregateFactory.
+"""
+
+import datetime
+import unittest
+
+import proof.AggregateFactory as AggregateFactory
+import proof.adapter.MySQLAdapter as MySQLAdapter
+import proof.mapper.DatabaseMap as DatabaseMap
+
+
+class _Repository:
+
+    def __init__(self):
+        self.relation_map = {}
+
+    def getRelationMap(self):
+        return self.relation_map
+
+    def getRelationList(self, obj_name):
+        return self.relation_map.get(obj_name, None)
+
+    def removeMissed(self, pk):
+        pass
+
+    def get_thread_session_query_result(self, finger_print):
+        return None
+
+    def add_thread_session_query_result(self, finger_print, aggregates):
+        pass
+
+class _ProofInstance:
+
+    def __init__(self):
+        self.db_map = DatabaseMap.DatabaseMap('db')
+        self.db_map.addTable('Item')
+        table_map = self.db_map.getTable('Item')
+        table_map.addPrimaryKey('Id', type(1))
+        table_map.addColumn('Name', type(''))
+        table_map.addColumn('Updated', type(datetime.datetime.now()))
+        table_map.setTimestampColumn(table_map.getColumn('Updated'))
+
+        self.db_map.addTable('Tag')
+        table_map = self.db_map.getTable('Tag')
+        table_map.addPrimaryKey('Id', type(1))
+        table_map.addColumn('ItemId', type(1))
+
+        self.repository = _Repository()
+        self.adapter    = MySQLAdapter.MySQLAdapter()
+        self.lazy_load  = False
+
+    def getDBName(self, schema=None):
+        return 'db'
+
+    def getSchemaName(self, db_name):
+        return 'schema'
+
+    def getDefaultDB(self):
+        return 'db'
+
+    def getDatabaseMap(self, db_name):
+        return self.db_map
+
+    def getAdapter(self, db_name):
+        return self.adapter
+
+    def getInstanceForRepository(self, name, schema=None):
+        return self.repository
+
+    def getLazyLoadForAggregate(self, name, schema=None):
+        return self.lazy_load
+
+    def getQueryCache(self):
+        return None
+
+    def getQueryTemplate(self, key):
+        return None
+
+    def setQueryTemplate(self, key, query):
+        pass
+
+class _Factory(AggregateFactory.AggregateFactory):
+
+    def __init__(self, proof_instance):
+        AggregateFactory.AggregateFactory.__init__( self,
+                                                    proof_instance,
+                                                    schema_name = 'schema',
+                                                    root_name   = 'Item' )
+        self.queries = []
+
+    def doSelect(self, criteria, ret_dict=0):
+        self.queries.append(self.createQueryString(criteria))
+        return []
+
+    def doSelectSQL(self, sql, ret_dict=0, useTransaction=False, args=[]):
+        self.queries.append(sql)
+        return []
+
+    def doInsertList(self, rows, chunk_size=0):
+        return range(1, len(rows) + 1)
+
+
+class testAggregateFactory(unittest.TestCase):
+
+    def setUp(self):
+        self.proof   = _ProofInstance()
+        self.factory = _Factory(self.proof)
+
+    def tearDown(self):
+        del self.factory
+        del self.proof
+
+    def newCriteria(self):
+        import proof.sql.Criteria as Criteria
+        criteria = Criteria.Criteria(self.proof, db_name='db')
+        criteria.add('Item.Name', 'a')
+        return criteria
+
+    def selectClause(self, sql):
+        return sql[:sql.find(" FROM ")]
+
+    def test_versionProbeSelectsPKAndTimestamp(self):
+        self.factory.setVersionProbe(True)
+        self.factory.doSelectAggregate(self.newCriteria())
+
+        select = self.selectClause(self.factory.queries[0])
+        self.assert_(select.find("Item.Id") != -1)
+        self.assert_(select.find("Item.Updated") != -1)
+        self.assertEqual(select.find("Item.Name"), -1)
+
+    def test_versionProbeAfterFullSelect(self):
+        # the AS columns of a full select are left in a reused criteria
+        criteria = self.newCriteria()
+        self.factory.doSelectAggregate(criteria)
+        self.assert_(self.selectClause(self.factory.queries[0]).find("Item.Name") != -1)
+
+        self.factory.setVersionProbe(True)
+        self.factory.doSelectAggregate(criteria)
+        self.assertEqual(self.selectClause(self.factory.queries[1]).find("Item.Name"), -1)
+
+    def test_lazyLoadFromResource(self):
+        self.assert_(not self.factory.isLazyLoad())
+        self.proof.lazy_load = True
+        self.assert_(_Factory(self.proof).isLazyLoad())
+
+    def test_joinFetchDirectRelation(self):
+        self.proof.repository.relation_map = { 'Tag' : [ [ 'Item.Id' ], [ 'Tag.ItemId' ] ] }
+        factory = _Factory(self.proof)
+        factory.doSelectAggregate(self.newCriteria(), join_fetch=True)
+        self.assert_(factory.queries[0].find("LEFT JOIN Tag") != -1)
+
+    def test_joinFetchIntermediateRelation(self):
+        # Item and Tag are related through ItemTag, which isn't joined
+        self.proof.repository.relation_map = \
+            { 'Tag' : [ [ 'Item.Id', 'ItemTag.TagId' ], [ 'ItemTag.ItemId', 'Tag.Id' ] ] }
+        factory = _Factory(self.proof)
+        factory.doSelectAggregate(self.newCriteria(), join_fetch=True)
+        self.assertEqual(factory.queries[0].find("LEFT JOIN"), -1)
+
+    def test_createListSelectsInsertedRows(self):
+        data_list = [ { 'Item.Name' : 'a' }, { 'Item.Name' : 'b' } ]
+        aggregates = self.factory._createList(data_list, construct_aggregates=True)
+
+        # the roots are built from the rows in the database, not data_list
+        self.assertEqual(len(self.factory.queries), 1)
+        sql = self.factory.queries[0]
+        self.assert_(self.selectClause(sql).find("Item.Updated") != -1)
+        self.assert_(sql.find("Item.Id IN ") != -1)
+        # the rows aren't found here
+        self.assertEqual(aggregates, [ None, None ])
+
+    def test_whereOnSameColumnAndComparison(self):
+        import proof.sql.Criteria as Criteria
+        import proof.sql.SQLConstants as SQLConstants
+        criteria = Criteria.Criteria(self.proof, db_name='db')
+        for key, value in [ ('first', 'a%'), ('second', 'b%') ]:
+            criterion = criteria.getNewCriterion('Item.Name', value, comparison=SQLConstants.LIKE)
+            criteria.addCriterion(criterion, key)
+
+        args = []
+        sql = str(self.factory.createQuery(criteria, args))
+        # each bound value has its placeholder
+        self.assertEqual(sql.count("%s"), 2)
+        self.assertEqual(len(args), 2)
+
+    def test_versionProbeKeepsAsColumns(self):
+        criteria = self.newCriteria()
+        criteria.addAsColumn('Total', 'COUNT(Item.Id)')
+
+        self.factory.setVersionProbe(True)
+        self.factory.doSelectAggregate(criteria)
+        self.assertEqual(criteria.getAsColumns(), { 'Total' : 'COUNT(Item.Id)' })
@@ -0,0 +1,64 @@
+"""
+PyUnit TestCase for Criteria.
+"""
+
+import unittest
+
+import proof.adapter.MySQLAdapter as MySQLAdapter
+import proof.sql.Criteria as Criteria
+import proof.sql.SQLConstants as SQLConstants
+
+
+class _ProofInstance:
+
+    def getDBName(self, schema=None):
+        return 'db'
+
+    def getSchemaName(self, db_name):
+        return 'schema'
+
+
+class testCriteria(unittest.TestCase):
+
+    def setUp(self):
+        self.proof = _ProofInstance()
+
+    def tearDown(self):
+        del self.proof
+
+    def newCriteria(self, like_str):
+        criteria = Criteria.Criteria(self.proof, db_name='db')
+        criteria.add('Item.Name', like_str, comparison=SQLConstants.LIKE)
+        criteria.setIgnoreCase(True)
+        return criteria
+
+    def test_shapeOfLike(self):
+        # a prefix LIKE ignores case with a different function
+        prefix = self.newCriteria('fre%').__shape__([])
+        self.assertEqual(prefix, self.newCriteria('bar*').__shape__([]))
+        self.assertNotEqual(prefix, self.newCriteria('f%e%').__shape__([]))
+
+    def test_prefixLikeIgnoreCaseInMySQL(self):
+        # the column is left as it is for the index
+        criterion = self.newCriteria('fre*').getCriterion('Item.Name')
+        criterion.setIgnoreCase(True)
+        criterion.setAdapter(MySQLAdapter.MySQLAdapter())
+        self.assertEqual(criterion.buildSQL(), "Item.Name LIKE 'fre%'")
+        args = []
+        self.assertEqual(criterion.buildSQL(args), "Item.Name LIKE %s")
+        self.assertEqual(args, [ 'fre%' ])
+
+    def test_fingerPrintChanged(self):
+        criteria = self.newCriteria('fre%')
+        finger_print = criteria.__finger_print__()
+
+        criteria.getCriterion('Item.Name').setIgnoreCase(True)
+        self.assertNotEqual(criteria.__finger_print__(), finger_print)
+
+        finger_print = criteria.__finger_print__()
+        criteria.pop('Item.Name')
+        self.assertNotEqual(criteria.__finger_print__(), finger_print)
+
+        finger_print = criteria.__finger_print__()
+        criteria.update(self.newCriteria('bar%'))
+        self.assertNotEqual(criteria.__finger_print__(), finger_print)
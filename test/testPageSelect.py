@@ -0,0 +1,93 @@
+"""
+PyUnit TestCase for PageSelect.
+"""
+
+import unittest
+
+import proof.BaseFactory as BaseFactory
+import proof.adapter.MySQLAdapter as MySQLAdapter
+import proof.mapper.DatabaseMap as DatabaseMap
+import proof.sql.Criteria as Criteria
+import proof.sql.PageSelect as PageSelect
+
+
+class _ProofInstance:
+
+    def __init__(self):
+        self.db_map = DatabaseMap.DatabaseMap('db')
+        self.db_map.addTable('Item')
+        table_map = self.db_map.getTable('Item')
+        table_map.addPrimaryKey('Id', type(1))
+        table_map.addColumn('Name', type(''))
+        table_map.addColumn('Code', type(''))
+        table_map.getColumn('Code').setNotNull(True)
+
+        self.adapter = MySQLAdapter.MySQLAdapter()
+
+    def getDBName(self, schema=None):
+        return 'db'
+
+    def getSchemaName(self, db_name):
+        return 'schema'
+
+    def getDatabaseMap(self, db_name):
+        return self.db_map
+
+    def getAdapter(self, db_name):
+        return self.adapter
+
+class _Factory(BaseFactory.BaseFactory):
+
+    def __init__(self, proof_instance):
+        BaseFactory.BaseFactory.__init__( self,
+                                          proof_instance,
+                                          schema_name = 'schema' )
+
+    def doSelect(self, criteria, ret_dict=0):
+        return []
+
+    def doTotalSelect(self, criteria):
+        return 0
+
+
+class testPageSelect(unittest.TestCase):
+
+    def setUp(self):
+        self.proof   = _ProofInstance()
+        self.factory = _Factory(self.proof)
+
+    def tearDown(self):
+        del self.factory
+        del self.proof
+
+    def newCriteria(self, order):
+        criteria = Criteria.Criteria(self.proof, db_name='db')
+        criteria.addDescendingOrderByColumn(order)
+        return criteria
+
+    def test_keysetNotNullColumn(self):
+        page_select = PageSelect.PageSelect( self.newCriteria('Item.Code'),
+                                             10,
+                                             self.factory,
+                                             keyset = True )
+        self.assert_(page_select.isKeyset())
+
+    def test_keysetNullableColumn(self):
+        # the rows with NULL names would never match the seek predicate
+        page_select = PageSelect.PageSelect( self.newCriteria('Item.Name'),
+                                             10,
+                                             self.factory,
+                                             keyset = True )
+        self.assert_(not page_select.isKeyset())
+
+    def test_keysetOffRestoresOrderBy(self):
+        criteria = self.newCriteria('Item.Code')
+        page_select = PageSelect.PageSelect(criteria, 10, self.factory, keyset = True)
+        # the pk is appended for a unique order
+        self.assertEqual(list(criteria.getOrderByColumns()), [ 'Item.Code DESC', 'Item.Id ASC' ])
+
+        page_select.reset()
+        self.assertEqual(list(criteria.getOrderByColumns()), [ 'Item.Code DESC', 'Item.Id ASC' ])
+
+        page_select.setKeyset(False)
+        self.assertEqual(list(criteria.getOrderByColumns()), [ 'Item.Code DESC' ])
@@ -0,0 +1,236 @@
+"""
+PyUnit TestCase for Repository.
+"""
+
+import time
+import unittest
+
+import proof.ProofConstants as ProofConstants
+import proof.Repository as Repository
+import proof.pk.ObjectKey as ObjectKey
+
+
+class _Cache:
+
+    def __init__(self):
+        self.data   = {}
+        self.gets   = 0
+        self.multis = 0
+
+    def get(self, key):
+        self.gets += 1
+        return self.data.get(key, None)
+
+    def getMulti(self, keys):
+        self.multis += 1
+        values = {}
+        for key in keys:
+            if self.data.has_key(key):
+                values[key] = self.data[key]
+        return values
+
+    def set(self, key, value, ttl=0):
+        self.data[key] = value
+
+    def delete(self, key):
+        if self.data.has_key(key):
+            del self.data[key]
+
+class _Root:
+
+    def __init__(self):
+        self.initialized = True
+
+    def isInitialized(self):
+        return self.initialized
+
+class _Aggregate:
+
+    def __init__(self, pk):
+        self.pk    = pk
+        self.root  = _Root()
+        self.fail  = False
+        self.state = ProofConstants.AGGR_LOADED
+        self.size  = 100
+        self.time  = time.time()
+
+    def getPK(self):
+        return self.pk
+
+    def getRoot(self):
+        return self.root
+
+    def getId(self):
+        return self.pk.getValue()
+
+    def getState(self):
+        return self.state
+
+    def getSize(self):
+        return self.size
+
+    def touch(self):
+        self.time = time.time()
+
+    def _access_time(self):
+        return self.time
+
+    def setProofInstance(self, inst):
+        pass
+
+    def unload(self):
+        if self.fail:
+            raise Exception("unload failed")
+        self.state = ProofConstants.AGGR_UNLOADED
+
+class _ProofInstance:
+
+    def __init__(self):
+        self.cache = None
+        self.age   = 60
+
+    def getDBName(self, schema=None):
+        return 'db'
+
+    def getSchemaName(self, db_name):
+        return 'schema'
+
+    def getCapacityForRepository(self, name, schema=None):
+        return 0
+
+    def getByteBudgetForRepository(self, name, schema=None):
+        return 0
+
+    def getL2Cache(self):
+        return self.cache
+
+    def getAggrNewAge(self):
+        return self.age
+
+    def getAggrLoadedAge(self):
+        return self.age
+
+    def getAggrDirtyAge(self):
+        return self.age
+
+class _Repository(Repository.Repository):
+
+    def __init__(self, proof_instance):
+        Repository.Repository.__init__( self,
+                                        proof_instance,
+                                        db_schema = 'schema',
+                                        aggr_name = 'Item' )
+        self.criterias = []
+
+    def getByCriteria(self, criteria):
+        self.criterias.append(criteria)
+        return []
+
+
+class testRepository(unittest.TestCase):
+
+    def setUp(self):
+        self.proof      = _ProofInstance()
+        self.repository = _Repository(self.proof)
+
+    def tearDown(self):
+        del self.repository
+        del self.proof
+
+    def test_findByPKsFromL2Cache(self):
+        self.proof.cache = _Cache()
+        pks = [ ObjectKey.ObjectKey(i, 'Item.Id') for i in range(3) ]
+        # shared by another process
+        other = _Repository(self.proof)
+        for pk in pks:
+            other.add(_Aggregate(pk))
+
+        aggregates = self.repository.findByPKs(pks)
+        self.assertEqual(len(aggregates), 3)
+        for aggregate, pk in zip(aggregates, pks):
+            self.assertEqual(str(aggregate.getPK()), str(pk))
+        self.assertEqual(self.repository.criterias, [])
+        # one request for all of them
+        self.assertEqual(self.proof.cache.multis, 1)
+        self.assertEqual(self.proof.cache.gets, 0)
+
+    def test_resizeAfterObjectsLoaded(self):
+        aggregate = _Aggregate(ObjectKey.ObjectKey(1, 'Item.Id'))
+        self.repository.add(aggregate)
+        self.assertEqual(self.repository.getSize(), 100)
+
+        # the related objects are loaded after the aggregate is added
+        aggregate.size = 500
+        self.repository.resize(aggregate)
+        self.assertEqual(self.repository.getSize(), 500)
+        self.assertEqual(self.repository.getMemoryStats()['bytes'], 500)
+
+    def test_resizeOnlyCachedAggregate(self):
+        first  = _Aggregate(ObjectKey.ObjectKey(1, 'Item.Id'))
+        second = _Aggregate(ObjectKey.ObjectKey(1, 'Item.Id'))
+        second.size = 500
+        self.repository.add(first)
+        # an aggregate with the same pk which isn't cached is not counted
+        self.repository.resize(second)
+        self.assertEqual(self.repository.getSize(), 100)
+
+    def test_findByPKMissedComboKey(self):
+        import proof.pk.ComboKey as ComboKey
+        pk = ComboKey.ComboKey( [ ObjectKey.ObjectKey(1, 'Item.Id'),
+                                  ObjectKey.ObjectKey(2, 'Item.Version') ] )
+        self.assertEqual(self.repository.findByPK(pk), None)
+        self.assertEqual(len(self.repository.criterias), 1)
+
+        # the combo key is missed, not its last column
+        self.assert_(self.repository.isMissed(pk))
+        self.assert_(not self.repository.isMissed(ObjectKey.ObjectKey(2, 'Item.Version')))
+
+        # a missed key isn't selected again
+        self.assertEqual(self.repository.findByPK(pk), None)
+        self.assertEqual(len(self.repository.criterias), 1)
+
+    def test_getUnloadedRoots(self):
+        aggregates = [ _Aggregate(ObjectKey.ObjectKey(i, 'Item.Id')) for i in range(5) ]
+        for aggregate in aggregates:
+            self.repository.add(aggregate)
+        self.assertEqual(self.repository.getUnloadedRoots(10), [])
+
+        # unloaded by gc
+        for aggregate in aggregates[:3]:
+            aggregate.root.initialized = False
+            self.repository.addUnloaded(aggregate)
+        # loaded again since
+        aggregates[2].root.initialized = True
+        # removed since
+        self.repository.remove(aggregates[1])
+
+        self.assertEqual(self.repository.getUnloadedRoots(10), [ aggregates[0].root ])
+        # the ids are taken
+        self.assertEqual(self.repository.getUnloadedRoots(10), [])
+
+    def test_getUnloadedRootsLimit(self):
+        for i in range(5):
+            aggregate = _Aggregate(ObjectKey.ObjectKey(i, 'Item.Id'))
+            aggregate.root.initialized = False
+            self.repository.add(aggregate)
+
+        self.assertEqual(len(self.repository.getUnloadedRoots(3)), 3)
+        self.assertEqual(len(self.repository.getUnloadedRoots(3)), 2)
+
+    def test_gcContainerAfterFailure(self):
+        aggregates = [ _Aggregate(ObjectKey.ObjectKey(i, 'Item.Id')) for i in range(3) ]
+        aggregates[0].fail = True
+        # all the deadlines have passed
+        self.proof.age = -1000
+        for aggregate in aggregates:
+            self.repository.add(aggregate)
+            aggregate.time -= 1000
+
+        self.repository.gc_container(-1000, -1000, -1000)
+        for aggregate in aggregates[1:]:
+            self.assertEqual(aggregate.state, ProofConstants.AGGR_UNLOADED)
+
+        # the failed one is checked again
+        aggregates[0].fail = False
+        self.repository.gc_container(-1000, -1000, -1000)
+        self.assertEqual(aggregates[0].state, ProofConstants.AGGR_UNLOADED)
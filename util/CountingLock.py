@@ -0,0 +1,88 @@
+"""
+A thread lock which counts how often it is acquired, how often a thread has
+to wait for it, and how long the threads wait in total. It can be used in
+place of a thread.allocate_lock() object to find contended locks.
+"""
+
+__version__= '$Revision: 3194 $'[11:-2]
+__author__ = "Duan Guoqiang (mattgduan@gmail.com)"
+
+
+import time
+import thread
+
+
+class CountingLock:
+
+    def __init__(self):
+        self.__lock = thread.allocate_lock()
+
+        # statistics, only changed when the lock is held
+        self.__acquisitions = 0
+        self.__contentions  = 0
+        self.__wait_time    = 0.0
+
+    def acquire(self, waitflag=1):
+        """ Acquire the lock. A contention is counted if the lock is held by
+            another thread.
+
+            @param waitflag If false, return immediately when the lock can't be
+                   acquired.
+            @return True if the lock is acquired.
+        """
+        if self.__lock.acquire(0):
+            self.__acquisitions += 1
+            return True
+
+        if not waitflag:
+            return False
+
+        start = time.time()
+        self.__lock.acquire()
+        self.__acquisitions += 1
+        self.__contentions  += 1
+        self.__wait_time    += time.time() - start
+        return True
+
+    def release(self):
+        self.__lock.release()
+
+    def locked(self):
+        return self.__lock.locked()
+
+    def getStats(self):
+        """ Return the statistics.
+
+            @return A tuple of ( acquisitions, contentions, wait time in seconds ).
+        """
+        return (self.__acquisitions, self.__contentions, self.__wait_time)
+
+    def resetStats(self):
+        self.acquire()
+        try:
+            self.__acquisitions = 0
+            self.__contentions  = 0
+            self.__wait_time    = 0.0
+        finally:
+            self.release()
+
+
+# only used for test
+if __name__ == '__main__':
+
+    print
+    print "CountingLock Test"
+    print
+
+    lock = CountingLock()
+    lock.acquire()
+    print "lock.locked() => %s" % (lock.locked())
+    print "lock.acquire(0) => %s" % (lock.acquire(0))
+    lock.release()
+    print "lock.getStats() => %s" % (`lock.getStats()`)
+    lock.resetStats()
+    print "lock.resetStats(), lock.getStats() => %s" % (`lock.getStats()`)
+    print
+
+    print "done."
+    print
@@ -0,0 +1,183 @@
+"""
+Dictionary that keeps its keys in least-recently-used order. Reading or
+writing a key makes it the most recently used one. The order is kept in a
+doubly linked list, so that all operations, including finding the least
+recently used entry, are O(1).
+"""
+
+__version__= '$Revision: 3194 $'[11:-2]
+__author__ = "Duan Guoqiang (mattgduan@gmail.com)"
+
+
+# link fields
+PREV  = 0
+NEXT  = 1
+KEY   = 2
+VALUE = 3
+
+
+class LRUDict:
+
+    def __init__(self, capacity=0):
+        """ Constructor.
+
+            @param capacity The maximum number of entries. It is only used by
+                   isOverflow to tell the caller when to evict, and 0 means
+                   unlimited.
+        """
+        self.__capacity = capacity
+
+        # key => link [ prev, next, key, value ]
+        self.__map = {}
+
+        # the root link of the circular list. root[NEXT] is the least
+        # recently used link and root[PREV] is the most recently used one.
+        self.__root = []
+        self.__root[:] = [ self.__root, self.__root, None, None ]
+
+    def getCapacity(self):
+        return self.__capacity
+
+    def setCapacity(self, capacity):
+        self.__capacity = capacity
+
+    def isOverflow(self):
+        """ Check whether there are more entries than the capacity.
+        """
+        return self.__capacity > 0 and len(self.__map) > self.__capacity
+
+    def __len__(self):
+        return len(self.__map)
+
+    def has_key(self, key):
+        return self.__map.has_key(key)
+
+    __contains__ = has_key
+
+    def __getitem__(self, key):
+        link = self.__map[key]
+        self.__moveToEnd(link)
+        return link[VALUE]
+
+    def get(self, key, default=None):
+        """ Like a dict. The key becomes the most recently used one.
+        """
+        link = self.__map.get(key, None)
+        if link == None:
+            return default
+        self.__moveToEnd(link)
+        return link[VALUE]
+
+    def peek(self, key, default=None):
+        """ Like get, but the order is not changed.
+        """
+        link = self.__map.get(key, None)
+        if link == None:
+            return default
+        return link[VALUE]
+
+    def __setitem__(self, key, value):
+        link = self.__map.get(key, None)
+        if link == None:
+            root = self.__root
+            last = root[PREV]
+            link = [ last, root, key, value ]
+            last[NEXT] = root[PREV] = self.__map[key] = link
+        else:
+            link[VALUE] = value
+            self.__moveToEnd(link)
+
+    def __delitem__(self, key):
+        link = self.__map.pop(key)
+        link_prev, link_next = link[PREV], link[NEXT]
+        link_prev[NEXT] = link_next
+        link_next[PREV] = link_prev
+        link[:] = []
+
+    def oldest(self):
+        """ Return the least recently used ( key, value ) or None if empty.
+        """
+        link = self.__root[NEXT]
+        if link is self.__root:
+            return None
+        return (link[KEY], link[VALUE])
+
+    def popOldest(self):
+        """ Remove and return the least recently used ( key, value ) or None
+            if empty.
+        """
+        item = self.oldest()
+        if item:
+            del self[item[0]]
+        return item
+
+    def keys(self):
+        """ Return the keys from the least to the most recently used.
+        """
+        return [ link[KEY] for link in self.__links() ]
+
+    def values(self):
+        return [ link[VALUE] for link in self.__links() ]
+
+    def items(self):
+        return [ (link[KEY], link[VALUE]) for link in self.__links() ]
+
+    def clear(self):
+        for link in self.__links():
+            link[:] = []
+        self.__map.clear()
+        root = self.__root
+        root[:] = [ root, root, None, None ]
+
+    def __links(self):
+        links = []
+        root = self.__root
+        link = root[NEXT]
+        while link is not root:
+            links.append(link)
+            link = link[NEXT]
+        return links
+
+    def __moveToEnd(self, link):
+        root = self.__root
+        if root[PREV] is link:
+            return
+        link_prev, link_next = link[PREV], link[NEXT]
+        link_prev[NEXT] = link_next
+        link_next[PREV] = link_prev
+        last = root[PREV]
+        link[PREV] = last
+        link[NEXT] = root
+        last[NEXT] = root[PREV] = link
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, self.items())
+
+
+# only used for test
+if __name__ == '__main__':
+
+    print
+    print "LRUDict Test"
+    print
+
+    d = LRUDict(3)
+    d['a'] = 1
+    d['b'] = 2
+    d['c'] = 3
+    print "d => %s" % (d)
+    print "d.get('a') => %s" % (d.get('a'))
+    print "d => %s" % (d)
+    d['d'] = 4
+    print "d['d'] = 4, d.isOverflow() => %s" % (d.isOverflow())
+    print "d.popOldest() => %s" % (`d.popOldest()`)
+    print "d => %s" % (d)
+    del d['c']
+    print "del d['c'] => %s" % (d)
+    print "d.peek('a') => %s, d => %s" % (d.peek('a'), d)
+    d.clear()
+    print "d.clear() => %s, len => %s" % (d, len(d))
+    print
+
+    print "done."
+    print
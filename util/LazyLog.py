@@ -0,0 +1,99 @@
+"""
+Level-checked logging for hot paths. A LazyLog is called like the write
+method of a logger, but with the format arguments passed separately, and
+the message is only formatted and written if its level is enabled:
+
+    self.debug = LazyLog.LazyLog(logger)
+    self.debug( "SQL: %s", sql )
+
+A level is enabled if the logger says so by isEnabledFor, like a
+logging.Logger, or otherwise if it isn't below the level set by setLevel,
+which is logging.INFO by default.
+"""
+
+__version__= '$Revision: 3194 $'[11:-2]
+__author__ = "Duan Guoqiang (mattgduan@gmail.com)"
+
+
+import logging
+
+
+# the lowest level written for the loggers without isEnabledFor
+_level = logging.INFO
+
+
+def setLevel(level):
+    """ Set the lowest level written for the loggers without isEnabledFor.
+
+        @param level A logging level, e.g. logging.DEBUG.
+    """
+    global _level
+    _level = level
+
+def getLevel():
+    return _level
+
+
+class LazyLog:
+
+    def __init__(self, logger, level=logging.DEBUG):
+        """ Constructor.
+
+            @param logger A logger object with a write(msg, level) method.
+            @param level The level of the messages.
+        """
+        self.__write   = logger.write
+        self.__level   = level
+        self.__enabled = getattr(logger, 'isEnabledFor', None)
+
+    def isEnabled(self):
+        """ Check whether the messages are written.
+        """
+        if self.__enabled != None:
+            return self.__enabled(self.__level)
+        return self.__level >= _level
+
+    def __call__(self, msg, *args):
+        """ Format and write a message if the level is enabled.
+
+            @param msg A message, or a format string if args are given.
+            @param args The format arguments.
+        """
+        if self.__enabled != None:
+            if not self.__enabled(self.__level):
+                return
+        elif self.__level < _level:
+            return
+
+        if args:
+            msg = msg % args
+        self.__write(msg, self.__level)
+
+
+# only used for test
+if __name__ == '__main__':
+
+    print
+    print "LazyLog Test"
+    print
+
+    class _Logger:
+        def write(self, msg, level=None):
+            print "    write(%s, %s)" % (`msg`, level)
+
+    class _Value:
+        def __str__(self):
+            print "    formatted"
+            return "value"
+
+    debug = LazyLog(_Logger())
+    print "debug.isEnabled() => %s" % (debug.isEnabled())
+    print "debug('value: %s', _Value()) =>"
+    debug('value: %s', _Value())
+    setLevel(logging.DEBUG)
+    print "setLevel(logging.DEBUG), debug('value: %s', _Value()) =>"
+    debug('value: %s', _Value())
+    print
+
+    print "done."
+    print
@@ -0,0 +1,161 @@
+"""
+Timer wheel which keeps keys in buckets by their deadlines. A bucket covers
+'resolution' seconds, and the buckets are kept in a heap, so that scheduling,
+rescheduling or cancelling a key is O(1) (plus O(log n) for a new bucket), and
+finding the expired keys only visits the buckets whose deadlines have passed.
+
+A key expires at the end of its bucket, which is at most 'resolution' seconds
+later than its deadline.
+"""
+
+__version__= '$Revision: 3194 $'[11:-2]
+__author__ = "Duan Guoqiang (mattgduan@gmail.com)"
+
+
+import time
+import heapq
+import thread
+
+
+class TimerWheel:
+
+    def __init__(self, resolution=1):
+        """ Constructor.
+
+            @param resolution The seconds covered by a bucket.
+        """
+        self.__resolution = resolution
+
+        # structure: { bucket : { key : 1 } }
+        self.__buckets = {}
+
+        # heap of the bucket numbers in self.__buckets
+        self.__heap = []
+
+        # structure: { key : bucket }
+        self.__keys = {}
+
+        self.__lock = thread.allocate_lock()
+
+    def getResolution(self):
+        return self.__resolution
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def has_key(self, key):
+        return self.__keys.has_key(key)
+
+    __contains__ = has_key
+
+    def schedule(self, key, deadline):
+        """ Schedule a key to expire at the deadline. A key scheduled before
+            is moved to the new deadline.
+
+            @param key A hashable object.
+            @param deadline The time in seconds since the epoch.
+        """
+        bucket = int(deadline // self.__resolution)
+
+        self.__lock.acquire()
+        try:
+            old = self.__keys.get(key, None)
+            if old == bucket:
+                return
+            if old != None:
+                self.__discard(key, old)
+
+            self.__keys[key] = bucket
+            keys = self.__buckets.get(bucket, None)
+            if keys == None:
+                keys = self.__buckets[bucket] = {}
+                heapq.heappush(self.__heap, bucket)
+            keys[key] = 1
+        finally:
+            self.__lock.release()
+
+    def cancel(self, key):
+        """ Remove a key if it is scheduled.
+
+            @param key A hashable object.
+        """
+        self.__lock.acquire()
+        try:
+            bucket = self.__keys.get(key, None)
+            if bucket != None:
+                self.__discard(key, bucket)
+                del self.__keys[key]
+        finally:
+            self.__lock.release()
+
+    def popExpired(self, now=None):
+        """ Remove and return the keys of all the buckets ended before now.
+
+            @param now The time in seconds since the epoch. The current time
+                   is used by default.
+            @return A list of keys in the order of their buckets.
+        """
+        if now == None:
+            now = time.time()
+        # the last bucket which has ended completely
+        last = int(now // self.__resolution) - 1
+
+        expired = []
+        self.__lock.acquire()
+        try:
+            heap = self.__heap
+            while heap and heap[0] <= last:
+                bucket = heapq.heappop(heap)
+                keys = self.__buckets.pop(bucket, None)
+                if keys:
+                    for key in keys.keys():
+                        del self.__keys[key]
+                    expired.extend(keys.keys())
+        finally:
+            self.__lock.release()
+
+        return expired
+
+    def clear(self):
+        self.__lock.acquire()
+        try:
+            self.__buckets = {}
+            self.__heap = []
+            self.__keys = {}
+        finally:
+            self.__lock.release()
+
+    def __discard(self, key, bucket):
+        """ Remove a key from a bucket. An empty bucket is left in the heap
+            and skipped when it expires. The lock must be held.
+        """
+        keys = self.__buckets.get(bucket, None)
+        if keys and keys.has_key(key):
+            del keys[key]
+            if not keys:
+                del self.__buckets[bucket]
+
+
+# only used for test
+if __name__ == '__main__':
+
+    print
+    print "TimerWheel Test"
+    print
+
+    wheel = TimerWheel(10)
+    wheel.schedule('a', 100)
+    wheel.schedule('b', 105)
+    wheel.schedule('c', 125)
+    print "len(wheel) => %s" % (len(wheel))
+    print "wheel.popExpired(109) => %s" % (wheel.popExpired(109))
+    print "wheel.popExpired(110) => %s" % (wheel.popExpired(110))
+    wheel.schedule('c', 135)
+    print "wheel.schedule('c', 135), wheel.popExpired(130) => %s" % (wheel.popExpired(130))
+    wheel.cancel('c')
+    print "wheel.cancel('c'), wheel.popExpired(200) => %s" % (wheel.popExpired(200))
+    print "len(wheel) => %s" % (len(wheel))
+    print
+
+    print "done."
+    print
@@ -1,5 +1,9 @@
 """
 List with unique entries. UniqueList does not allow null nor duplicates.
+
+The hashable entries are also kept in a dictionary, so that checking whether
+an entry is in the list is O(1). Unhashable entries are only found by
+scanning the list.
 """
 
 __version__= '$Revision: 11 $'[11:-2]
@@ -11,10 +15,33 @@ class UniqueList(list):
     def __init__(self, initlist=[]):
         # call super class
         list.__init__(self)
+
+        # structure: { hashable entry : count }
+        self.__entries = {}
+        # the number of unhashable entries
+        self.__unhashables = 0
+
         # add initlist
         if initlist:
             self.extend(initlist)
 
+    def __contains__(self, item):
+        try:
+            if self.__entries.has_key(item):
+                return True
+        except TypeError:
+            return list.__contains__(self, item)
+
+        # an unhashable entry might be equal to the item
+        if self.__unhashables:
+            return list.__contains__(self, item)
+
+        return False
+
+    def __reduce__(self):
+        # pickle and copy the entries only, the dictionary is rebuilt
+        return (self.__class__, (list(self),))
+
     def __getslice__(self, i, j):
         # return a UniqueList object
         i = max(i, 0); j = max(j, 0)
@@ -34,6 +61,30 @@ class UniqueList(list):
 
         # call super class
         list.__setslice__(self, i, j, uniques)
+        self.__reindex()
+
+    def __delslice__(self, i, j):
+        list.__delslice__(self, i, j)
+        self.__reindex()
+
+    def __setitem__(self, i, item):
+        if type(i) == type(0):
+            old = list.__getitem__(self, i)
+            list.__setitem__(self, i, item)
+            self.__unindex(old)
+            self.__index(item)
+        else:
+            list.__setitem__(self, i, item)
+            self.__reindex()
+
+    def __delitem__(self, i):
+        if type(i) == type(0):
+            old = list.__getitem__(self, i)
+            list.__delitem__(self, i)
+            self.__unindex(old)
+        else:
+            list.__delitem__(self, i)
+            self.__reindex()
      
     def __add(self, l, flag=None):
         """ A convenient method for all add call.
@@ -78,6 +129,7 @@ class UniqueList(list):
         """
         if item != None and item not in self:
             list.append(self, item)
+            self.__index(item)
 
     def insert(self, i, item):
         """ Insert an item to the list.
@@ -87,6 +139,7 @@ class UniqueList(list):
         """
         if item != None and item not in self:
             list.insert(self, i, item)
+            self.__index(item)
 
     def extend(self, l):
         """ Extend another list into this list.
@@ -99,10 +152,53 @@ class UniqueList(list):
         except TypeError, msg:
             raise TypeError("UniqueList.extend() argument must be iterable")
 
+    def remove(self, item):
+        """ Remove the first item equal to item.
+        """
+        del self[self.index(item)]
+
+    def pop(self, i=-1):
+        """ Remove and return the item at index i.
+        """
+        item = list.pop(self, i)
+        self.__unindex(item)
+        return item
+
     def clear(self):
         """ Remove all items in the list.
         """
         list.__init__(self, [])
+        self.__entries = {}
+        self.__unhashables = 0
+
+    def __index(self, item):
+        """ Add an entry to the dictionary.
+        """
+        try:
+            self.__entries[item] = self.__entries.get(item, 0) + 1
+        except TypeError:
+            self.__unhashables += 1
+
+    def __unindex(self, item):
+        """ Remove an entry from the dictionary.
+        """
+        try:
+            n = self.__entries.get(item, 0) - 1
+        except TypeError:
+            self.__unhashables -= 1
+            return
+        if n > 0:
+            self.__entries[item] = n
+        else:
+            self.__entries.pop(item, None)
+
+    def __reindex(self):
+        """ Rebuild the dictionary after the list is changed by a slice.
+        """
+        self.__entries = {}
+        self.__unhashables = 0
+        for item in self:
+            self.__index(item)
 
 
 # only used for test
@@ -175,6 +271,17 @@ if __name__ == '__main__':
     print "ul1 * 3 => %s" % (ul1*3)
     print
     
+    print "testing membership"
+    print "2 in ul1 => %s, 9 in ul1 => %s" % (2 in ul1, 9 in ul1)
+    ul1.remove(2)
+    print "ul1.remove(2) => %s, 2 in ul1 => %s" % (ul1, 2 in ul1)
+    print "ul1.pop() => %s, ul1 => %s" % (ul1.pop(), ul1)
+    ul5 = UniqueList([[1], [1], [2]])
+    print "ul5 (UniqueList([[1], [1], [2]])) => %s, [2] in ul5 => %s" % (ul5, [2] in ul5)
+    import cPickle
+    print "cPickle.loads(cPickle.dumps(ul3, 2)) => %s" % (cPickle.loads(cPickle.dumps(ul3, 2)))
+    print
+
     print "testing clear"
     ul1.clear()
     print "ul1.clear() => %s" % (ul1)
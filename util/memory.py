@@ -1,5 +1,6 @@
 #! /usr/bin/env python
 import os
+import sys
 
 _proc_status = '/proc/%d/status' % os.getpid()
 
@@ -43,3 +44,38 @@ def stacksize(since=0.0):
     '''
     return _VmB('VmStk:') - since
 
+
+
+# rough sizes of objects for python without sys.getsizeof, on 64 bit
+_OBJECT_SIZE  = 32
+_POINTER_SIZE = 8
+
+def _getsizeof(obj):
+    '''Private.
+    '''
+    if hasattr(sys, 'getsizeof'):
+        return sys.getsizeof(obj)
+    if type(obj) == type(''):
+        return 37 + len(obj)
+    elif type(obj) == type(u''):
+        return 50 + 4 * len(obj)
+    elif type(obj) in (type([]), type(())):
+        return 72 + _POINTER_SIZE * len(obj)
+    elif type(obj) == type({}):
+        return 280 + 3 * _POINTER_SIZE * len(obj)
+    return _OBJECT_SIZE
+
+
+def sizeof(obj):
+    '''Return the estimated size of an object in bytes. The items of lists,
+    tuples and dictionaries are counted, other objects are counted by their
+    own size only.
+    '''
+    size = _getsizeof(obj)
+    if type(obj) in (type([]), type(())):
+        for item in obj:
+            size += sizeof(item)
+    elif type(obj) == type({}):
+        for key, value in obj.items():
+            size += sizeof(key) + sizeof(value)
+    return size